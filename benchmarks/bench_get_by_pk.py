@@ -0,0 +1,105 @@
+#
+# Copyright 2014 Mikhail Titov
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Authors:
+# - Mikhail Titov, <mikhail.titov@cern.ch>, 2014
+#
+"""Benchmark of lookups by primary key: Model.get vs Model.get_by_pk (and
+Model.get_many_by_pk).
+
+Usage (MySQL, table with integer primary key):
+    python bench_get_by_pk.py --host localhost --database db --user user \
+        --password xxx --table users --pk user_id --ids 1,2,3
+"""
+
+from optparse import OptionParser
+import time
+
+from d2om.orm import Model, Field
+from d2om.database.mysql import MySQLDatabase
+from d2om.database import Type
+
+
+def get_model(options):
+    """
+    Define model for the benchmark table (primary key only).
+
+    @param options: Command line options.
+    @type options: optparse.Values
+    @return: Model class.
+    @rtype: type
+    """
+    database = MySQLDatabase(**{
+        'host': options.host,
+        'port': options.port,
+        'database': options.database,
+        'read_params': {'user': options.user, 'password': options.password},
+        'write_params': {'user': options.user, 'password': options.password}})
+
+    class Meta:
+        pass
+    Meta.database = database
+    Meta.table = options.table
+
+    return type('BenchModel', (Model,), {
+        'pk': Field(options.pk, Type.Number).primary(),
+        'Meta': Meta})
+
+
+def run(name, func, values, iterations):
+    """
+    Execute function for every value and print the timing.
+
+    @param name: Benchmark name.
+    @type name: str
+    @param func: Function to execute.
+    @type func: callable
+    @param values: Input values.
+    @type values: list
+    @param iterations: Number of passes over the values.
+    @type iterations: int
+    """
+    started = time.time()
+    for _ in xrange(iterations):
+        for value in values:
+            func(value)
+    duration = time.time() - started
+    calls = iterations * len(values)
+    print '%-20s %8d call(s) %8.3fs %10.1f us/call' % (
+        name, calls, duration, duration / calls * 1e6)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--host', default='localhost')
+    parser.add_option('--port', type='int', default=3306)
+    parser.add_option('--database')
+    parser.add_option('--user')
+    parser.add_option('--password', default='')
+    parser.add_option('--table')
+    parser.add_option('--pk', help='primary key column')
+    parser.add_option('--ids', help='comma separated primary key values')
+    parser.add_option('--iterations', type='int', default=1000)
+    options, _ = parser.parse_args()
+
+    model = get_model(options)
+    values = map(int, options.ids.split(','))
+    pk_name = model.get_pk_name()
+
+    run('Model.get', lambda x: model.get(**{pk_name: x}),
+        values, options.iterations)
+    run('Model.get_by_pk', model.get_by_pk, values, options.iterations)
+    run('Model.get_many_by_pk', lambda x: model.get_many_by_pk(values),
+        [None], options.iterations)
+
+    model.close_session()
+
+
+if __name__ == '__main__':
+    main()
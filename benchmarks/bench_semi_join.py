@@ -0,0 +1,125 @@
+#
+# Copyright 2014 Mikhail Titov
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Authors:
+# - Mikhail Titov, <mikhail.titov@cern.ch>, 2014
+#
+"""Benchmark of IN (subquery) rendering: IN vs EXISTS vs JOIN (semi-join
+strategies), rows returned by every strategy are compared.
+
+Usage (MySQL, child table with a column that references parent table):
+    python bench_semi_join.py --host localhost --database db --user user \
+        --password xxx --table orders --pk id --column user_id \
+        --parent-table users --parent-pk user_id --parent-filter score \
+        --value 10
+"""
+
+from optparse import OptionParser
+import sys
+import time
+
+from d2om.orm import Model, Field
+from d2om.database.mysql import MySQLDatabase
+from d2om.database import Type
+
+
+def get_models(options):
+    """
+    Define models for the benchmark tables.
+
+    @param options: Command line options.
+    @type options: optparse.Values
+    @return: Child and parent model classes.
+    @rtype: tuple(type, type)
+    """
+    database = MySQLDatabase(**{
+        'host': options.host,
+        'port': options.port,
+        'database': options.database,
+        'read_params': {'user': options.user, 'password': options.password},
+        'write_params': {'user': options.user, 'password': options.password}})
+
+    def get_meta(table):
+        class Meta:
+            pass
+        Meta.database = database
+        Meta.table = table
+        return Meta
+
+    parent = type('BenchParent', (Model,), {
+        'pk': Field(options.parent_pk, Type.Number).primary(),
+        'value': Field(options.parent_filter, Type.Number),
+        'Meta': get_meta(options.parent_table)})
+    child = type('BenchChild', (Model,), {
+        'pk': Field(options.pk, Type.Number).primary(),
+        'ref': Field(options.column, Type.Number),
+        'Meta': get_meta(options.table)})
+    return child, parent
+
+
+def run(strategy, query, iterations):
+    """
+    Execute query with defined semi-join strategy and print the timing.
+
+    @param strategy: Semi-join strategy (IN, EXISTS or JOIN).
+    @type strategy: str
+    @param query: SelectQuery object.
+    @type query: SelectQuery
+    @param iterations: Number of executions.
+    @type iterations: int
+    @return: Primary keys of returned rows.
+    @rtype: list
+    """
+    query._db.semi_join_strategy = strategy
+    output = sorted(map(lambda x: x.get_pk(), query))
+
+    started = time.time()
+    for _ in xrange(iterations):
+        list(query)
+    duration = time.time() - started
+    print '%-8s %8d row(s) %8.3fs %10.1f ms/query' % (
+        strategy, len(output), duration, duration / iterations * 1e3)
+    return output
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--host', default='localhost')
+    parser.add_option('--port', type='int', default=3306)
+    parser.add_option('--database')
+    parser.add_option('--user')
+    parser.add_option('--password', default='')
+    parser.add_option('--table')
+    parser.add_option('--pk', help='primary key column')
+    parser.add_option('--column', help='column that references parent table')
+    parser.add_option('--parent-table')
+    parser.add_option('--parent-pk', help='parent primary key column')
+    parser.add_option('--parent-filter', help='parent column to filter by')
+    parser.add_option('--value', type='float', help='parent filter value')
+    parser.add_option('--iterations', type='int', default=10)
+    options, _ = parser.parse_args()
+
+    child, parent = get_models(options)
+    query = child.select().filter(
+        child.ref << parent.select().filter(parent.value > options.value))
+
+    results = {}
+    database = child._meta.database
+    for strategy in database.semi_join_type.values:
+        results[strategy] = run(strategy, query, options.iterations)
+
+    child.close_session()
+
+    if len(set(map(tuple, results.itervalues()))) != 1:
+        print 'Strategies returned different rows'
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -14,6 +14,7 @@
 """
 
 __all__ = [
+    'ArithmeticOp',
     'ExprConnector',
     'OpCode'
 ]
@@ -53,3 +54,14 @@ class ExprConnector(EnumTypes):
         'AND': 'and',
         'OR': 'or',
         'Comma': 'comma'}
+
+
+class ArithmeticOp(EnumTypes):
+
+    """ArithmeticOp class represents a set of arithmetic operations."""
+
+    _types = {
+        'ADD': 'add',
+        'SUB': 'sub',
+        'MUL': 'mul',
+        'DIV': 'div'}
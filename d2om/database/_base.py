@@ -19,18 +19,26 @@ __all__ = [
     'ConnectionMeta',
     'CursorMeta',
     'Database',
+    'SemiJoinStrategy',
+    'Transaction',
     'Type'
 ]
 
+from collections import OrderedDict
 from datetime import datetime, date, time
+import itertools
 import threading
 
 from d2om.utils import EnumTypes, IDict, Templates
 from d2om.exception import DatabaseException
-from d2om.config.model import OpCode, ExprConnector
+from d2om.config.model import ArithmeticOp, OpCode, ExprConnector
 from d2om.config import DEBUG_MODE
 
 
+# - size of the driver cache of parsed statements (per connection) -
+STATEMENT_CACHE_SIZE = 50
+
+
 class ConnectionMeta(type):
 
     """Connection meta class."""
@@ -61,6 +69,8 @@ class ConnectionMeta(type):
                 with cls._connection_lock:
                     super(cls.__class__, cls).__init__(**cls._connection_params)
                     cls._active = True
+                # - temporary tables (of the previous session) are lost -
+                cls.get_temp_tables().clear()
 
             if DEBUG_MODE:
                 _msg = '[Connection.ensure] '
@@ -87,6 +97,7 @@ class ConnectionMeta(type):
                             print '[Connection.close] Closed %s' % cls
 
                     cls._active = False
+                    cls.get_temp_tables().clear()
 
         def is_active(cls):
             """
@@ -106,15 +117,29 @@ class ConnectionMeta(type):
 
             return cls._active
 
+        def get_temp_tables(cls):
+            """
+            Get names of temporary tables created within the session.
+
+            @return: Set of table names.
+            @rtype: set
+            """
+            if cls._temp_tables is None:
+                cls._temp_tables = set()
+            return cls._temp_tables
+
         attrs.update({
             # - initial class attributes -
             '_active': False,
             '_connection_lock': threading.Lock(),
             '_connection_params': {},
+            '_statement_cache_size': STATEMENT_CACHE_SIZE,
+            '_temp_tables': None,
             # - class methods -
             'ensure': ensure,
             'close': close,
-            'is_active': is_active})
+            'is_active': is_active,
+            'get_temp_tables': get_temp_tables})
 
         return type.__new__(cls, name, bases, attrs)
 
@@ -202,6 +227,16 @@ class JoinType(EnumTypes):
         'FullOuter': 'FULL OUTER'}
 
 
+class SemiJoinStrategy(EnumTypes):
+
+    """SemiJoinStrategy class with ways to render IN (subquery) conditions."""
+
+    _types = {
+        'In': 'IN',
+        'Exists': 'EXISTS',
+        'Join': 'JOIN'}
+
+
 class OrderType(EnumTypes):
 
     """OrderType class with directions for ordering."""
@@ -250,7 +285,12 @@ class BaseOperations(Templates):
         OpCode.ISNULL: '$column IS NULL',
         OpCode.ISNOTNULL: '$column IS NOT NULL',
         OpCode.CONTAINS: '$column LIKE $value',
-        OpCode.STARTSWITH: '$column LIKE $value'}
+        OpCode.STARTSWITH: '$column LIKE $value',
+        # - arithmetic operations (column expressions) -
+        ArithmeticOp.ADD: '($lhs + $rhs)',
+        ArithmeticOp.SUB: '($lhs - $rhs)',
+        ArithmeticOp.MUL: '($lhs * $rhs)',
+        ArithmeticOp.DIV: '($lhs / $rhs)'}
 
     @classmethod
     def get(cls, name, **kwargs):
@@ -297,40 +337,130 @@ class BaseStatements(Templates):
         'column_with_alias': '$column AS $alias',
         'combined_column': '$alias.$column',
         'func': '$funcname($column) AS $alias',
+        'call': '$funcname($args)',
+        'union': 'UNION',
+        'union_all': 'UNION ALL',
+        'compound_select': '$selectquery $order_by',
+        'select_with_ctes': 'WITH $ctes $selectquery',
+        'cte': '$cte_name AS ($selectquery)',
+        'select_cte': 'SELECT $column FROM $cte_name',
+        'over': '$function OVER ($window)',
+        'window_spec': '$partition_by $order_by',
+        'partition_by': 'PARTITION BY $partition_by',
+        'select_top_per_group': ('SELECT $columns FROM ($selectquery) ' +
+                                 '$alias WHERE $rank_column <= $num_rows ' +
+                                 '$order_by'),
         'join_clause': '$join_type JOIN $table ON $columns',
         'negated': 'NOT $statement',
         'combine': '($statement)',
         'negated_combine': 'NOT ($statement)',
+        'false': '1 = 0',
+        'exists': 'EXISTS ($selectquery)',
+        'semi_join_table': '($selectquery) $alias',
+        'savepoint': 'SAVEPOINT $savepoint_name',
+        'rollback_to_savepoint': 'ROLLBACK TO SAVEPOINT $savepoint_name',
+        'release_savepoint': 'RELEASE SAVEPOINT $savepoint_name',
+        'temp_values': 'SELECT item FROM $table WHERE slot_id = $slot_id',
         # - re-defined templates -
         'insert_with_lastid': '',
         'select_with_limit': '',
         'select_with_offset': '',
         'select_with_pagination': '',
-        'select_with_count': ''}
+        'select_with_count': '',
+        'insert_rows': '',
+        'ignore': '',
+        'upsert': '',
+        'create_temp_table': '',
+        'parse_stats': ''}
 
 
 def commit_on_success(func):
     """
     Apply commit-method if there is no exceptions in func execution.
 
+    Inside of Database.atomic block the commit is postponed till the exit
+    from the outermost block. The write connection is locked till the commit
+    (thus other threads do not commit/rollback modifications of the block).
+
     @param func: Database function.
     @type func: function
     @return: Wrapped database function.
     @rtype: function
     """
     def inner(self, *args, **kwargs):
-        self.begin()
-        try:
-            result = func(self, *args, **kwargs)
-            self.commit()
-        except:
-            self.rollback()
-            raise
-        else:
-            return result
+        if self.in_transaction():
+            return func(self, *args, **kwargs)
+        with self._write_lock:
+            self.begin()
+            try:
+                result = func(self, *args, **kwargs)
+                self.commit()
+            except:
+                self.rollback()
+                raise
+            else:
+                return result
     return inner
 
 
+class Transaction(object):
+
+    """Transaction class (context manager for a block of modifications)."""
+
+    def __init__(self, db):
+        """
+        Initialization.
+
+        @param db: Database object.
+        @type db: Database
+        """
+        self._db = db
+        self._savepoint = None
+
+    def __enter__(self):
+        """Begin transaction (outer block) or create savepoint (inner one)."""
+        depth = self._db.get_transaction_depth()
+        if depth:
+            self._savepoint = 'd2om_sp%s' % depth
+            self._db.savepoint(self._savepoint)
+        else:
+            # - write connection is used by one thread till the outer exit -
+            self._db._write_lock.acquire()
+            try:
+                self._db.begin()
+            except:
+                self._db._write_lock.release()
+                raise
+        self._db._set_transaction_depth(depth + 1)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Commit/rollback transaction or release/rollback to savepoint."""
+        self._db._set_transaction_depth(self._db.get_transaction_depth() - 1)
+
+        if self._savepoint:
+            if exc_type:
+                self._db.rollback_to_savepoint(self._savepoint)
+            else:
+                self._db.release_savepoint(self._savepoint)
+            self._savepoint = None
+
+        else:
+            try:
+                if exc_type:
+                    self._db.rollback()
+                else:
+                    try:
+                        self._db.commit()
+                    except:
+                        self._db.rollback()
+                        raise
+            finally:
+                self._db._write_lock.release()
+
+        return False
+
+
 class Database(object):
 
     """Basic database class."""
@@ -343,17 +473,41 @@ class Database(object):
     op_connectors = BaseOpConnectors
     join_type = JoinType
     order_type = OrderType
+    semi_join_type = SemiJoinStrategy
+
+    # - rendering of IN (subquery) conditions (SemiJoinStrategy) -
+    semi_join_strategy = SemiJoinStrategy.In
 
     interpolation = '%s'
 
+    # - long lists of values (IN-lists) -
+    in_list_limit = 1000
+    pad_in_lists = False  # round IN-list sizes up to powers of 2
+    temp_table_threshold = None  # disabled by default
+    temp_table_prefix = 'd2om_tmp'
+    temp_value_types = {}  # {<pyType>: <sqlType>}, no temp tables if empty
+
+    # - upsert matches existing rows by any unique key of the table (not only
+    #   by the chosen key fields) -
+    upsert_by_any_key = False
+
     def __init__(self, **kwargs):
         """
         Initialization (mainly read/write connections initialization).
 
         @param kwargs: Connection parameters.
         @type kwargs: dict
+
+        @keyword statement_cache_size: Number of cached statements per
+            connection (driver statement cache, hits are provided by
+            get_parse_stats).
+        @keyword semi_join_strategy: Rendering of IN (subquery) conditions.
+        @raise ValueError: unknown semi-join strategy.
         """
         self._connections = {}
+        self._transaction_state = threading.local()
+        self._write_lock = threading.RLock()  # write connection is shared
+        self._temp_slots = itertools.count()
         if kwargs.get('read_params'):
             kwargs.update(kwargs['read_params'])
             self._connections.update({
@@ -362,6 +516,16 @@ class Database(object):
             kwargs.update(kwargs['write_params'])
             self._connections.update({
                 'write': self._connection_cls(**kwargs)})
+        if kwargs.get('statement_cache_size'):
+            for connection in self._connections.itervalues():
+                connection._statement_cache_size = kwargs[
+                    'statement_cache_size']
+        if kwargs.get('semi_join_strategy'):
+            strategy = kwargs['semi_join_strategy'].upper()
+            if strategy not in self.semi_join_type.values:
+                raise ValueError('[Database.__init__] ' +
+                                 'Unknown value of semi-join strategy')
+            self.semi_join_strategy = strategy
 
     @classmethod
     def get_name(cls):
@@ -398,6 +562,90 @@ class Database(object):
         """Cancel (rollback) modifications."""
         self._connections.get('write').rollback()
 
+    def atomic(self):
+        """
+        Get context manager to execute modifications in one transaction.
+
+        Blocks can be nested, inner blocks are managed by savepoints. The
+        write connection is locked by the thread till the exit from the outer
+        block (other threads wait for their modifications), reads inside of
+        the block use the write connection (uncommitted data is visible).
+
+        @return: Transaction object.
+        @rtype: Transaction
+        """
+        return Transaction(self)
+
+    def get_transaction_depth(self):
+        """
+        Get the number of nested atomic blocks in the current thread.
+
+        @return: Depth of the transaction.
+        @rtype: int
+        """
+        return getattr(self._transaction_state, 'depth', 0)
+
+    def _set_transaction_depth(self, depth):
+        """
+        Set the number of nested atomic blocks in the current thread.
+
+        @param depth: Depth of the transaction.
+        @type depth: int
+        """
+        self._transaction_state.depth = depth
+
+    def in_transaction(self):
+        """
+        Check that current thread is inside of atomic block.
+
+        @return: Flag that transaction is active.
+        @rtype: bool
+        """
+        return bool(self.get_transaction_depth())
+
+    def _execute_savepoint_statement(self, name, savepoint_name):
+        """
+        Execute savepoint related statement.
+
+        @param name: Name of the statement template.
+        @type name: str
+        @param savepoint_name: Savepoint name.
+        @type savepoint_name: str
+        """
+        statement = self.statements.get(**{
+            'name': name,
+            'savepoint_name': savepoint_name})
+        if statement:
+            self.execute(statement, modify=True).close()
+
+    def savepoint(self, savepoint_name):
+        """
+        Create savepoint.
+
+        @param savepoint_name: Savepoint name.
+        @type savepoint_name: str
+        """
+        self._execute_savepoint_statement('savepoint', savepoint_name)
+
+    def rollback_to_savepoint(self, savepoint_name):
+        """
+        Cancel (rollback) modifications made after savepoint.
+
+        @param savepoint_name: Savepoint name.
+        @type savepoint_name: str
+        """
+        self._execute_savepoint_statement(
+            'rollback_to_savepoint', savepoint_name)
+
+    def release_savepoint(self, savepoint_name):
+        """
+        Release savepoint.
+
+        @param savepoint_name: Savepoint name.
+        @type savepoint_name: str
+        """
+        self._execute_savepoint_statement('release_savepoint', savepoint_name)
+
     def get_cursor(self, modify=False, **kwargs):
         """
         Ger cursor object.
@@ -409,9 +657,18 @@ class Database(object):
         @return: Cursor object.
         @rtype: Cursor
         """
-        if modify:
-            return self._connections.get('write').cursor(**kwargs)
-        return self._connections.get('read').cursor(**kwargs)
+        return self._get_connection(modify).cursor(**kwargs)
+
+    def _get_connection(self, modify=False):
+        """
+        Get connection object.
+
+        @param modify: Modification flag.
+        @type modify: bool
+        @return: Connection object.
+        @rtype: Connection
+        """
+        return self._connections.get(modify and 'write' or 'read')
 
     def execute(self, statement, parameters=None, modify=False, **kwargs):
         """
@@ -488,7 +745,9 @@ class Database(object):
         @rtype: Cursor
         @raise DatabaseException: exception in statement execution.
         """
-        return self.execute(statement, parameters, modify=False, **kwargs)
+        # - inside of atomic block modifications of the block are visible -
+        return self.execute(statement, parameters,
+                            modify=self.in_transaction(), **kwargs)
 
     @commit_on_success
     def execute_write(self, statement, parameters=None, **kwargs):
@@ -524,6 +783,290 @@ class Database(object):
         """
         return self.executemany(statement, parameters, **kwargs)
 
+    def insert_many(self, table, fields, params, **kwargs):
+        """
+        Insert multiple rows (all chunks are inserted in one transaction).
+
+        @param table: Table name.
+        @type table: str
+        @param fields: List of Field objects that correspond to parameters.
+        @type fields: list
+        @param params: List of rows (lists of values).
+        @type params: list
+        @param kwargs: Additional parameters.
+        @type kwargs: dict
+
+        @keyword ignore: Flag to skip rows that cannot be inserted.
+        @keyword returning: Field to get generated values (not supported).
+        @keyword max_rows: Maximum number of rows per statement execution.
+
+        @return: Number of inserted rows per chunk, generated keys, errors
+            and last insert id ("last_id").
+        @rtype: dict
+        @raise DatabaseException: exception in statement execution.
+        """
+        comma = self.op_connectors.get(ExprConnector.Comma)
+        statement = self.statements.get(**{
+            'name': 'insert',
+            'table': table,
+            'columns': comma.join(map(lambda x: x.column_name, fields)),
+            'values': comma.join([self.interpolation] * len(fields))})
+
+        output = {'rows': [], 'keys': [], 'errors': [], 'last_id': None}
+        max_rows = kwargs.get('max_rows') or len(params)
+        with self.atomic():
+            for i in xrange(0, len(params), max_rows or 1):
+                cursor = self.execute_write_many(
+                    statement, params[i:i + max_rows])
+                output['rows'].append(self.rows_affected(cursor))
+                output['last_id'] = self.last_insert_id(cursor)
+                cursor.close()
+        return output
+
+    def get_upsert_statement(self, table, fields, keys, update_fields,
+                             num_rows=1):
+        """
+        Get statement to insert rows or to update existing ones.
+
+        @param table: Table name.
+        @type table: str
+        @param fields: List of Field objects that correspond to parameters.
+        @type fields: list
+        @param keys: List of key Field objects (to match existing rows).
+        @type keys: list
+        @param update_fields: List of Field objects to update.
+        @type update_fields: list
+        @param num_rows: Number of rows.
+        @type num_rows: int
+        @raise NotImplementedError: method must be re-defined.
+        """
+        raise NotImplementedError
+
+    def upsert_many(self, table, fields, params, **kwargs):
+        """
+        Insert or update multiple rows (all chunks in one transaction).
+
+        @param table: Table name.
+        @type table: str
+        @param fields: List of Field objects that correspond to parameters.
+        @type fields: list
+        @param params: List of rows (lists of values).
+        @type params: list
+        @param kwargs: Additional parameters.
+        @type kwargs: dict
+
+        @keyword keys: List of key Field objects (to match existing rows).
+        @keyword update_fields: List of Field objects to update.
+        @keyword max_rows: Maximum number of rows per statement execution.
+
+        @return: Number of affected rows per chunk, generated keys and errors.
+        @rtype: dict
+        @raise DatabaseException: exception in statement execution.
+        """
+        statement = self.get_upsert_statement(
+            table, fields, kwargs['keys'], kwargs['update_fields'])
+
+        output = {'rows': [], 'keys': [], 'errors': []}
+        max_rows = kwargs.get('max_rows') or len(params)
+        with self.atomic():
+            for i in xrange(0, len(params), max_rows or 1):
+                cursor = self.execute_write_many(
+                    statement, params[i:i + max_rows])
+                output['rows'].append(self.rows_affected(cursor))
+                cursor.close()
+        return output
+
+    def pad_in_list(self, values, force=False):
+        """
+        Pad list of values (with the last value) up to the size of the bucket
+        (power of 2, but not greater than in_list_limit), thus the number of
+        distinct statements is limited.
+
+        @param values: List of values.
+        @type values: list
+        @param force: Flag to pad values even if pad_in_lists is disabled.
+        @type force: bool
+        @return: Padded list of values.
+        @rtype: list
+        """
+        if not (self.pad_in_lists or force) or not values:
+            return values
+
+        size = 1
+        while size < len(values):
+            size <<= 1
+        size = max(min(size, self.in_list_limit), len(values))
+        return values + [values[-1]] * (size - len(values))
+
+    def get_parse_stats(self, modify=False):
+        """
+        Get statistics of statements parsing for the session (connection).
+        Statistics are provided only where statements are parsed by server
+        (e.g., Oracle), MySQLdb uses text protocol (no prepared statements),
+        thus an empty result is returned for MySQL.
+
+        @param modify: Flag to use connection for modifications.
+        @type modify: bool
+        @return: Statistic names with corresponding values.
+        @rtype: dict
+        """
+        statement = self.statements.get(name='parse_stats')
+        if not statement:
+            return {}
+        cursor = self.execute(statement, modify=modify)
+        output = dict(map(lambda x: (x[0], int(x[1])), cursor.fetchall()))
+        cursor.close()
+        return output
+
+    def get_temp_table(self, py_type, num=0):
+        """
+        Get temporary table for values of the defined type.
+
+        @param py_type: Python type of values.
+        @type py_type: type
+        @param num: Number of the table for the same type within the query
+            (MySQL can not refer to temporary table twice in one statement).
+        @type num: int
+        @return: Table name and SQL type of values.
+        @rtype: tuple(str, str)/None
+        """
+        value_type = self.temp_value_types.get(py_type)
+        if value_type:
+            table = '%s_%s' % (self.temp_table_prefix, py_type.__name__)
+            if num:
+                table = '%s_%s' % (table, num)
+            return table, value_type
+
+    def get_temp_slot(self):
+        """
+        Get identifier for the set of values in temporary table.
+
+        @return: Slot id.
+        @rtype: int
+        """
+        return self._temp_slots.next()
+
+    def create_temp_table(self, table, value_type, modify=False):
+        """
+        Create temporary table (for the session of the defined connection).
+
+        @param table: Table name.
+        @type table: str
+        @param value_type: SQL type of values.
+        @type value_type: str
+        @param modify: Flag to use connection for modifications.
+        @type modify: bool
+        @raise DatabaseException: exception in statement execution.
+        """
+        temp_tables = self._get_connection(modify).get_temp_tables()
+        if table in temp_tables:
+            return
+        self.execute(self.statements.get(**{
+            'name': 'create_temp_table',
+            'table': table,
+            'value_type': value_type}), modify=modify).close()
+        temp_tables.add(table)
+
+    def _get_temp_slots(self, items):
+        """
+        Group slot ids of sets of values by temporary tables.
+
+        @param items: List of tuples (table, value type, slot id, values).
+        @type items: list
+        @return: Slot ids per table.
+        @rtype: dict
+        """
+        output = OrderedDict()  # {<tableName>: [<slotId>]}
+        for table, _, slot_id, _ in items:
+            output.setdefault(table, []).append(slot_id)
+        return output
+
+    def _delete_temp_values(self, table, slot_ids, modify=False):
+        """
+        Delete values of the defined slots from temporary table (values of
+        other slots belong to other queries and are kept).
+
+        @param table: Table name.
+        @type table: str
+        @param slot_ids: Slot ids.
+        @type slot_ids: list
+        @param modify: Flag to use connection for modifications.
+        @type modify: bool
+        @raise DatabaseException: exception in statement execution.
+        """
+        self.execute(self.statements.get(**{
+            'name': 'delete',
+            'table': table,
+            'where': self.operations.get(
+                OpCode.IN, column='slot_id',
+                value=[self.interpolation] * len(slot_ids))}),
+            slot_ids, modify=modify).close()
+
+    def load_temp_values(self, items, modify=False):
+        """
+        Load sets of values into temporary tables (previous values of the
+        same slots are removed), values are loaded with one statement
+        execution per table.
+
+        @param items: List of tuples (table, value type, slot id, values).
+        @type items: list
+        @param modify: Flag to use connection for modifications.
+        @type modify: bool
+        @raise DatabaseException: exception in statement execution.
+        """
+        modify = modify or self.in_transaction()  # - see execute_read -
+        # - reconnect (if needed) before the check of created tables -
+        self._get_connection(modify).ensure()
+        comma = self.op_connectors.get(ExprConnector.Comma)
+        tables = OrderedDict()  # {<tableName>: [(<slotId>, <value>)]}
+        for table, value_type, slot_id, values in items:
+            self.create_temp_table(table, value_type, modify)
+            tables.setdefault(table, []).extend(
+                map(lambda x: (slot_id, x), OrderedDict.fromkeys(values)))
+
+        slots = self._get_temp_slots(items)
+        for table, params in tables.iteritems():
+            self._delete_temp_values(table, slots[table], modify=modify)
+
+            statement = self.statements.get(**{
+                'name': 'insert',
+                'table': table,
+                'columns': comma.join(['slot_id', 'item']),
+                'values': comma.join([self.interpolation] * 2)})
+            cursor = self.get_cursor(modify=modify)
+            try:
+                cursor.executemany(statement, params)
+            except Exception, e:
+                raise DatabaseException(('%s ("%s" %s row(s))' % (
+                    e, statement, len(params))).replace('\n', ''))
+            finally:
+                cursor.close()
+
+            if DEBUG_MODE:
+                print ('[Database.load_temp_values] ' +
+                       '%s: %s value(s)' % (table, len(params)))
+
+    def release_temp_values(self, items, modify=False):
+        """
+        Remove sets of values from temporary tables (after the execution of
+        the statement that uses them).
+
+        @param items: List of tuples (table, value type, slot id, values).
+        @type items: list
+        @param modify: Flag to use connection for modifications.
+        @type modify: bool
+        @raise DatabaseException: exception in statement execution.
+        """
+        modify = modify or self.in_transaction()  # - see execute_read -
+        connection = self._get_connection(modify)
+        if connection.ensure()['is_new']:
+            return  # - values are lost together with the previous session -
+
+        temp_tables = connection.get_temp_tables()
+        for table, slot_ids in self._get_temp_slots(items).iteritems():
+            if table in temp_tables:
+                self._delete_temp_values(table, slot_ids, modify=modify)
+
     def lookup_cast(self, column, lookup, value):
         """
         Prepare query value for the certain operation.
@@ -617,6 +1160,19 @@ class ColumnType(object):
             value = self.convert(value)
         return value
 
+    def db_values(self, values):
+        """
+        Get correct values to store at database (column-wise conversion).
+
+        @param values: Input values.
+        @type values: list
+        @return: Converted values.
+        @rtype: list
+        """
+        py_type, convert = self._py_type, self.convert
+        return [value if value is None or isinstance(value, py_type)
+                else convert(value) for value in values]
+
     def py_value(self, value):
         """
         Get correct value to operate in application.
@@ -630,6 +1186,21 @@ class ColumnType(object):
             value = self.convert(value)
         return value
 
+    def key_value(self, value):
+        """
+        Get canonical representation of the value, equal values of different
+        python types (e.g., Decimal/long/int) have the same representation.
+
+        @param value: Input value
+        @type value: any
+        @return: Canonical value.
+        @rtype: str/None
+        """
+        value = self.py_value(value)
+        if value is not None:
+            value = str(value)
+        return value
+
 
 class IntegerType(ColumnType):
 
@@ -651,6 +1222,20 @@ class FloatType(ColumnType):
 
     _py_type = float
 
+    def key_value(self, value):
+        """
+        Get canonical representation of the value (full precision).
+
+        @param value: Input value
+        @type value: any
+        @return: Canonical value.
+        @rtype: str/None
+        """
+        value = self.py_value(value)
+        if value is not None:
+            value = repr(value)
+        return value
+
 
 class BooleanType(ColumnType):
 
@@ -671,6 +1256,19 @@ class BooleanType(ColumnType):
             value = self.convert(value) and 1 or 0
         return value
 
+    def db_values(self, values):
+        """
+        Get correct values to store at database (column-wise conversion).
+
+        @param values: Input values.
+        @type values: list
+        @return: Converted (int) values.
+        @rtype: list
+        """
+        convert = self.convert
+        return [None if value is None else (convert(value) and 1 or 0)
+                for value in values]
+
     def py_value(self, value):
         """
         Get correct value to operate in application.
@@ -705,6 +1303,22 @@ class CharType(ColumnType):
             value = self.convert(value)[:self.attributes['max_length']]
         return value
 
+    def db_values(self, values):
+        """
+        Get correct values to store at database (column-wise conversion).
+
+        @param values: Input values.
+        @type values: list
+        @return: String values with restricted length.
+        @rtype: list
+        """
+        py_type, convert = self._py_type, self.convert
+        max_length = self.attributes['max_length']
+        return [None if value is None
+                else (value if isinstance(value, py_type)
+                      else convert(value))[:max_length]
+                for value in values]
+
     def py_value(self, value):
         """
         Get correct value to operate in application.
@@ -719,6 +1333,21 @@ class CharType(ColumnType):
             value = self.convert(value)
         return value
 
+    def key_value(self, value):
+        """
+        Get canonical representation of the value (unicode is encoded).
+
+        @param value: Input value
+        @type value: any
+        @return: Canonical value.
+        @rtype: str/None
+        """
+        if isinstance(value, unicode):
+            return value.encode('utf-8')
+        if value is not None:
+            value = self.py_value(value)
+        return value
+
 
 class VarCharType(CharType):
 
@@ -790,6 +1419,22 @@ class DateType(DateTimeType):
         """
         return super(DateType, self).convert(value).date()
 
+    def key_value(self, value):
+        """
+        Get canonical representation of the value (datetime is truncated).
+
+        @param value: Input value
+        @type value: any
+        @return: Canonical value.
+        @rtype: str/None
+        """
+        value = self.py_value(value)
+        if isinstance(value, datetime):
+            value = value.date()
+        if value is not None:
+            value = str(value)
+        return value
+
 
 class TimeType(ColumnType):
 
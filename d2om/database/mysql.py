@@ -15,23 +15,31 @@
 
 __all__ = ['MySQLDatabase']
 
+from datetime import datetime, date
 import warnings
 
 try:
     import MySQLdb.connections as dbconnections
     import MySQLdb.cursors as dbcursors
     import MySQLdb as mysql
+    # - warnings -> exceptions (filter is installed once, since filters are
+    #   process-wide and not thread-safe) -
+    warnings.filterwarnings('error', category=mysql.Warning)
 except ImportError:
     print Exception('[ImportError] MySQLdb is not installed')
 
 from d2om.database._base import (
     ConnectionMeta, CursorMeta, Database, BaseStatements)
 # from d2om.exception import DatabaseException
-from d2om.config.model import OpCode
+from d2om.config.model import OpCode, ExprConnector
 from d2om.config import DEBUG_MODE
 
 TZ_QUERY = "SET time_zone = '+00:00'"
 
+# - alias of inserted rows in ON DUPLICATE KEY UPDATE (MySQL 8.0.19+) -
+UPSERT_ALIAS = 'd2om_new'
+UPSERT_ALIAS_VERSION = (8, 0, 19)
+
 
 class Connection(dbconnections.Connection):
 
@@ -69,6 +77,8 @@ class Connection(dbconnections.Connection):
         @type kwargs: dict
 
         @keyword ss: Get Server Side Cursor.
+        @keyword defer_warnings: Do not check warnings after the execution
+            (e.g., about rows that are skipped by INSERT IGNORE).
 
         @return: Cursor object.
         @rtype: Cursor
@@ -81,6 +91,9 @@ class Connection(dbconnections.Connection):
             if DEBUG_MODE:
                 print '[Connection.cursor] set UTC timezone for current session'
 
+        if kwargs.get('defer_warnings'):
+            # - per cursor, no changes of (process-wide) warning filters -
+            cursor._defer_warnings = True
         return cursor
 
 
@@ -102,13 +115,28 @@ class Statements(BaseStatements):
 
     """Statements class contains SQL statements."""
 
-    _templates = BaseStatements._templates
+    _templates = dict(BaseStatements._templates)
     _templates.update({
         'insert_with_lastid': 'INSERT INTO $table ($columns) VALUES ($values)',
         'select_with_limit': '$selectquery LIMIT $limit',
         'select_with_offset': '$selectquery LIMIT $offset, 18446744073709551615',
         'select_with_pagination': '$selectquery LIMIT $offset, $limit',
-        'select_with_count': 'SELECT COUNT(*) FROM ($selectquery) as t0'})
+        'select_with_count': 'SELECT COUNT(*) FROM ($selectquery) as t0',
+        'insert_rows': 'INSERT $ignore INTO $table ($columns) VALUES $rows',
+        'ignore': 'IGNORE',
+        'max_packet_size': 'SELECT @@max_allowed_packet',
+        'autoinc_settings': ('SELECT @@innodb_autoinc_lock_mode, ' +
+                             '@@auto_increment_increment'),
+        'upsert': ('INSERT INTO $table ($columns) VALUES $rows ' +
+                   'ON DUPLICATE KEY UPDATE $update_columns'),
+        'upsert_with_alias': ('INSERT INTO $table ($columns) VALUES $rows ' +
+                              'AS $alias ' +
+                              'ON DUPLICATE KEY UPDATE $update_columns'),
+        'update_value': 'VALUES($column)',
+        'server_version': 'SELECT VERSION()',
+        'create_temp_table': (
+            'CREATE TEMPORARY TABLE IF NOT EXISTS $table ' +
+            '(slot_id BIGINT NOT NULL, item $value_type, KEY (slot_id))')})
 
 
 class MySQLDatabase(Database):
@@ -119,42 +147,298 @@ class MySQLDatabase(Database):
 
     statements = Statements
     interpolation = '%s'
+    # - ON DUPLICATE KEY UPDATE fires on any unique index -
+    upsert_by_any_key = True
+
+    temp_value_types = {
+        int: 'BIGINT',
+        long: 'BIGINT',
+        float: 'DOUBLE',
+        bool: 'TINYINT',
+        str: 'VARCHAR(3000)',
+        datetime: 'DATETIME',
+        date: 'DATE'}
+
+    # - limits for multi-row inserts -
+    max_insert_rows = 1000
+    max_packet_size = None  # bytes, server value is used by default
+    packet_size_ratio = 0.9
+    # - consecutive auto-increment values for multi-row inserts (0, 1) -
+    autoinc_lock_mode = None
+    # - step between auto-increment values (auto_increment_increment) -
+    autoinc_increment = None
+    server_version = None  # e.g., "8.0.21-log", server value by default
+
+    def get_max_packet_size(self):
+        """
+        Get maximum size of the statement (max_allowed_packet).
 
-    def execute(self, statement, parameters=None, modify=False, **kwargs):
+        @return: Size in bytes.
+        @rtype: int
+        """
+        if not self.max_packet_size:
+            cursor = self.execute_read(self.statements.get(**{
+                'name': 'max_packet_size'}))
+            self.max_packet_size = int(cursor.fetchone()[0])
+            cursor.close()
+        return self.max_packet_size
+
+    def get_autoinc_settings(self):
         """
-        Execute SQL statement.
+        Get lock mode for auto-increment (innodb_autoinc_lock_mode) and
+        the step between generated values (auto_increment_increment).
 
-        @param statement: SQL query statement.
-        @type statement: str
-        @param parameters: Bind variables.
-        @type parameters: tuple/list/dict/None
-        @param modify: Modification flag (defines is commit necessary).
-        @type modify: bool
-        @param kwargs: Cursor parameters.
+        @return: Lock mode value and increment.
+        @rtype: tuple(int, int)
+        """
+        if self.autoinc_lock_mode is None or self.autoinc_increment is None:
+            cursor = self.execute_read(self.statements.get(**{
+                'name': 'autoinc_settings'}))
+            lock_mode, increment = cursor.fetchone()
+            cursor.close()
+            if self.autoinc_lock_mode is None:
+                self.autoinc_lock_mode = int(lock_mode)
+            if self.autoinc_increment is None:
+                self.autoinc_increment = int(increment)
+        return self.autoinc_lock_mode, self.autoinc_increment
+
+    def get_server_version(self):
+        """
+        Get version of the database server.
+
+        @return: Version string.
+        @rtype: str
+        """
+        if not self.server_version:
+            cursor = self.execute_read(self.statements.get(**{
+                'name': 'server_version'}))
+            self.server_version = str(cursor.fetchone()[0])
+            cursor.close()
+        return self.server_version
+
+    def has_upsert_alias(self):
+        """
+        Check that inserted rows can be referred by alias in ON DUPLICATE KEY
+        UPDATE (VALUES() function is deprecated since MySQL 8.0.20).
+
+        @return: Flag that row alias is supported.
+        @rtype: bool
+        """
+        version = self.get_server_version()
+        if 'mariadb' in version.lower():
+            return False
+        numbers = []
+        for item in version.split('-')[0].split('.')[:3]:
+            if not item.isdigit():
+                break
+            numbers.append(int(item))
+        return tuple(numbers) >= UPSERT_ALIAS_VERSION
+
+    def _insert_rows(self, get_statement, params, **kwargs):
+        """
+        Execute multi-row statements (chunks are defined by the number of
+        rows and by the estimated statement size) in one transaction.
+
+        @param get_statement: Function to get statement for number of rows.
+        @type get_statement: function
+        @param params: List of rows (lists of values).
+        @type params: list
+        @param kwargs: Additional parameters.
         @type kwargs: dict
-        @return: Cursor object.
-        @rtype: Cursor
+
+        @keyword ignore: Flag that rows are skipped by statement (IGNORE),
+            warnings are not checked (skipped rows are counted by the number
+            of affected rows).
+        @keyword returning: Step between generated auto-increment values
+            (auto_increment_increment) to get them, None otherwise.
+        @keyword max_rows: Maximum number of rows per statement.
+
+        @return: Number of affected rows per chunk, generated keys, errors,
+            last insert id ("last_id") and number of skipped rows per chunk
+            (IGNORE).
+        @rtype: dict
+        @raise DatabaseException: exception in statement execution.
         """
-        # - warnings -> exceptions -
-        warnings.filterwarnings('error', category=mysql.Warning)
-        return super(MySQLDatabase, self).execute(
-            statement, parameters, modify=modify, **kwargs)
+        comma = self.op_connectors.get(ExprConnector.Comma)
+        max_rows = kwargs.get('max_rows') or self.max_insert_rows
+        max_size = int(self.get_max_packet_size() * self.packet_size_ratio)
+        max_size -= len(get_statement(0))
+        ignore = kwargs.get('ignore', False)
+
+        output = {'rows': [], 'keys': [], 'errors': [], 'skipped': [],
+                  'last_id': None}
+
+        def _insert(num_rows, data):
+            cursor = self.execute_write(
+                get_statement(num_rows), data, defer_warnings=ignore)
+            output['rows'].append(self.rows_affected(cursor))
+            output['last_id'] = self.last_insert_id(cursor)
+            if ignore:
+                output['skipped'].append(num_rows - output['rows'][-1])
+            if kwargs.get('returning'):
+                # - lastrowid is the value generated for the first row,
+                #   next values are stepped by auto_increment_increment -
+                step = kwargs['returning']
+                first_id = self.last_insert_id(cursor)
+                output['keys'].extend(
+                    range(first_id, first_id + num_rows * step, step))
+            cursor.close()
 
-    def executemany(self, statement, parameters, **kwargs):
+            if DEBUG_MODE:
+                print ('[MySQLDatabase._insert_rows] ' +
+                       '%s row(s) affected' % output['rows'][-1])
+
+        with self.atomic():
+            num_rows, size, data = 0, 0, []
+            for row in params:
+                # - estimated size of the row (values with separators) -
+                row_size = len(repr(tuple(row))) + len(comma)
+                if num_rows and (num_rows >= max_rows
+                                 or size + row_size > max_size):
+                    _insert(num_rows, data)
+                    num_rows, size, data = 0, 0, []
+                num_rows += 1
+                size += row_size
+                data.extend(row)
+            if num_rows:
+                _insert(num_rows, data)
+        return output
+
+    def insert_many(self, table, fields, params, **kwargs):
         """
-        Execute SQL statement with multiple inputs.
+        Insert multiple rows with multi-row VALUES statements.
+
+        Rows are split into chunks by the number of rows and by the estimated
+        statement size (with respect to max_allowed_packet), all chunks are
+        inserted in one transaction.
+
+        @param table: Table name.
+        @type table: str
+        @param fields: List of Field objects that correspond to parameters.
+        @type fields: list
+        @param params: List of rows (lists of values).
+        @type params: list
+        @param kwargs: Additional parameters.
+        @type kwargs: dict
 
-        @param statement: SQL query statement.
-        @type statement: str
-        @param parameters: Bind variables.
-        @type parameters: tuple/list/dict
-        @return: Cursor object.
-        @rtype: Cursor
+        @keyword ignore: Flag to skip rows that cannot be inserted (IGNORE).
+        @keyword returning: Field to get generated values (auto-increment
+            values are consecutive per statement with lock modes 0 and 1,
+            stepped by auto_increment_increment, not available with
+            "ignore").
+        @keyword max_rows: Maximum number of rows per statement.
+
+        @return: Number of inserted rows per chunk, generated keys, errors,
+            last insert id ("last_id") and number of skipped rows per chunk
+            (IGNORE).
+        @rtype: dict
+        @raise DatabaseException: exception in statement execution.
+        """
+        comma = self.op_connectors.get(ExprConnector.Comma)
+        row_values = '(%s)' % comma.join([self.interpolation] * len(fields))
+        statement_params = {
+            'name': 'insert_rows',
+            'ignore': kwargs.get('ignore', False),
+            'table': table,
+            'columns': comma.join(map(lambda x: x.column_name, fields))}
+
+        returning = None
+        if kwargs.get('returning') and not kwargs.get('ignore'):
+            lock_mode, increment = self.get_autoinc_settings()
+            if lock_mode in (0, 1):
+                returning = increment
+        return self._insert_rows(
+            lambda x: self.statements.get(
+                rows=comma.join([row_values] * x), **statement_params),
+            params,
+            ignore=kwargs.get('ignore', False),
+            returning=returning,
+            max_rows=kwargs.get('max_rows'))
+
+    def get_upsert_statement(self, table, fields, keys, update_fields,
+                             num_rows=1):
+        """
+        Get statement to insert rows or to update existing ones
+        (INSERT ... ON DUPLICATE KEY UPDATE, new values are referred by row
+        alias since MySQL 8.0.19 and by VALUES() function otherwise).
+
+        Unlike MERGE, existing rows are matched by any unique index of
+        the table, thus keys should cover all unique keys of the table.
+
+        @param table: Table name.
+        @type table: str
+        @param fields: List of Field objects that correspond to parameters.
+        @type fields: list
+        @param keys: List of key Field objects (defined by table keys).
+        @type keys: list
+        @param update_fields: List of Field objects to update.
+        @type update_fields: list
+        @param num_rows: Number of rows.
+        @type num_rows: int
+        @return: SQL statement.
+        @rtype: str
+        """
+        comma = self.op_connectors.get(ExprConnector.Comma)
+        row_values = '(%s)' % comma.join([self.interpolation] * len(fields))
+        with_alias = self.has_upsert_alias()
+
+        update_items = []
+        for field in update_fields:
+            if with_alias:
+                value = self.statements.get(**{
+                    'name': 'combined_column',
+                    'alias': UPSERT_ALIAS,
+                    'column': field.column_name})
+            else:
+                value = self.statements.get(**{
+                    'name': 'update_value',
+                    'column': field.column_name})
+            update_items.append(self.operations.get(**{
+                'name': OpCode.EQ,
+                'column': field.column_name,
+                'value': value}))
+        if not update_items:
+            # - nothing to update (existing rows are kept as is) -
+            update_items.append(self.operations.get(**{
+                'name': OpCode.EQ,
+                'column': keys[0].column_name,
+                'value': keys[0].column_name}))
+
+        return self.statements.get(**{
+            'name': with_alias and 'upsert_with_alias' or 'upsert',
+            'alias': UPSERT_ALIAS,
+            'table': table,
+            'columns': comma.join(map(lambda x: x.column_name, fields)),
+            'rows': comma.join([row_values] * num_rows),
+            'update_columns': comma.join(update_items)})
+
+    def upsert_many(self, table, fields, params, **kwargs):
+        """
+        Insert or update multiple rows with multi-row VALUES statements.
+
+        @param table: Table name.
+        @type table: str
+        @param fields: List of Field objects that correspond to parameters.
+        @type fields: list
+        @param params: List of rows (lists of values).
+        @type params: list
+        @param kwargs: Additional parameters.
+        @type kwargs: dict
+
+        @keyword keys: List of key Field objects.
+        @keyword update_fields: List of Field objects to update.
+        @keyword max_rows: Maximum number of rows per statement.
+
+        @return: Number of affected rows per chunk (an updated row is counted
+            twice), generated keys and errors.
+        @rtype: dict
+        @raise DatabaseException: exception in statement execution.
         """
-        # - warnings -> exceptions -
-        warnings.filterwarnings('error', category=mysql.Warning)
-        return super(MySQLDatabase, self).executemany(
-            statement, parameters, **kwargs)
+        return self._insert_rows(
+            lambda x: self.get_upsert_statement(
+                table, fields, kwargs['keys'], kwargs['update_fields'], x),
+            params,
+            max_rows=kwargs.get('max_rows'))
 
     def lookup_cast(self, column, lookup, values):
         """
@@ -15,6 +15,8 @@
 
 __all__ = ['OracleDatabase']
 
+from datetime import datetime, date
+
 try:
     import cx_Oracle as oracle
 except ImportError:
@@ -22,8 +24,8 @@ except ImportError:
 
 from _base import (
     ConnectionMeta, CursorMeta, Database, BaseOperations, BaseStatements)
-# from d2om.exception import DatabaseException
-from d2om.config.model import OpCode
+from d2om.exception import DatabaseException
+from d2om.config.model import OpCode, ExprConnector
 from d2om.config import DEBUG_MODE
 
 TZ_QUERY = "ALTER SESSION SET TIME_ZONE='0:0'"
@@ -63,6 +65,9 @@ class Connection(oracle.Connection):
         @rtype: Cursor
         """
         is_new = self.ensure()['is_new']
+        if is_new:
+            # - driver cache of parsed statements (per session) -
+            self.stmtcachesize = self._statement_cache_size
         cursor = Cursor(self)
         if is_new:
             cursor.execute(TZ_QUERY)
@@ -104,7 +109,7 @@ class Operations(BaseOperations):
 
     """Operations class contains SQL operations."""
 
-    _templates = BaseOperations._templates
+    _templates = dict(BaseOperations._templates)
     _templates.update({
         OpCode.IEQ: "REGEXP_LIKE($column, $value, 'i')",
         OpCode.ICONTAINS: "REGEXP_LIKE($column, $value, 'i')",
@@ -115,7 +120,7 @@ class Statements(BaseStatements):
 
     """Statements class contains SQL statements."""
 
-    _templates = BaseStatements._templates
+    _templates = dict(BaseStatements._templates)
     _templates.update({
         'insert_with_lastid': (
             'INSERT INTO $table ($columns) VALUES ($values) ' +
@@ -127,7 +132,25 @@ class Statements(BaseStatements):
         'select_with_pagination': (
             'SELECT * FROM (SELECT A.*, ROWNUM r_num FROM ($selectquery) A ' +
             'WHERE ROWNUM <= $limit) WHERE r_num >= $offset'),
-        'select_with_count': 'SELECT COUNT(1) FROM ($selectquery)'})
+        'select_with_count': 'SELECT COUNT(1) FROM ($selectquery)',
+        # - savepoints are released at the end of transaction -
+        'release_savepoint': '',
+        'upsert': (
+            'MERGE INTO $table t USING (SELECT $source FROM dual) s ' +
+            'ON ($on) $when_matched WHEN NOT MATCHED THEN ' +
+            'INSERT ($columns) VALUES ($insert_values)'),
+        'when_matched': 'WHEN MATCHED THEN UPDATE SET $when_matched',
+        # - global temporary table is created once (ORA-00955 is ignored) -
+        'create_temp_table': (
+            "BEGIN EXECUTE IMMEDIATE 'CREATE GLOBAL TEMPORARY TABLE $table " +
+            "(slot_id NUMBER NOT NULL, item $value_type) " +
+            "ON COMMIT PRESERVE ROWS'; EXCEPTION WHEN OTHERS THEN " +
+            "IF SQLCODE != -955 THEN RAISE; END IF; END;"),
+        'parse_stats': (
+            'SELECT n.name, s.value FROM v$$mystat s, v$$statname n ' +
+            'WHERE s.statistic# = n.statistic# AND n.name IN ' +
+            "('parse count (total)', 'parse count (hard)', " +
+            "'session cursor cache hits', 'execute count')")})
 
 
 class OracleDatabase(Database):
@@ -140,6 +163,15 @@ class OracleDatabase(Database):
     statements = Statements
     interpolation = ':a'
 
+    temp_value_types = {
+        int: 'NUMBER',
+        long: 'NUMBER',
+        float: 'NUMBER',
+        bool: 'NUMBER(1)',
+        str: 'VARCHAR2(4000)',
+        datetime: 'DATE',
+        date: 'DATE'}
+
     def execute_write(self, statement, parameters=None, **kwargs):
         """
         Execute modification SQL statement.
@@ -161,6 +193,182 @@ class OracleDatabase(Database):
         return super(OracleDatabase, self).execute_write(
             statement, parameters, **kwargs)
 
+    def create_temp_table(self, table, value_type, modify=False):
+        """
+        Create global temporary table (it is shared by sessions, thus DDL is
+        executed with read connection to keep write transaction intact).
+
+        @param table: Table name.
+        @type table: str
+        @param value_type: SQL type of values.
+        @type value_type: str
+        @param modify: Flag to use connection for modifications (ignored).
+        @type modify: bool
+        @raise DatabaseException: exception in statement execution.
+        """
+        if table not in self._get_connection().get_temp_tables():
+            super(OracleDatabase, self).create_temp_table(
+                table, value_type, modify=False)
+        self._get_connection(modify).get_temp_tables().add(table)
+
+    def _get_input_size(self, field):
+        """
+        Get type (or size) of bind variable for the field.
+
+        @param field: Field object.
+        @type field: Field
+        @return: Oracle type or maximum length of string.
+        @rtype: type/int/None
+        """
+        if not field._column:
+            return None
+        py_type = field._column._py_type
+        if py_type in (int, float, bool):
+            return oracle.NUMBER
+        elif py_type is str:
+            return field._column.attributes.get('max_length')
+        elif py_type in (datetime, date):
+            return oracle.DATETIME
+        return None
+
+    def insert_many(self, table, fields, params, **kwargs):
+        """
+        Insert multiple rows with array DML.
+
+        Types of bind variables are declared in advance (setinputsizes),
+        all chunks are inserted in one transaction.
+
+        @param table: Table name.
+        @type table: str
+        @param fields: List of Field objects that correspond to parameters.
+        @type fields: list
+        @param params: List of rows (lists of values).
+        @type params: list
+        @param kwargs: Additional parameters.
+        @type kwargs: dict
+
+        @keyword ignore: Flag to collect errors per row (batcherrors) and
+            to skip corresponding rows instead of the batch failure.
+        @keyword returning: Field to get generated values (RETURNING INTO).
+        @keyword max_rows: Maximum number of rows per statement execution.
+
+        @return: Number of inserted rows per chunk, generated keys, errors
+            and last insert id ("last_id", with "returning" only).
+        @rtype: dict
+        @raise DatabaseException: exception in statement execution.
+        """
+        comma = self.op_connectors.get(ExprConnector.Comma)
+        returning = kwargs.get('returning')
+        statement = self.statements.get(**{
+            'name': returning and 'insert_with_lastid' or 'insert',
+            'table': table,
+            'columns': comma.join(map(lambda x: x.column_name, fields)),
+            'values': comma.join(map(
+                lambda x: '%s%s' % (self.interpolation, x),
+                range(len(fields)))),
+            'column': returning and returning.column_name,
+            'returnvar': ':insert_id'})
+        input_sizes = map(self._get_input_size, fields)
+        batch_errors = bool(kwargs.get('ignore'))
+
+        output = {'rows': [], 'keys': [], 'errors': [], 'last_id': None}
+        max_rows = kwargs.get('max_rows') or len(params)
+        with self.atomic():
+            for offset in xrange(0, len(params), max_rows or 1):
+                data = params[offset:offset + max_rows]
+
+                cursor = self.get_cursor(modify=True)
+                if returning:
+                    returnvar = cursor.var(oracle.NUMBER, arraysize=len(data))
+                    cursor.setinputsizes(*(input_sizes + [returnvar]))
+                else:
+                    cursor.setinputsizes(*input_sizes)
+
+                if DEBUG_MODE:
+                    print '[OracleDatabase.insert_many] %s %s' % (
+                        statement, len(data))
+
+                try:
+                    cursor.executemany(statement, data,
+                                       batcherrors=batch_errors)
+                except Exception, e:
+                    cursor.close()
+                    raise DatabaseException(('%s ("%s" %s)' % (
+                        e, statement, data)).replace('\n', ''))
+
+                failed = set()
+                if batch_errors:
+                    for error in cursor.getbatcherrors():
+                        failed.add(error.offset)
+                        output['errors'].append(
+                            (offset + error.offset, error.message))
+
+                if returning:
+                    for i in xrange(len(data)):
+                        value = None
+                        if i not in failed:
+                            value = returnvar.getvalue(i)
+                            if isinstance(value, list):
+                                value = value and value[0] or None
+                        output['keys'].append(value)
+
+                output['rows'].append(self.rows_affected(cursor))
+                cursor.close()
+        keys = filter(lambda x: x is not None, output['keys'])
+        if keys:
+            output['last_id'] = keys[-1]
+        return output
+
+    def get_upsert_statement(self, table, fields, keys, update_fields,
+                             num_rows=1):
+        """
+        Get statement to insert rows or to update existing ones (MERGE).
+
+        @param table: Table name.
+        @type table: str
+        @param fields: List of Field objects that correspond to parameters.
+        @type fields: list
+        @param keys: List of key Field objects (to match existing rows).
+        @type keys: list
+        @param update_fields: List of Field objects to update.
+        @type update_fields: list
+        @param num_rows: Number of rows (one row per statement execution).
+        @type num_rows: int
+        @return: SQL statement.
+        @rtype: str
+        """
+        comma = self.op_connectors.get(ExprConnector.Comma)
+        connector = self.op_connectors.get(ExprConnector.AND)
+
+        def _column(alias, field):
+            return self.statements.get(**{
+                'name': 'combined_column',
+                'alias': alias,
+                'column': field.column_name})
+
+        def _eq(field):
+            return self.operations.get(**{
+                'name': OpCode.EQ,
+                'column': _column('t', field),
+                'value': _column('s', field)})
+
+        source_items = []
+        for i, field in enumerate(fields):
+            source_items.append(self.statements.get(**{
+                'name': 'column_with_alias',
+                'column': '%s%s' % (self.interpolation, i),
+                'alias': field.column_name}))
+
+        return self.statements.get(**{
+            'name': 'upsert',
+            'table': table,
+            'source': comma.join(source_items),
+            'on': connector.join(map(_eq, keys)),
+            'when_matched': comma.join(map(_eq, update_fields)),
+            'columns': comma.join(map(lambda x: x.column_name, fields)),
+            'insert_values': comma.join(map(lambda x: _column('s', x),
+                                            fields))})
+
     def lookup_cast(self, column, lookup, values):
         """
         Prepare query value for the certain operation.
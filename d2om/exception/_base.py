@@ -36,9 +36,13 @@ class ORMBaseException(Exception):
         @type level: int
         """
         f = sys._getframe(level)
+        # - raised by instance method or by class method -
+        owner = f.f_locals.get('self', f.f_locals.get('cls'))
+        if not isinstance(owner, type):
+            owner = owner.__class__
         self.message = self._template.substitute(
             exception_type=self.__class__.__name__,
-            class_name=f.f_locals['self'].__class__.__name__,
+            class_name=owner.__name__,
             class_method=f.f_code.co_name,
             error_message=value and ': %s' % value or '')
 
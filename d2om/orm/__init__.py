@@ -10,17 +10,43 @@
 __all__ = [
     'Field',
     'ForeignKeyField',
+    'ColumnExpression',
+    'Function',
+    'Greatest',
+    'Least',
+    'Coalesce',
+    'Sum',
+    'Count',
+    'Avg',
+    'Min',
+    'Max',
+    'RowNumber',
+    'Rank',
+    'DenseRank',
+    'Param',
+    'Cte',
     'Model',
     'RawQuery',
     'SelectQuery',
     'InsertQuery',
     'UpdateQuery',
     'DeleteQuery',
-    'Session'
+    'UpsertQuery',
+    'PreparedQuery',
+    'CompoundSelectQuery',
+    'Session',
+    'TableCache',
+    'WriteBuffer'
 ]
 
-from d2om.orm.field import Field, ForeignKeyField
+from d2om.orm.field import (
+    Field, ForeignKeyField, ColumnExpression, Function, Greatest, Least,
+    Coalesce, Sum, Count, Avg, Min, Max, RowNumber, Rank, DenseRank, Param,
+    Cte)
 from d2om.orm.model import Model
 from d2om.orm.query import (
-    RawQuery, SelectQuery, InsertQuery, UpdateQuery, DeleteQuery)
+    RawQuery, SelectQuery, InsertQuery, UpdateQuery, DeleteQuery,
+    UpsertQuery, PreparedQuery, CompoundSelectQuery)
 from d2om.orm.session import Session
+from d2om.orm.cache import TableCache
+from d2om.orm.buffer import WriteBuffer
@@ -0,0 +1,389 @@
+#
+# Copyright 2014 Mikhail Titov
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Authors:
+# - Mikhail Titov, <mikhail.titov@cern.ch>, 2014
+#
+"""Write-behind buffer definition (batched inserts/upserts).
+"""
+
+__all__ = ['WriteBuffer']
+
+from collections import OrderedDict
+import Queue
+import threading
+import time
+
+from d2om.config import DEBUG_MODE
+from d2om.exception import DatabaseException
+
+INSERT = 'insert'
+UPSERT = 'upsert'
+
+
+class WriteBuffer(object):
+
+    """WriteBuffer class collects rows and writes them with bulk statements."""
+
+    def __init__(self, model, batch_size=1000, flush_interval=1.0,
+                 max_size=10000, put_timeout=None, max_retries=3):
+        """
+        Initialization.
+
+        Rows are written with the write connection of the model database
+        inside of atomic block (the connection is locked by the writing
+        thread, thus flushes do not interfere with atomic blocks of other
+        threads).
+
+        @param model: Model class.
+        @type model: type
+        @param batch_size: Number of rows that triggers the flush (and
+            maximum number of rows per statement execution).
+        @type batch_size: int
+        @param flush_interval: Maximum time between flushes (in seconds).
+        @type flush_interval: float
+        @param max_size: Maximum number of rows in the queue.
+        @type max_size: int
+        @param put_timeout: Time to wait for free space in the queue (in
+            seconds, infinitely if None), full queue is flushed inline if
+            background flushing is not started.
+        @type put_timeout: float/None
+        @param max_retries: Number of retries for a failed group of rows
+            (rows are dropped after that).
+        @type max_retries: int
+        """
+        self._model = model
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._put_timeout = put_timeout
+        self._max_retries = max_retries
+
+        self._queue = Queue.Queue(maxsize=max_size)
+        self._pending = []  # [(<groupKey>, <rows>, <numberOfAttempts>)]
+        self._flush_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._flusher = None
+        self._closed = False
+        self._put_condition = threading.Condition()
+        self._active_puts = 0  # number of puts that are in progress
+        self._last_error = None
+
+        self._stats = {
+            'flushes': 0,
+            'rows': 0,
+            'last_rows': 0,
+            'errors': 0,
+            'retried_rows': 0,
+            'failed_rows': 0,
+            'last_latency': None,
+            'max_latency': None,
+            'total_latency': 0.0}
+
+        self._model._meta.write_buffer = self
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self._queue.qsize() + sum(map(lambda x: len(x[1]),
+                                             self._pending))
+
+    def _is_flushing(self):
+        """
+        Check that background flushing is active.
+
+        @return: Flag that the flusher thread is alive.
+        @rtype: bool
+        """
+        return bool(self._flusher and self._flusher.is_alive())
+
+    def _put(self, kind, kwargs, update_fields=None):
+        """
+        Put row into the queue (wait if the queue is full, or flush it inline
+        if there is no background flushing).
+
+        @param kind: Type of the operation (insert/upsert).
+        @type kind: str
+        @param kwargs: Field names with corresponding values.
+        @type kwargs: dict
+        @param update_fields: Field names to update (upsert only).
+        @type update_fields: list/None
+        @raise ValueError: buffer is closed.
+        @raise Queue.Full: no free space in the queue (after put_timeout).
+        @raise Exception: exception of the inline flush (row is not added).
+        """
+        with self._put_condition:
+            if self._closed:
+                raise ValueError('[WriteBuffer._put] Buffer is closed')
+            self._active_puts += 1
+
+        names = tuple(sorted(kwargs))
+        if update_fields is not None:
+            update_fields = tuple(sorted(update_fields))
+        item = ((kind, names, update_fields), map(lambda x: kwargs[x], names))
+        try:
+            while not self._is_flushing():
+                try:
+                    self._queue.put_nowait(item)
+                    break
+                except Queue.Full:
+                    # - nobody else frees space in the queue -
+                    self.flush()
+            else:
+                self._queue.put(item, timeout=self._put_timeout)
+        finally:
+            with self._put_condition:
+                self._active_puts -= 1
+                self._put_condition.notify_all()
+
+        if self._queue.qsize() >= self._batch_size:
+            self._flush_event.set()
+
+    def insert(self, **kwargs):
+        """
+        Add row to insert.
+
+        @param kwargs: Field names with corresponding values.
+        @type kwargs: dict
+        """
+        data = self._model._meta.get_defaults()
+        data.update(kwargs)
+        self._put(INSERT, data)
+
+    def upsert(self, update_fields=None, **kwargs):
+        """
+        Add row to insert or update.
+
+        @param update_fields: Field names to update (all except key fields
+            by default).
+        @type update_fields: list/None
+        @param kwargs: Field names with corresponding values.
+        @type kwargs: dict
+        """
+        self._put(UPSERT, kwargs, update_fields)
+
+    def _get_rows(self):
+        """
+        Get failed groups (to retry) and all rows from the queue grouped by
+        operation and field names.
+
+        @return: Groups of rows with the number of previous attempts.
+        @rtype: list
+        """
+        output, self._pending = self._pending, []
+
+        groups = OrderedDict()  # {(<kind>, <names>, <updateFields>): [<row>]}
+        while True:
+            try:
+                key, row = self._queue.get_nowait()
+            except Queue.Empty:
+                break
+            groups.setdefault(key, []).append(row)
+        return output + map(lambda x: (x[0], x[1], 0), groups.iteritems())
+
+    def _write(self, kind, names, update_fields, rows):
+        """
+        Write rows with bulk statements.
+
+        @param kind: Type of the operation (insert/upsert).
+        @type kind: str
+        @param names: Field names.
+        @type names: tuple
+        @param update_fields: Field names to update (upsert only).
+        @type update_fields: tuple/None
+        @param rows: List of rows.
+        @type rows: list
+        """
+        # - group is written (or rolled back) as a whole -
+        with self._model._meta.database.atomic():
+            if kind == UPSERT:
+                self._model.upsert_many(
+                    list(names), rows,
+                    update_fields=update_fields and list(update_fields),
+                    batch_size=self._batch_size).execute()
+            else:
+                self._model.insertmany(
+                    list(names), rows).batch(self._batch_size).execute()
+
+    def flush(self):
+        """
+        Write all buffered rows.
+
+        @return: Number of written rows.
+        @rtype: int
+        @raise Exception: exception from the last failed write (rows of
+            the failed group are kept for the next flush, till the number
+            of retries is exceeded or till the buffer is closed).
+        """
+        with self._flush_lock:
+            self._flush_event.clear()
+            groups = self._get_rows()
+            if not groups:
+                return 0
+
+            started = time.time()
+            num_rows, error = 0, None
+            for key, rows, attempts in groups:
+                try:
+                    self._write(key[0], key[1], key[2], rows)
+                except Exception, e:
+                    error = self._last_error = e
+                    self._stats['errors'] += 1
+                    if attempts < self._max_retries or self._closed:
+                        # - rows of closed buffer are returned by close() -
+                        self._pending.append((key, rows, attempts + 1))
+                        self._stats['retried_rows'] += len(rows)
+                    else:
+                        self._stats['failed_rows'] += len(rows)
+
+                    if DEBUG_MODE:
+                        print '[WriteBuffer.flush] %s' % e
+                else:
+                    num_rows += len(rows)
+
+            latency = time.time() - started
+            self._stats['flushes'] += 1
+            self._stats['rows'] += num_rows
+            self._stats['last_rows'] = num_rows
+            self._stats['last_latency'] = latency
+            self._stats['max_latency'] = max(
+                latency, self._stats['max_latency'])
+            self._stats['total_latency'] += latency
+
+        if DEBUG_MODE:
+            print ('[WriteBuffer] %s: %s row(s) in %.3fs' %
+                   (self._model._meta.name, num_rows, latency))
+
+        if error is not None:
+            raise error
+        return num_rows
+
+    def start(self):
+        """Start background flushing."""
+        if self._is_flushing():
+            return
+        self._flusher = BufferFlusher(self, self._flush_interval)
+        self._flusher.start()
+
+    def close(self, timeout=None):
+        """
+        Stop background flushing and write remaining rows (rows that are
+        being added are waited for).
+
+        @param timeout: Time to wait for the flusher thread (in seconds).
+        @type timeout: float/None
+        @return: Number of written rows (by the final flush).
+        @rtype: int
+        @raise DatabaseException: rows are not written by the final flush
+            (they are kept at attribute "rows" of the exception as tuples
+            (<kind>, <values>, <updateFields>)).
+        """
+        with self._put_condition:
+            self._closed = True
+        while True:
+            with self._put_condition:
+                if not self._active_puts:
+                    break
+                self._put_condition.wait(self._flush_interval)
+            if self._queue.full():
+                # - free space for rows that are being added -
+                self._flush_event.set()
+                if not self._is_flushing():
+                    self.flush()
+
+        if self._flusher:
+            self._flusher.stop(timeout)
+            self._flusher = None
+        if self._model._meta.write_buffer is self:
+            self._model._meta.write_buffer = None
+
+        try:
+            return self.flush()
+        except Exception, e:
+            failed, self._pending = self._pending, []
+            rows = []
+            for (kind, names, update_fields), values, _ in failed:
+                rows.extend(map(
+                    lambda x: (kind, dict(zip(names, x)), update_fields),
+                    values))
+            self._stats['failed_rows'] += len(rows)
+            error = DatabaseException(
+                '%s row(s) are not written (%s)' % (len(rows), e))
+            error.rows = rows
+            raise error
+
+    def get_stats(self):
+        """
+        Get buffer statistics.
+
+        @return: Statistics (queue depth, flush latency, rows per flush, the
+            last write error, etc.).
+        @rtype: dict
+        """
+        output = dict(self._stats)
+        output['queue_size'] = len(self)
+        output['last_error'] = self._last_error
+        output['rows_per_flush'] = None
+        output['avg_latency'] = None
+        if output['flushes']:
+            output['rows_per_flush'] = (
+                float(output['rows']) / output['flushes'])
+            output['avg_latency'] = output['total_latency'] / output['flushes']
+        return output
+
+
+class BufferFlusher(threading.Thread):
+
+    """BufferFlusher class flushes WriteBuffer in a background thread."""
+
+    def __init__(self, buffer, interval):
+        """
+        Initialization.
+
+        @param buffer: WriteBuffer object.
+        @type buffer: WriteBuffer
+        @param interval: Maximum time between flushes (in seconds).
+        @type interval: float
+        """
+        super(BufferFlusher, self).__init__()
+        self.daemon = True
+
+        self._buffer = buffer
+        self._interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """Flush buffer on size/time trigger until the thread is stopped."""
+        while not self._stop_event.is_set():
+            self._buffer._flush_event.wait(self._interval)
+            if self._stop_event.is_set():
+                break
+
+            try:
+                self._buffer.flush()
+            except Exception, e:
+                # - error is kept by the buffer (statistics "last_error") -
+                if DEBUG_MODE:
+                    print '[BufferFlusher.run] %s' % e
+
+    def stop(self, timeout=None):
+        """
+        Stop the thread.
+
+        @param timeout: Time to wait for the thread (in seconds).
+        @type timeout: float/None
+        """
+        self._stop_event.set()
+        self._buffer._flush_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
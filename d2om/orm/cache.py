@@ -0,0 +1,427 @@
+#
+# Copyright 2014 Mikhail Titov
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Authors:
+# - Mikhail Titov, <mikhail.titov@cern.ch>, 2014
+#
+"""Caches definition (in-memory copies of database data).
+"""
+
+__all__ = [
+    'NegativeCache',
+    'TableCache'
+]
+
+from collections import OrderedDict
+import random
+import threading
+import time
+
+from d2om.config import DEBUG_MODE
+
+
+class TableCache(object):
+
+    """TableCache class keeps table rows (Model objects) in memory."""
+
+    def __init__(self, model, indexes=None, overlap=None):
+        """
+        Initialization.
+
+        @param model: Model class.
+        @type model: type
+        @param indexes: Names of fields that should be indexed.
+        @type indexes: list/None
+        @param overlap: Safety margin subtracted from the change marker at
+            refresh (e.g., timedelta for timestamps), rows that are committed
+            later with an earlier marker value (long transactions) are not
+            missed within this window.
+        @type overlap: timedelta/int/float/None
+        """
+        self._model = model
+        self._overlap = overlap
+        self._lock = threading.RLock()
+        self._refresher = None
+
+        self._data = {}  # {<pk>: <instance>}
+        self._indexes = {}  # {<fieldName>: {<value>: set(<pk>)}}
+        for name in indexes or []:
+            field = self._model.get_field(name)
+            if not field:
+                raise ValueError('[TableCache.__init__] ' +
+                                 'Field "%s" is not defined in model' % name)
+            self._indexes[field.name] = {}
+
+        self._last_seen = None
+        self._stats = {
+            'refreshes': 0,
+            'reconciles': 0,
+            'errors': 0,
+            'rows': 0,
+            'total_rows': 0,
+            'deleted_rows': 0,
+            'duration': None,
+            'last_refresh': None}
+
+        self._model._meta.table_cache = self
+
+    def __len__(self):
+        return len(self._data)
+
+    def _get_change_field(self):
+        """
+        Get field with monotonically increasing value (change marker).
+
+        @return: Field object.
+        @rtype: Field/None
+        """
+        if self._model._meta.change_column:
+            return self._model.get_field(self._model._meta.change_column)
+
+    def _add(self, instance):
+        """
+        Add (or replace) instance and update indexes.
+
+        @param instance: Model object.
+        @type instance: Model
+        """
+        pk = instance.get_pk()
+        if pk in self._data:
+            self._remove(pk)
+        self._data[pk] = instance
+        for name, index in self._indexes.iteritems():
+            index.setdefault(getattr(instance, name), set()).add(pk)
+
+    def _remove(self, pk):
+        """
+        Remove instance with defined primary key and update indexes.
+
+        @param pk: Primary key value.
+        @type pk: int/str
+        """
+        instance = self._data.pop(pk, None)
+        if instance is None:
+            return
+        for name, index in self._indexes.iteritems():
+            value = getattr(instance, name)
+            pks = index.get(value)
+            if pks is not None:
+                pks.discard(pk)
+                if not pks:
+                    del index[value]
+
+    def _update_marker(self, instance):
+        """
+        Keep the highest value of the change marker.
+
+        @param instance: Model object.
+        @type instance: Model
+        """
+        field = self._get_change_field()
+        if field:
+            value = getattr(instance, field.name)
+            if value is not None and (self._last_seen is None
+                                      or value > self._last_seen):
+                self._last_seen = value
+
+    def _set_stats(self, rows, started):
+        """
+        Update statistics after the refresh.
+
+        @param rows: Number of loaded rows.
+        @type rows: int
+        @param started: Timestamp of the refresh start.
+        @type started: float
+        """
+        finished = time.time()
+        self._stats['refreshes'] += 1
+        self._stats['rows'] = rows
+        self._stats['total_rows'] += rows
+        self._stats['duration'] = finished - started
+        self._stats['last_refresh'] = finished
+
+        if DEBUG_MODE:
+            print ('[TableCache] %s: %s row(s) in %.3fs' %
+                   (self._model._meta.name, rows, finished - started))
+
+    def load(self):
+        """
+        Load the whole table.
+
+        @return: Number of loaded rows.
+        @rtype: int
+        """
+        started = time.time()
+        instances = list(self._model.select())
+        with self._lock:
+            self._data = {}
+            for index in self._indexes.itervalues():
+                index.clear()
+            self._last_seen = None
+            for instance in instances:
+                self._add(instance)
+                self._update_marker(instance)
+            self._set_stats(len(instances), started)
+        return len(instances)
+
+    def refresh(self):
+        """
+        Load rows that were changed since the last refresh (delta).
+
+        @return: Number of loaded rows.
+        @rtype: int
+        """
+        field = self._get_change_field()
+        if not field or self._last_seen is None:
+            return self.load()
+
+        # - rows with the same (or earlier, within the overlap) marker value
+        # could be committed after the previous refresh, thus they are read
+        # again and replaced by primary key -
+        last_seen = self._last_seen
+        if self._overlap:
+            last_seen -= self._overlap
+
+        started = time.time()
+        instances = list(self._model.select().filter(field >= last_seen))
+        with self._lock:
+            for instance in instances:
+                self._add(instance)
+                self._update_marker(instance)
+            self._set_stats(len(instances), started)
+        return len(instances)
+
+    def reconcile(self):
+        """
+        Remove rows that were deleted at database (primary keys diff).
+
+        @return: Number of removed rows.
+        @rtype: int
+        """
+        # - snapshot is taken under the lock, thus rows that are added by
+        # concurrent refresh are not removed -
+        with self._lock:
+            pks = set(map(lambda x: x.get_pk(),
+                          self._model.select(self._model.get_pk_name())))
+            deleted = set(self._data) - pks
+            for pk in deleted:
+                self._remove(pk)
+            self._stats['reconciles'] += 1
+            self._stats['deleted_rows'] += len(deleted)
+        return len(deleted)
+
+    def get(self, pk):
+        """
+        Get instance by primary key.
+
+        @param pk: Primary key value.
+        @type pk: int/str
+        @return: Model object.
+        @rtype: Model/None
+        """
+        return self._data.get(pk)
+
+    def lookup(self, name, value):
+        """
+        Get instances by value of the indexed field.
+
+        @param name: Field name.
+        @type name: str
+        @param value: Field value.
+        @type value: any
+        @return: List of Model objects.
+        @rtype: list
+        @raise ValueError: field is not indexed.
+        """
+        field = self._model.get_field(name)
+        if not field or field.name not in self._indexes:
+            raise ValueError('[TableCache.lookup] ' +
+                             'Field "%s" is not indexed' % name)
+        with self._lock:
+            pks = self._indexes[field.name].get(field.py_value(value), ())
+            return map(lambda x: self._data[x], pks)
+
+    def get_stats(self):
+        """
+        Get refresh statistics.
+
+        @return: Statistics (number of rows per refresh, lag in seconds, etc.).
+        @rtype: dict
+        """
+        output = dict(self._stats)
+        output['size'] = len(self._data)
+        output['lag'] = None
+        if output['last_refresh']:
+            output['lag'] = time.time() - output['last_refresh']
+        return output
+
+    def start(self, interval, jitter=0.1, reconcile_every=None):
+        """
+        Start background refreshing.
+
+        @param interval: Time between refreshes (in seconds).
+        @type interval: float
+        @param jitter: Deviation of the interval (fraction of the interval).
+        @type jitter: float
+        @param reconcile_every: Reconcile deletes every N refreshes.
+        @type reconcile_every: int/None
+        """
+        if self._refresher and self._refresher.is_alive():
+            return
+        self._refresher = CacheRefresher(
+            self, interval, jitter=jitter, reconcile_every=reconcile_every)
+        self._refresher.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop background refreshing.
+
+        @param timeout: Time to wait for the refresher thread (in seconds).
+        @type timeout: float/None
+        """
+        if self._refresher:
+            self._refresher.stop(timeout)
+            self._refresher = None
+
+
+class CacheRefresher(threading.Thread):
+
+    """CacheRefresher class refreshes TableCache in a background thread."""
+
+    def __init__(self, cache, interval, jitter=0.1, reconcile_every=None):
+        """
+        Initialization.
+
+        @param cache: TableCache object.
+        @type cache: TableCache
+        @param interval: Time between refreshes (in seconds).
+        @type interval: float
+        @param jitter: Deviation of the interval (fraction of the interval).
+        @type jitter: float
+        @param reconcile_every: Reconcile deletes every N refreshes.
+        @type reconcile_every: int/None
+        """
+        super(CacheRefresher, self).__init__()
+        self.daemon = True
+
+        self._cache = cache
+        self._interval = interval
+        self._jitter = min(max(jitter, 0.0), 0.9)
+        self._reconcile_every = reconcile_every
+        self._stop_event = threading.Event()
+
+    def _get_delay(self):
+        """
+        Get time until the next refresh.
+
+        @return: Delay (in seconds).
+        @rtype: float
+        """
+        return self._interval * (
+            1 + random.uniform(-self._jitter, self._jitter))
+
+    def run(self):
+        """Refresh cache until the thread is stopped."""
+        counter = 0
+        while not self._stop_event.is_set():
+            self._stop_event.wait(self._get_delay())
+            if self._stop_event.is_set():
+                break
+
+            try:
+                self._cache.refresh()
+                counter += 1
+                if (self._reconcile_every
+                        and not counter % self._reconcile_every):
+                    self._cache.reconcile()
+            except Exception, e:
+                self._cache._stats['errors'] += 1
+
+                if DEBUG_MODE:
+                    print '[CacheRefresher.run] %s' % e
+
+    def stop(self, timeout=None):
+        """
+        Stop the thread.
+
+        @param timeout: Time to wait for the thread (in seconds).
+        @type timeout: float/None
+        """
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+
+class NegativeCache(object):
+
+    """NegativeCache class keeps lookups that returned no data (with TTL)."""
+
+    def __init__(self, ttl=5.0, size=10000):
+        """
+        Initialization.
+
+        @param ttl: Time to live for cached lookups (in seconds).
+        @type ttl: float
+        @param size: Maximum number of cached lookups.
+        @type size: int
+        """
+        self._ttl = ttl
+        self._size = size
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # {<key>: <expiration time>}
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        """
+        Check that lookup is cached (and is not expired).
+
+        @param key: Lookup key (field name and value).
+        @type key: tuple
+        @return: Flag that lookup is cached.
+        @rtype: bool
+        """
+        with self._lock:
+            expiration = self._data.get(key)
+            if expiration is not None and expiration < time.time():
+                del self._data[key]
+                expiration = None
+            self._stats['hits' if expiration else 'misses'] += 1
+        return expiration is not None
+
+    def add(self, key):
+        """
+        Add lookup that returned no data.
+
+        @param key: Lookup key (field name and value).
+        @type key: tuple
+        """
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = time.time() + self._ttl
+            while len(self._data) > self._size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove all cached lookups."""
+        with self._lock:
+            self._data.clear()
+
+    def get_stats(self):
+        """
+        Get cache statistics.
+
+        @return: Number of hits and misses, and current size.
+        @rtype: dict
+        """
+        output = dict(self._stats)
+        output['size'] = len(self._data)
+        return output
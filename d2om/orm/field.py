@@ -18,14 +18,37 @@ __all__ = [
     'ForeignKeyField',
     'Expression',
     'ExpressionSet',
-    'Ordering'
+    'Ordering',
+    'ColumnExpression',
+    'Function',
+    'Greatest',
+    'Least',
+    'Coalesce',
+    'Aggregate',
+    'Sum',
+    'Count',
+    'Avg',
+    'Min',
+    'Max',
+    'RowNumber',
+    'Rank',
+    'DenseRank',
+    'Window',
+    'Param',
+    'Cte',
+    'FalseExpression'
 ]
 
+from collections import OrderedDict
+from datetime import date
+
 from d2om.exception import NoDataException
-from d2om.config.model import OpCode, ExprConnector
+from d2om.config.model import ArithmeticOp, OpCode, ExprConnector
 #from d2om.config import DEBUG_MODE
 
 OP_SEPARATOR = '__'
+# - types of values that can be merged into IN-lists -
+LITERAL_TYPES = (basestring, int, long, float, date)
 
 
 class FieldDescriptor(object):
@@ -178,6 +201,15 @@ def set_expressionset(connector):
     return inner
 
 
+def set_arithmetic(op, reflected=False):
+    def inner(self, rhs):
+        """Set up ColumnExpression object (arithmetic operation)."""
+        if reflected:
+            return ColumnExpression(rhs, op, self)
+        return ColumnExpression(self, op, rhs)
+    return inner
+
+
 class Field(object):
 
     """Field class to describe Model attribute."""
@@ -203,6 +235,7 @@ class Field(object):
             self._column = column_type(**kwargs)
 
         self._primary = False
+        self._unique = False
         self._nullable = False
         self._default = None
         self._alias = None
@@ -237,6 +270,18 @@ class Field(object):
         self._primary = bool(primary)
         return self
 
+    def unique(self, unique=True):
+        """
+        Set up flag "unique".
+
+        @param unique: Flag for field with unique values.
+        @type unique: bool
+        @return: Self instance.
+        @rtype: Field
+        """
+        self._unique = bool(unique)
+        return self
+
     def nullable(self, nullable=True):
         """
         Set up flag "nullable".
@@ -286,6 +331,13 @@ class Field(object):
     __mul__ = set_expression(OpCode.CONTAINS)
     __pow__ = set_expression(OpCode.ICONTAINS)
     __xor__ = set_expression(OpCode.ISTARTSWITH)
+    # - arithmetic operations ("*" is reserved for CONTAINS operation) -
+    __add__ = set_arithmetic(ArithmeticOp.ADD)
+    __sub__ = set_arithmetic(ArithmeticOp.SUB)
+    __div__ = set_arithmetic(ArithmeticOp.DIV)
+    __radd__ = set_arithmetic(ArithmeticOp.ADD, reflected=True)
+    __rsub__ = set_arithmetic(ArithmeticOp.SUB, reflected=True)
+    __rdiv__ = set_arithmetic(ArithmeticOp.DIV, reflected=True)
 
     def db_value(self, value):
         """
@@ -301,6 +353,20 @@ class Field(object):
             raise ValueError('[Field.db_value] Column object is not defined')
         return self._column.db_value(value)
 
+    def db_values(self, values):
+        """
+        Get correct values to store to database (column-wise conversion).
+
+        @param values: Input values.
+        @type values: list
+        @return: Converted values.
+        @rtype: list
+        @raise ValueError: Column type is not defined.
+        """
+        if not self._column:
+            raise ValueError('[Field.db_values] Column object is not defined')
+        return self._column.db_values(values)
+
     def py_value(self, value):
         """
         Get correct value to operate in application.
@@ -315,6 +381,20 @@ class Field(object):
             raise ValueError('[Field.py_value] Column object is not defined')
         return self._column.py_value(value)
 
+    def key_value(self, value):
+        """
+        Get canonical representation of the value (e.g., to be hashed).
+
+        @param value: Input value
+        @type value: any
+        @return: Canonical value.
+        @rtype: str/None
+        @raise ValueError: Column type is not defined.
+        """
+        if not self._column:
+            raise ValueError('[Field.key_value] Column object is not defined')
+        return self._column.key_value(value)
+
     def asc(self):
         """
         Get instance of Ordering class (ASC).
@@ -434,6 +514,291 @@ class Ordering(object):
         return ''
 
 
+class ColumnNode(object):
+
+    """ColumnNode class is basic for computed column values (SQL side)."""
+
+    # - conditions (e.g., for having-clause) -
+    __eq__ = set_expression(OpCode.EQ)
+    __ne__ = set_expression(OpCode.NE)
+    __lt__ = set_expression(OpCode.LT)
+    __le__ = set_expression(OpCode.LE)
+    __gt__ = set_expression(OpCode.GT)
+    __ge__ = set_expression(OpCode.GE)
+    __lshift__ = set_expression(OpCode.IN)
+    __hash__ = object.__hash__
+
+    __add__ = set_arithmetic(ArithmeticOp.ADD)
+    __sub__ = set_arithmetic(ArithmeticOp.SUB)
+    __mul__ = set_arithmetic(ArithmeticOp.MUL)
+    __div__ = set_arithmetic(ArithmeticOp.DIV)
+    __radd__ = set_arithmetic(ArithmeticOp.ADD, reflected=True)
+    __rsub__ = set_arithmetic(ArithmeticOp.SUB, reflected=True)
+    __rmul__ = set_arithmetic(ArithmeticOp.MUL, reflected=True)
+    __rdiv__ = set_arithmetic(ArithmeticOp.DIV, reflected=True)
+
+    def get_operands(self):
+        """
+        Get operands (Fields, ColumnNodes or values).
+
+        @return: List of operands.
+        @rtype: list
+        """
+        return []
+
+    def get_models(self):
+        """
+        Get models of fields that are used.
+
+        @return: Set of models.
+        @rtype: set
+        """
+        models = set()
+        for operand in self.get_operands():
+            if isinstance(operand, Field):
+                models.add(operand.model)
+            elif isinstance(operand, ColumnNode):
+                models.update(operand.get_models())
+        return models
+
+
+class ColumnExpression(ColumnNode):
+
+    """ColumnExpression class represents arithmetic operation with columns."""
+
+    def __init__(self, lhs, op, rhs):
+        """
+        Initialization.
+
+        @param lhs: Left operand (Field, ColumnNode or value).
+        @type lhs: Field/ColumnNode/any
+        @param op: ArithmeticOp value.
+        @type op: str
+        @param rhs: Right operand (Field, ColumnNode or value).
+        @type rhs: Field/ColumnNode/any
+        """
+        if op not in ArithmeticOp.values:
+            raise ValueError('[ColumnExpression.__init__] ' +
+                             'Incorrect arithmetic operation')
+        self.lhs = lhs
+        self.op = op
+        self.rhs = rhs
+
+    def get_operands(self):
+        """
+        Get operands (Fields, ColumnNodes or values).
+
+        @return: List of operands.
+        @rtype: list
+        """
+        return [self.lhs, self.rhs]
+
+
+class Function(ColumnNode):
+
+    """Function class represents SQL function call."""
+
+    funcname = None
+
+    def __init__(self, *args):
+        """
+        Initialization.
+
+        @param args: Function arguments (Fields, ColumnNodes or values).
+        @type args: list
+        """
+        self.args = args
+
+    def get_operands(self):
+        """
+        Get operands (Fields, ColumnNodes or values).
+
+        @return: List of operands.
+        @rtype: list
+        """
+        return list(self.args)
+
+    def over(self, partition_by=None, order_by=None):
+        """
+        Get window function (function is applied over the window of rows).
+
+        @param partition_by: Fields to partition rows.
+        @type partition_by: list/None
+        @param order_by: Fields or Orderings to sort rows within partition.
+        @type order_by: list/None
+        @return: Window object.
+        @rtype: Window
+        """
+        return Window(self, partition_by, order_by)
+
+
+class Greatest(Function):
+
+    """Greatest class represents SQL function GREATEST."""
+
+    funcname = 'GREATEST'
+
+
+class Least(Function):
+
+    """Least class represents SQL function LEAST."""
+
+    funcname = 'LEAST'
+
+
+class Coalesce(Function):
+
+    """Coalesce class represents SQL function COALESCE."""
+
+    funcname = 'COALESCE'
+
+
+class RowNumber(Function):
+
+    """RowNumber class represents SQL window function ROW_NUMBER."""
+
+    funcname = 'ROW_NUMBER'
+
+
+class Rank(Function):
+
+    """Rank class represents SQL window function RANK."""
+
+    funcname = 'RANK'
+
+
+class DenseRank(Function):
+
+    """DenseRank class represents SQL window function DENSE_RANK."""
+
+    funcname = 'DENSE_RANK'
+
+
+class Window(ColumnNode):
+
+    """Window class represents function over the window of rows (OVER)."""
+
+    def __init__(self, function, partition_by=None, order_by=None):
+        """
+        Initialization.
+
+        @param function: Function object (e.g., RowNumber, Sum).
+        @type function: Function
+        @param partition_by: Fields to partition rows.
+        @type partition_by: list/None
+        @param order_by: Fields or Orderings to sort rows within partition.
+        @type order_by: list/None
+        """
+        self.function = function
+        self.partition_by = list(partition_by or [])
+        self.order_by = map(lambda x: isinstance(x, Ordering) and x
+                            or Ordering(x), order_by or [])
+
+    def get_operands(self):
+        """
+        Get operands (Fields, ColumnNodes or values).
+
+        @return: List of operands.
+        @rtype: list
+        """
+        return ([self.function] + self.partition_by
+                + map(lambda x: x.field, self.order_by))
+
+
+class Aggregate(Function):
+
+    """Aggregate class is basic for SQL aggregate functions."""
+
+    pass
+
+
+class Sum(Aggregate):
+
+    """Sum class represents SQL aggregate function SUM."""
+
+    funcname = 'SUM'
+
+
+class Count(Aggregate):
+
+    """Count class represents SQL aggregate function COUNT (COUNT(*) if
+    there are no arguments)."""
+
+    funcname = 'COUNT'
+
+
+class Avg(Aggregate):
+
+    """Avg class represents SQL aggregate function AVG."""
+
+    funcname = 'AVG'
+
+
+class Min(Aggregate):
+
+    """Min class represents SQL aggregate function MIN."""
+
+    funcname = 'MIN'
+
+
+class Max(Aggregate):
+
+    """Max class represents SQL aggregate function MAX."""
+
+    funcname = 'MAX'
+
+
+class Param(object):
+
+    """Param class represents named placeholder of the prepared query."""
+
+    def __init__(self, name, field=None, op=None):
+        """
+        Initialization.
+
+        @param name: Parameter name.
+        @type name: str
+        @param field: Field object (set while query is compiled).
+        @type field: Field/None
+        @param op: Condition operation (set while query is compiled).
+        @type op: str/None
+        """
+        self.name = name
+        self.field = field
+        self.op = op
+
+    def bind(self, field, op):
+        """
+        Get parameter that is bound to the condition.
+
+        @param field: Field object.
+        @type field: Field
+        @param op: Condition operation.
+        @type op: str
+        @return: New object of Param class.
+        @rtype: Param
+        """
+        return Param(self.name, field, op)
+
+
+class Cte(object):
+
+    """Cte class represents reference to the common table expression
+    (defined by SelectQuery.with_cte)."""
+
+    def __init__(self, name, column=None):
+        """
+        Initialization.
+
+        @param name: Name of the common table expression.
+        @type name: str
+        @param column: Column name (the first selected column by default).
+        @type column: str/None
+        """
+        self.name = name
+        self.column = column
+
+
 class BaseExpression(object):
 
     """BaseExpression class for SQL conditions representation."""
@@ -450,13 +815,15 @@ class BaseExpression(object):
 
     def __invert__(self):
         """
-        Set attribute "negated" to opposite (equal to "~obj").
+        Get negated copy of the instance (equal to "~obj"), expressions are
+        not modified after creation, thus they can be shared between queries.
 
-        @return: Self instance.
+        @return: New object of BaseExpression class.
         @rtype: BaseExpression
         """
-        self.negated = not self.negated
-        return self
+        instance = self.clone()
+        instance.negated = not self.negated
+        return instance
 
     def __and__(self, rhs):
         """
@@ -517,8 +884,8 @@ class Expression(BaseExpression):
         """
         Initialization.
 
-        @param field: Field object.
-        @type field: Field
+        @param field: Field object (or computed column value).
+        @type field: Field/ColumnNode
         @param op: Condition operation.
         @type op: str
         @param value: Condition value
@@ -530,7 +897,12 @@ class Expression(BaseExpression):
         self.field = field
         self.op = op
         self.value = value
-        self.set_models(field.model)
+        # - models of both sides (SQL text depends on their aliases) -
+        for operand in (field, value):
+            if isinstance(operand, ColumnNode):
+                self.set_models(*operand.get_models())
+            elif isinstance(operand, Field):
+                self.set_models(operand.model)
 
     @classmethod
     def convert(cls, _model, **kwargs):
@@ -545,7 +917,8 @@ class Expression(BaseExpression):
         @rtype: list
         """
         expressions = []
-        for name, value in kwargs.iteritems():
+        # - sorted by names to get stable SQL text -
+        for name, value in sorted(kwargs.iteritems()):
 
             items = name.rsplit(cls._op_separator, 1)
             if items[1:] and items[1] in OpCode.values:
@@ -582,6 +955,21 @@ class Expression(BaseExpression):
         return Expression(self.field, self.op, self.value, self.negated)
 
 
+class FalseExpression(BaseExpression):
+
+    """FalseExpression class represents condition that is always false (query
+    has no result and is not executed)."""
+
+    def clone(self):
+        """
+        Clone instance (create a copy of instance).
+
+        @return: New object of FalseExpression class.
+        @rtype: FalseExpression
+        """
+        return FalseExpression(self.negated)
+
+
 class ExpressionSet(BaseExpression):
 
     """ExpressionSet class represents a set of Expression instances."""
@@ -598,6 +986,8 @@ class ExpressionSet(BaseExpression):
         super(ExpressionSet, self).__init__()
         self.connector = connector
         self.children = []
+        self._optimized = {}  # {<negatedAbove>: <optimized expression>}
+        self._compiled = {}  # {<compilationKey>: (<statement>, <data>)}
         for a in args:
             if (isinstance(a, ExpressionSet)
                 and self.connector == a.connector and not a.negated):
@@ -614,7 +1004,213 @@ class ExpressionSet(BaseExpression):
         @rtype: ExpressionSet
         """
         instance = ExpressionSet(self.connector)
+        # - children are not modified, thus they are shared -
+        instance.children = list(self.children)
+        instance.negated = self.negated
+        instance.set_models(*self.get_models())
+        return instance
+
+    @staticmethod
+    def _get_constant(expression):
+        """
+        Get boolean value of the constant expression.
+
+        @param expression: Any of BaseExpression objects.
+        @type expression: BaseExpression
+        @return: True/False for constants, otherwise None.
+        @rtype: bool/None
+        """
+        if isinstance(expression, FalseExpression):
+            return expression.negated
+        elif isinstance(expression, ExpressionSet) and not expression.children:
+            return not expression.negated
+        elif (isinstance(expression, Expression)
+              and expression.op in (OpCode.IN, OpCode.NIN)
+              and isinstance(expression.value, (tuple, list))
+              and not expression.value):
+            return (expression.op == OpCode.NIN) != expression.negated
+        return None
+
+    @staticmethod
+    def _get_constant_expression(value):
+        """
+        Get expression for the boolean value.
+
+        @param value: Boolean value.
+        @type value: bool
+        @return: Empty ExpressionSet (True) or FalseExpression (False).
+        @rtype: BaseExpression
+        """
+        if value:
+            return ExpressionSet(ExprConnector.AND)
+        return FalseExpression()
+
+    @classmethod
+    def _get_key(cls, expression, negated=False):
+        """
+        Get key to compare expressions (e.g., to find duplicates).
+
+        @param expression: Any of BaseExpression objects.
+        @type expression: BaseExpression
+        @param negated: Flag to get the key of the negated expression.
+        @type negated: bool
+        @return: Key (hashable) of the expression.
+        @rtype: tuple
+        """
+        if (isinstance(expression, Expression)
+                and isinstance(expression.field, Field)):
+            value = expression.value
+            if isinstance(value, Field):
+                value = (value.model, value.name)
+            elif isinstance(value, list):
+                value = tuple(value)
+            key = (expression.field.model, expression.field.name,
+                   expression.op, value)
+        elif isinstance(expression, ExpressionSet):
+            key = (expression.connector,) + tuple(map(
+                lambda x: cls._get_key(x), expression.children))
+        else:
+            key = (id(expression),)
+        key = (expression.__class__, expression.negated != negated) + key
+        try:
+            hash(key)
+        except TypeError:
+            key = (id(expression), negated)
+        return key
+
+    def _merge_values(self, children, strict):
+        """
+        Merge EQ/IN conditions on the same field into one IN condition:
+        union of values for OR-connector, intersection for AND-connector.
+
+        @param children: List of (optimized) BaseExpression objects.
+        @type children: list
+        @param strict: Flag that there is no negation above (thus conditions
+            with no values can be folded into False).
+        @type strict: bool
+        @return: List of BaseExpression objects or None (always false).
+        @rtype: list/None
+        """
+        groups = OrderedDict()  # {(<model>, <fieldName>): [<Expression>]}
+        for child in children:
+            values = None
+            if (isinstance(child, Expression) and not child.negated
+                    and isinstance(child.field, Field)):
+                if child.op == OpCode.EQ:
+                    values = [child.value]
+                elif child.op == OpCode.IN and isinstance(child.value,
+                                                          (tuple, list)):
+                    values = list(child.value)
+            if values and all(map(lambda x: isinstance(x, LITERAL_TYPES),
+                                  values)):
+                key = (child.field.model, child.field.name)
+            else:
+                key = (id(child),)
+            groups.setdefault(key, []).append(child)
+
+        output = []
+        for items in groups.itervalues():
+            if len(items) == 1:
+                output.extend(items)
+                continue
+
+            values_sets = map(lambda x: OrderedDict.fromkeys(
+                x.op == OpCode.EQ and [x.value] or x.value), items)
+            values = values_sets[0]
+            for values_set in values_sets[1:]:
+                if self.connector == ExprConnector.OR:
+                    values.update(values_set)
+                else:
+                    values = OrderedDict.fromkeys(
+                        filter(lambda x: x in values_set, values))
+
+            if not values and not strict:
+                output.extend(items)
+            elif not values:
+                return None
+            elif len(values) == 1:
+                output.append(Expression(items[0].field, OpCode.EQ,
+                                         values.keys()[0]))
+            else:
+                output.append(Expression(items[0].field, OpCode.IN,
+                                         values.keys()))
+        return output
+
+    def optimize(self, _negated=False):
+        """
+        Get optimized copy of the instance: nested sets with the same
+        connector are flattened, EQ/IN conditions on the same field are
+        merged, duplicates are removed, constants are folded (the result is
+        kept, thus shared sub-trees are optimized once).
+
+        Contradictions (e.g., "a = 1 AND a = 2") are folded into False only
+        if there is no negation above (because of NULL values).
+
+        @param _negated: Flag that there is negation above (internal).
+        @type _negated: bool
+        @return: Empty ExpressionSet (always true), FalseExpression (always
+            false), Expression or ExpressionSet object.
+        @rtype: BaseExpression
+        """
+        if _negated not in self._optimized:
+            self._optimized[_negated] = self._optimize(_negated)
+        return self._optimized[_negated]
+
+    def _optimize(self, _negated):
+        """
+        Get optimized copy of the instance (see optimize).
+
+        @param _negated: Flag that there is negation above.
+        @type _negated: bool
+        @return: Optimized expression.
+        @rtype: BaseExpression
+        """
+        strict = _negated == self.negated
+        absorbing = self.connector == ExprConnector.OR
+
+        children = []
         for child in self.children:
-            instance.children.append(child.clone())
+            if isinstance(child, ExpressionSet):
+                child = child.optimize(not strict)
+
+            constant = self._get_constant(child)
+            if constant == absorbing:
+                return self._get_constant_expression(
+                    absorbing != self.negated)
+            elif constant is not None:
+                continue
+
+            if (isinstance(child, ExpressionSet) and not child.negated
+                    and child.connector == self.connector):
+                children.extend(child.children)
+            else:
+                children.append(child)
+
+        children = self._merge_values(children, strict)
+        if children is None:
+            return self._get_constant_expression(self.negated)
+
+        keys, output = set(), []
+        for child in children:
+            key = self._get_key(child)
+            if key in keys:
+                continue
+            if strict and self._get_key(child, negated=True) in keys:
+                # - "x AND NOT x" is false, "x OR NOT x" is not always true -
+                if self.connector == ExprConnector.AND:
+                    return self._get_constant_expression(self.negated)
+            keys.add(key)
+            output.append(child)
+
+        if not output:
+            return self._get_constant_expression(absorbing == self.negated)
+        elif len(output) == 1:
+            instance = output[0].clone()
+            instance.negated = instance.negated != self.negated
+            return instance
+
+        instance = ExpressionSet(self.connector)
+        instance.children = output
         instance.negated = self.negated
+        instance.set_models(*self.get_models())
         return instance
@@ -15,10 +15,14 @@
 
 __all__ = ['Model']
 
-from d2om.orm.field import Field
+from collections import OrderedDict
+
+from d2om.orm.field import Field, Param
+from d2om.orm.cache import NegativeCache
 from d2om.orm.query import (
-    RawQuery, SelectQuery, InsertQuery, UpdateQuery, DeleteQuery)
+    RawQuery, SelectQuery, InsertQuery, UpdateQuery, DeleteQuery, UpsertQuery)
 from d2om.exception import NoDataException
+from d2om.utils import BloomFilter
 from d2om.config import DEBUG_MODE
 
 
@@ -38,6 +42,8 @@ class ModelOptions(object):
         @keyword table: Corresponding database table/collection.
         @keyword ordering: Initial ordering.
         @keyword auto_increment: Flag for autoincrement of PK value.
+        @keyword change_column: Field with monotonically increasing value.
+        @keyword negative_cache: Parameters of cache for lookups with no data.
         """
         self.column_field_mapping = {} # {<columnName>: <fieldName>}
         self.relations = {}
@@ -46,12 +52,25 @@ class ModelOptions(object):
 
         self.pk_name = None
         self.pk_column_name = None
+        self.pk_query = None  # PreparedQuery (lookup by primary key)
+        self.pk_list_queries = {}  # {<numberOfValues>: <PreparedQuery>}
 
         self.name = kwargs.pop('model_name', None)
         self.database = kwargs.pop('database', None)
         self.table = kwargs.pop('table', None)
         self.ordering = kwargs.pop('ordering', None)
         self.auto_increment = kwargs.pop('auto_increment', False)
+        self.change_column = kwargs.pop('change_column', None)
+
+        self.table_cache = None
+        self.write_buffer = None
+        self.bloom_filters = {}  # {<fieldName>: <BloomFilter>}
+        self.negative_cache = None
+        negative_cache = kwargs.pop('negative_cache', None)
+        if negative_cache:
+            if not isinstance(negative_cache, dict):
+                negative_cache = {}
+            self.negative_cache = NegativeCache(**negative_cache)
 
         # - configurable options -
         for attr, value in kwargs.iteritems():
@@ -150,6 +169,10 @@ class MetaModel(type):
                 model._meta.pk_column_name = field.column_name
         model._meta._post_init()
 
+        # - precompiled lookup by primary key -
+        if model._meta.database and model._meta.pk_name:
+            model._get_pk_query()
+
         return model
 
 
@@ -166,6 +189,8 @@ class Model(object):
         @param kwargs: Model object attribute values.
         @type kwargs: dict
         """
+        # - own data container (class attribute "_data" is shared) -
+        self.__dict__['_data'] = {}
         self._is_new_record = True
         self._edited_fields = set()
 
@@ -256,6 +281,47 @@ class Model(object):
         """
         return InsertQuery(cls).bulk(True).set(*args)
 
+    @classmethod
+    def upsert(cls, **kwargs):
+        """
+        Get UpsertQuery object (insert or update the row).
+
+        Default values are used for insert only, the existing row is updated
+        with provided values (except key fields).
+
+        @param kwargs: Parameters for insert SQL statement.
+        @type kwargs: dict
+        @return: UpsertQuery object.
+        @rtype: UpsertQuery
+        """
+        data = cls._meta.get_defaults()
+        data.update(kwargs)
+        names = sorted(data)
+        return UpsertQuery(cls).set(
+            names, [map(lambda x: data[x], names)]).update_fields(*kwargs)
+
+    @classmethod
+    def upsert_many(cls, names, params, update_fields=None, batch_size=None):
+        """
+        Get UpsertQuery object for bulk operation (insert or update rows).
+
+        @param names: Field names.
+        @type names: list
+        @param params: List of lists with parameters that correspond to names.
+        @type params: list
+        @param update_fields: Field names to update (all except key fields
+            by default).
+        @type update_fields: list/None
+        @param batch_size: Maximum number of rows per statement execution.
+        @type batch_size: int/None
+        @return: UpsertQuery object.
+        @rtype: UpsertQuery
+        """
+        upsertquery = UpsertQuery(cls).set(names, params).batch(batch_size)
+        if update_fields is not None:
+            upsertquery.update_fields(*update_fields)
+        return upsertquery
+
     @classmethod
     def update(cls, **kwargs):
         """
@@ -268,6 +334,18 @@ class Model(object):
         """
         return UpdateQuery(cls).set(**kwargs)
 
+    @classmethod
+    def updatemany(cls, *args):
+        """
+        Get UpdateQuery object for bulk operation (rows by primary keys).
+
+        @param args: List of parameters.
+        @type args: list
+        @return: UpdateQuery object.
+        @rtype: UpdateQuery
+        """
+        return UpdateQuery(cls).bulk(True).set(*args)
+
     @classmethod
     def delete(cls):
         """
@@ -309,6 +387,151 @@ class Model(object):
         """
         return SelectQuery(cls).filter(*args, **kwargs).one()
 
+    @classmethod
+    def _get_pk_query(cls, num=None):
+        """
+        Get prepared query for lookups by primary key (compiled once).
+
+        @param num: Number of values (IN-list size) or None for one value.
+        @type num: int/None
+        @return: PreparedQuery object.
+        @rtype: PreparedQuery
+        """
+        if num is None:
+            if cls._meta.pk_query is None:
+                cls._meta.pk_query = SelectQuery(cls).filter(**{
+                    cls.get_pk_name(): Param('pk')}).prepare()
+            return cls._meta.pk_query
+
+        query = cls._meta.pk_list_queries.get(num)
+        if query is None:
+            query = SelectQuery(cls).filter(cls.get_pk_field() << map(
+                lambda x: Param('pk%s' % x), xrange(num))).prepare()
+            cls._meta.pk_list_queries[num] = query
+        return query
+
+    @classmethod
+    def _is_absent_pk(cls, value):
+        """
+        Check that there is no row with primary key (negative cache and
+        bloom filter are used).
+
+        @param value: Primary key value (database representation).
+        @type value: int/str
+        @return: Flag that row definitely does not exist.
+        @rtype: bool
+        """
+        negative_cache = cls._meta.negative_cache
+        if negative_cache is not None and (cls.get_pk_name(),
+                                           value) in negative_cache:
+            return True
+        bloom_filter = cls._meta.bloom_filters.get(cls.get_pk_name())
+        return bloom_filter is not None and value not in bloom_filter
+
+    @classmethod
+    def _get_cached(cls, pk):
+        """
+        Get copy of the instance kept by TableCache (cached instance is
+        shared, thus it should not be modified by the caller).
+
+        @param pk: Primary key value.
+        @type pk: int/str
+        @return: Model object.
+        @rtype: Model/None
+        """
+        table_cache = cls._meta.table_cache
+        if table_cache is None:
+            return
+
+        instance = table_cache.get(pk)
+        if instance is not None:
+            output = cls()
+            output.__dict__['_data'] = dict(instance._data)
+            output._post_init()
+            return output
+
+    @classmethod
+    def get_by_pk(cls, value):
+        """
+        Get Model object by primary key (fast path: precompiled statement,
+        table cache, negative cache and bloom filter are used).
+
+        @param value: Primary key value.
+        @type value: int/str
+        @return: Model object.
+        @rtype: Model
+        @raise ValueError: primary key is not defined.
+        @raise NoDataException: no data found.
+        """
+        pk_field = cls.get_pk_field()
+        if not pk_field:
+            raise ValueError('[Model.get_by_pk] Primary key is not defined')
+
+        instance = cls._get_cached(pk_field.py_value(value))
+        if instance is not None:
+            return instance
+
+        # - raw value is passed to the query (converted at binding) -
+        db_value = pk_field.db_value(value)
+        if cls._is_absent_pk(db_value):
+            raise NoDataException('no data with defined primary key')
+
+        instances = cls._get_pk_query().fetch(pk=value)
+        if not instances:
+            if cls._meta.negative_cache is not None:
+                cls._meta.negative_cache.add((pk_field.name, db_value))
+            raise NoDataException('no data with defined primary key')
+        return instances[0]
+
+    @classmethod
+    def get_many_by_pk(cls, values):
+        """
+        Get Model objects by primary keys (fast path, IN-lists are padded up
+        to the size of the bucket, thus statements are compiled once).
+
+        @param values: Primary key values.
+        @type values: list
+        @return: List of Model objects (in order of values, missing rows are
+            skipped).
+        @rtype: list
+        @raise ValueError: primary key is not defined.
+        """
+        pk_field = cls.get_pk_field()
+        if not pk_field:
+            raise ValueError('[Model.get_many_by_pk] ' +
+                             'Primary key is not defined')
+
+        # - values are matched by python representation (e.g., "5" and 5) -
+        keys = OrderedDict()  # {<pyValue>: <value>}
+        for value in values:
+            keys.setdefault(pk_field.py_value(value), value)
+
+        missing, output = [], {}
+        for key, value in keys.iteritems():
+            instance = cls._get_cached(key)
+            if instance is not None:
+                output[key] = instance
+            elif not cls._is_absent_pk(pk_field.db_value(value)):
+                missing.append(value)
+
+        database = cls._meta.database
+        limit = database.in_list_limit
+        for i in xrange(0, len(missing), limit):
+            chunk = database.pad_in_list(missing[i:i + limit], force=True)
+
+            query = cls._get_pk_query(len(chunk))
+            for instance in query.fetch(**dict(map(
+                    lambda (n, x): ('pk%s' % n, x), enumerate(chunk)))):
+                output[pk_field.py_value(instance.get_pk())] = instance
+
+        negative_cache = cls._meta.negative_cache
+        if negative_cache is not None:
+            for value in missing:
+                if pk_field.py_value(value) not in output:
+                    negative_cache.add((pk_field.name,
+                                        pk_field.db_value(value)))
+        return map(lambda x: output[x], filter(lambda x: x in output, keys))
+
     @classmethod
     def create(cls, **kwargs):
         """
@@ -343,6 +566,241 @@ class Model(object):
             instance = cls.create(**kwargs)
         return instance
 
+    @classmethod
+    def bulk_create(cls, instances, batch_size=None):
+        """
+        Save new Model objects at database with bulk inserts.
+
+        Primary keys are set if they are generated and the backend is able
+        to return them.
+
+        @param instances: List of Model objects.
+        @type instances: list
+        @param batch_size: Maximum number of rows per statement execution.
+        @type batch_size: int/None
+        @return: Number of inserted rows.
+        @rtype: int
+        """
+        instances = list(instances)
+        if not instances:
+            return 0
+
+        fields = cls.get_sorted_fields()
+        if cls._meta.auto_increment:
+            fields = filter(lambda x: not x._primary, fields)
+
+        insertquery = cls.insertmany(dict(map(
+            lambda x: (x.name, [getattr(i, x.name) for i in instances]),
+            fields)))
+        insertquery.batch(batch_size).returning(cls._meta.auto_increment)
+        insertquery.execute()
+        output = sum(insertquery.result['rows'])
+
+        keys = insertquery.result['keys']
+        if cls._meta.auto_increment and len(keys) == len(instances):
+            for instance, key in zip(instances, keys):
+                if key is not None:
+                    instance.set_pk(key)
+
+        for instance in instances:
+            instance.set_new_record_state(False)
+            instance._edited_fields.clear()
+        return output
+
+    @classmethod
+    def bulk_update(cls, instances):
+        """
+        Save changed attributes of Model objects with bulk updates.
+
+        Objects are grouped by the set of changed fields, every group is
+        updated with one statement execution (all groups in one transaction).
+
+        @param instances: List of Model objects.
+        @type instances: list
+        @return: Number of affected database rows.
+        @rtype: int
+        @raise ValueError: primary key is not defined.
+        """
+        groups = OrderedDict()  # {<frozenset(fieldNames)>: [<instance>]}
+        for instance in instances:
+            if not instance._edited_fields:
+                continue
+            if instance._is_new_record or not instance.get_pk():
+                raise ValueError('[Model.bulk_update] Primary key is not ' +
+                                 'defined or the object is not stored')
+            groups.setdefault(
+                frozenset(instance._edited_fields), []).append(instance)
+
+        output = 0
+        with cls._meta.database.atomic():
+            for names, group in groups.iteritems():
+                names = sorted(names)
+                params = map(lambda x: [getattr(x, n) for n in names] +
+                             [x.get_pk()], group)
+                output += cls.updatemany(names, params).execute()
+
+        for group in groups.itervalues():
+            for instance in group:
+                instance._edited_fields.clear()
+        return output
+
+    @classmethod
+    def _execute_by_pks(cls, query, pks, chunk_size, commit_each):
+        """
+        Execute query for chunks of primary keys.
+
+        @param query: UpdateQuery/DeleteQuery object (without pk condition).
+        @type query: SearchQuery
+        @param pks: Primary key values.
+        @type pks: list
+        @param chunk_size: Maximum number of primary keys per statement.
+        @type chunk_size: int
+        @param commit_each: Flag to commit every chunk separately.
+        @type commit_each: bool
+        @return: Number of affected database rows.
+        @rtype: int
+        @raise ValueError: incorrect chunk size.
+        """
+        if chunk_size < 1:
+            raise ValueError('[Model._execute_by_pks] ' +
+                             'Chunk size should be a positive number')
+
+        pks = list(OrderedDict.fromkeys(pks))
+        pk_field = cls.get_pk_field()
+
+        def _execute():
+            output = 0
+            for i in xrange(0, len(pks), chunk_size):
+                output += query.clone().filter(
+                    pk_field << pks[i:i + chunk_size]).execute()
+            return output
+
+        if commit_each:
+            return _execute()
+        with cls._meta.database.atomic():
+            return _execute()
+
+    @classmethod
+    def delete_by_pks(cls, pks, chunk_size=1000, commit_each=False):
+        """
+        Delete rows by primary keys (in chunks).
+
+        @param pks: Primary key values.
+        @type pks: list
+        @param chunk_size: Maximum number of primary keys per statement.
+        @type chunk_size: int
+        @param commit_each: Flag to commit every chunk separately (shorter
+            locks, less undo), otherwise all chunks are in one transaction.
+        @type commit_each: bool
+        @return: Number of deleted rows.
+        @rtype: int
+        """
+        return cls._execute_by_pks(cls.delete(), pks, chunk_size, commit_each)
+
+    @classmethod
+    def update_by_pks(cls, pks, chunk_size=1000, commit_each=False,
+                      **kwargs):
+        """
+        Update rows by primary keys (in chunks).
+
+        @param pks: Primary key values.
+        @type pks: list
+        @param chunk_size: Maximum number of primary keys per statement.
+        @type chunk_size: int
+        @param commit_each: Flag to commit every chunk separately (shorter
+            locks, less undo), otherwise all chunks are in one transaction.
+        @type commit_each: bool
+        @param kwargs: Parameters for update SQL statement.
+        @type kwargs: dict
+        @return: Number of updated rows.
+        @rtype: int
+        """
+        return cls._execute_by_pks(
+            cls.update(**kwargs), pks, chunk_size, commit_each)
+
+    @classmethod
+    def build_bloom_filter(cls, name, capacity, error_rate=0.01, path=None):
+        """
+        Build Bloom filter for the field (used by SelectQuery.exists).
+
+        @param name: Field name.
+        @type name: str
+        @param capacity: Expected number of values.
+        @type capacity: int
+        @param error_rate: False positive rate at full capacity.
+        @type error_rate: float
+        @param path: File path to save the filter.
+        @type path: str/None
+        @return: BloomFilter object.
+        @rtype: BloomFilter
+        @raise ValueError: field is not defined.
+        """
+        field = cls.get_field(name)
+        if not field:
+            raise ValueError('[Model.build_bloom_filter] ' +
+                             'Field "%s" is not defined in model' % name)
+
+        bloom_filter = BloomFilter(capacity, error_rate, key=field.key_value)
+        db = cls._meta.database
+        statement = db.statements.get(**{
+            'name': 'select',
+            'distinct': False,
+            'columns': field.column_name,
+            'table': cls._meta.table,
+            'join': '',
+            'where': None,
+            'group_by': None,
+            'having': None,
+            'order_by': None})
+        cursor = db.execute_read(statement, ss=True, arraysize=10000)
+        try:
+            rows = cursor.fetchmany()
+            while rows:
+                bloom_filter.add_many(map(lambda x: x[0], rows))
+                rows = cursor.fetchmany()
+        finally:
+            cursor.close()
+
+        if path:
+            bloom_filter.save(path)
+        cls._meta.bloom_filters[field.name] = bloom_filter
+        return bloom_filter
+
+    @classmethod
+    def load_bloom_filter(cls, name, path):
+        """
+        Load Bloom filter for the field from the file.
+
+        @param name: Field name.
+        @type name: str
+        @param path: File path.
+        @type path: str
+        @return: BloomFilter object.
+        @rtype: BloomFilter
+        @raise ValueError: field is not defined.
+        """
+        field = cls.get_field(name)
+        if not field:
+            raise ValueError('[Model.load_bloom_filter] ' +
+                             'Field "%s" is not defined in model' % name)
+        bloom_filter = BloomFilter.load(path, key=field.key_value)
+        cls._meta.bloom_filters[field.name] = bloom_filter
+        return bloom_filter
+
+    @classmethod
+    def save_bloom_filter(cls, name, path):
+        """
+        Save Bloom filter of the field to the file.
+
+        @param name: Field name.
+        @type name: str
+        @param path: File path.
+        @type path: str
+        """
+        field = cls.get_field(name)
+        if field and field.name in cls._meta.bloom_filters:
+            cls._meta.bloom_filters[field.name].save(path)
+
     @classmethod
     def get_field_name(cls, column_name):
         """
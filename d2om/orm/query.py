@@ -18,15 +18,40 @@ __all__ = [
     'InsertQuery',
     'UpdateQuery',
     'DeleteQuery',
-    'SelectQuery'
+    'SelectQuery',
+    'UpsertQuery',
+    'PreparedQuery',
+    'CompoundSelectQuery'
 ]
 
-from d2om.orm.field import Field, Expression, ExpressionSet, Ordering
-from d2om.orm.queryresult import QueryResult
+from collections import OrderedDict
+from copy import copy
+import itertools
+import weakref
+
+from d2om.orm.field import (
+    Field, Expression, ExpressionSet, Ordering, ColumnExpression, ColumnNode,
+    Function, Aggregate, Count, RowNumber, Window, Param, Cte,
+    FalseExpression, OP_SEPARATOR)
+from d2om.orm.queryresult import EmptyCursor, QueryResult
 from d2om.exception import NoDataException, QueryException
-from d2om.config.model import ExprConnector
+from d2om.config.model import OpCode, ExprConnector
 # from d2om.config import DEBUG_MODE
 
+# - set operations (templates names) for compound queries -
+UNION = 'union'
+UNION_ALL = 'union_all'
+
+# - aliases for rewritten IN (subquery) conditions -
+SEMI_JOIN_ALIAS = 'd2om_sj'
+SEMI_JOIN_COLUMN = 'd2om_sj_value'
+
+# - names for top-per-group queries (row number column, subquery alias and
+# prefix of column aliases, joined tables may have the same column names) -
+TOP_RANK_COLUMN = 'd2om_rank'
+TOP_ALIAS = 'd2om_top'
+TOP_COLUMN_PREFIX = 'd2om_c'
+
 
 class BaseQuery(object):
 
@@ -54,6 +79,45 @@ class BaseQuery(object):
         """Clone instance (create a copy of instance)."""
         raise NotImplementedError
 
+    def _clear_negative_cache(self):
+        """Remove cached lookups with no data (data was modified)."""
+        if self._model._meta.negative_cache is not None:
+            self._model._meta.negative_cache.clear()
+
+    def _get_paginated_statement(self, statement, limit, offset):
+        """
+        Get select statement with limit and offset.
+
+        @param statement: Select statement.
+        @type statement: str
+        @param limit: Limit for requested records.
+        @type limit: int/None
+        @param offset: Offset for requested records.
+        @type offset: int/None
+        @return: SQL statement.
+        @rtype: str
+        """
+        if limit and not offset:
+            statement = self._db.statements.get(**{
+                'name': 'select_with_limit',
+                'selectquery': statement,
+                'limit': limit})
+
+        elif not limit and offset:
+            statement = self._db.statements.get(**{
+                'name': 'select_with_offset',
+                'selectquery': statement,
+                'offset': offset})
+
+        elif limit and offset:
+            statement = self._db.statements.get(**{
+                'name': 'select_with_pagination',
+                'selectquery': statement,
+                'limit': limit,
+                'offset': offset})
+
+        return statement
+
 
 class RawQuery(BaseQuery):
 
@@ -146,6 +210,10 @@ class InsertQuery(BaseQuery):
         super(InsertQuery, self).__init__(model)
         self._set_defaults()
         self._bulk_insert = False
+        self._ignore = False
+        self._returning = False
+        self._batch_size = None
+        self.result = None
 
     def _set_defaults(self):
         """Set up default values."""
@@ -164,7 +232,9 @@ class InsertQuery(BaseQuery):
         if db_type.startswith('oracle'):
             data = {}
             def _updated(statement_values, data):
-                value_abbr = '%s%s' % (self._db.interpolation[1:], i)
+                # - sequential names (stable statement text) -
+                value_abbr = '%s%s' % (self._db.interpolation[1:],
+                                       len(statement_values))
                 statement_values.append(':%s' % value_abbr)
                 data[value_abbr] = field.db_value(value)
                 return statement_values, data
@@ -180,7 +250,7 @@ class InsertQuery(BaseQuery):
                 print ('[WARN] InsertQuery._get_insert_clause: ' +
                        'check/set correct handler for data processing')
 
-        for i, (name, value) in enumerate(sorted(self._data.items())):
+        for name, value in sorted(self._data.items()):
 
             field = self._model.get_field(name)
             if not field:
@@ -193,6 +263,21 @@ class InsertQuery(BaseQuery):
         comma = self._db.op_connectors.get(ExprConnector.Comma)
         return comma.join(statement_columns), comma.join(statement_values), data
 
+    def _get_bulk_field(self, name):
+        """
+        Get field for bulk insert.
+
+        @param name: Field or column name.
+        @type name: str
+        @return: Field object.
+        @rtype: Field
+        @raise QueryException: field is not defined.
+        """
+        field = self._model.get_field(name)
+        if not field:
+            raise QueryException('"%s" is not defined in model' % name)
+        return field
+
     def _get_bulk_insert_clause(self):
         """
         Get insert clause for bulk inserts.
@@ -204,16 +289,96 @@ class InsertQuery(BaseQuery):
 
         for name in self._data.get('names', []):
 
-            field = self._model.get_field(name)
-            if not field:
-                raise QueryException('"%s" is not defined in model' % name)
-
+            field = self._get_bulk_field(name)
             statement_columns.append(field.column_name)
             statement_values.append(self._db.interpolation)
 
         comma = self._db.op_connectors.get(ExprConnector.Comma)
         return comma.join(statement_columns), comma.join(statement_values)
 
+    def _get_bulk_columns(self):
+        """
+        Get converted values of columns for bulk insert.
+
+        Every column is converted at once with the converter of its field
+        (rows are transposed into columns if columns are not provided).
+
+        @return: Lists of values per column.
+        @rtype: list
+        @raise QueryException: columns have different lengths.
+        """
+        fields = map(self._get_bulk_field, self._data.get('names', []))
+        if 'columns' in self._data:
+            # - array.array, numpy.ndarray, etc. -
+            columns = map(lambda x: hasattr(x, 'tolist') and x.tolist()
+                          or list(x), self._data['columns'])
+            if len(set(map(len, columns))) > 1:
+                raise QueryException('Columns have different lengths')
+        else:
+            columns = map(list, zip(*self._data.get('params', [])))
+        if not columns:
+            columns = [[]] * len(fields)
+        return map(lambda x, y: x.db_values(y), fields, columns)
+
+    def _get_bulk_params(self, columns=None):
+        """
+        Get converted parameters (rows) for bulk insert.
+
+        @param columns: Converted values of columns.
+        @type columns: list/None
+        @return: List of rows.
+        @rtype: list
+        """
+        if columns is None:
+            columns = self._get_bulk_columns()
+        return zip(*columns)
+
+    def _update_bloom_filters(self, insert_id=None, columns=None):
+        """
+        Add inserted values to Bloom filters of the model.
+
+        @param insert_id: Last insert id.
+        @type insert_id: int/None
+        @param columns: Converted values of columns (bulk insert).
+        @type columns: list/None
+        """
+        bloom_filters = self._model._meta.bloom_filters
+        if not bloom_filters:
+            return
+
+        if self._bulk_insert:
+            names = map(lambda x: self._get_bulk_field(x).name,
+                        self._data.get('names', []))
+            if columns is None:
+                columns = self._get_bulk_columns()
+            for name, column in zip(names, columns):
+                if name in bloom_filters:
+                    bloom_filters[name].add_many(column)
+
+            pk_name = self._model.get_pk_name()
+            if pk_name in bloom_filters and pk_name not in names:
+                keys = (self.result or {}).get('keys')
+                if keys:
+                    bloom_filters[pk_name].add_many(
+                        self._model.get_pk_field().db_values(keys))
+                else:
+                    # - generated keys are unknown (false negatives) -
+                    bloom_filters.pop(pk_name, None)
+            return
+
+        values = {}
+        for name, value in self._data.iteritems():
+            field = self._model.get_field(name)
+            if field:
+                values[field.name] = field.db_value(value)
+        pk_name = self._model.get_pk_name()
+        if pk_name not in values and insert_id is not None:
+            values[pk_name] = self._model.get_pk_field().db_value(insert_id)
+
+        for name, bloom_filter in bloom_filters.iteritems():
+            if values.get(name) is not None:
+                bloom_filter.add(values[name])
+
     def bulk(self, is_bulk=True):
         """
         Flag for a type of insert: bulk inserts or not.
@@ -226,23 +391,68 @@ class InsertQuery(BaseQuery):
         self._bulk_insert = is_bulk
         return self
 
+    def ignore(self, ignore=True):
+        """
+        Flag to skip rows that cannot be inserted (bulk inserts only).
+
+        @param ignore: Flag value.
+        @type ignore: bool
+        @return: Self instance.
+        @rtype: InsertQuery
+        """
+        self._ignore = ignore
+        return self
+
+    def batch(self, batch_size=None):
+        """
+        Set maximum number of rows per statement execution (bulk inserts).
+
+        @param batch_size: Number of rows (backend default if None).
+        @type batch_size: int/None
+        @return: Self instance.
+        @rtype: InsertQuery
+        """
+        self._batch_size = batch_size
+        return self
+
+    def returning(self, returning=True):
+        """
+        Flag to get generated primary keys (bulk inserts only).
+
+        @param returning: Flag value.
+        @type returning: bool
+        @return: Self instance.
+        @rtype: InsertQuery
+        """
+        self._returning = returning
+        return self
+
     def set(self, *args, **kwargs):
         """
         Set data for insert SQL statement.
 
-        @param args: Values for names and params (bulk insert).
-        @type args: list(list, list)
-        @param kwargs: Insert data (in case of bulk insert: "names" & "params").
+        @param args: Values for names and params, or dictionary of columns
+            (bulk insert).
+        @type args: list(list, list)/list(dict)
+        @param kwargs: Insert data (in case of bulk insert: "names" & "params"
+            or "names" & "columns").
         @type kwargs: dict
 
         @keyword names: Names of inserted columns.
         @keyword params: List of lists with parameters that correspond to names.
+        @keyword columns: List of sequences of values (list, array.array,
+            numpy.ndarray) that correspond to names.
 
         @return: Self instance.
         @rtype: InsertQuery
         """
         if self._bulk_insert:
-            if len(args) == 2:
+            if len(args) == 1 and isinstance(args[0], dict):
+                names = sorted(args[0])
+                self._data = {
+                    'names': names,
+                    'columns': map(lambda x: args[0][x], names)}
+            elif len(args) == 2:
                 self._data = {
                     'names': args[0],
                     'params': args[1]}
@@ -250,11 +460,16 @@ class InsertQuery(BaseQuery):
                 self._data = {
                     'names': kwargs['names'],
                     'params': kwargs['params']}
+            elif kwargs.get('names') and kwargs.get('columns'):
+                self._data = {
+                    'names': kwargs['names'],
+                    'columns': kwargs['columns']}
             else:
                 raise ValueError('[InsertQuery.set] ' +
                                  'Not enough arguments for bulk insert')
         else:
-            if 'names' in self._data and 'params' in self._data:
+            if 'names' in self._data and ('params' in self._data
+                                          or 'columns' in self._data):
                 self._set_defaults()
             self._data.update(kwargs)
         return self
@@ -273,7 +488,7 @@ class InsertQuery(BaseQuery):
                 'table': self._model._meta.table,
                 'columns': statement_columns,
                 'values': statement_values})
-            data = self._data.get('params')
+            data = self._get_bulk_params()
         else:
             statement_columns, statement_values, data = self._get_insert_clause()
             statement = self._db.statements.get(**{
@@ -289,15 +504,30 @@ class InsertQuery(BaseQuery):
         """
         Execute SQL statement.
 
+        Result of the bulk insert (number of inserted rows per chunk, etc.)
+        is kept at attribute "result".
+
         @return: Last insert id.
-        @rtype: int
+        @rtype: int/None
         """
+        columns = None
         if self._bulk_insert:
-            cursor = self._db.execute_write_many(*self.sql())
+            columns = self._get_bulk_columns()
+            self.result = self._db.insert_many(
+                self._model._meta.table,
+                map(lambda x: self._get_bulk_field(x), self._data['names']),
+                self._get_bulk_params(columns),
+                ignore=self._ignore,
+                returning=(self._returning and self._model.get_pk_field()
+                           or None),
+                max_rows=self._batch_size)
+            output = self.result.get('last_id')
         else:
             cursor = self._db.execute_write(*self.sql())
-        output = self._db.last_insert_id(cursor)
-        cursor.close()
+            output = self._db.last_insert_id(cursor)
+            cursor.close()
+        self._clear_negative_cache()
+        self._update_bloom_filters(output, columns)
         return output
 
     def clone(self):
@@ -307,10 +537,162 @@ class InsertQuery(BaseQuery):
         @return: New InsertQuery object.
         @rtype: InsertQuery
         """
-        instance = InsertQuery(self._model)
+        instance = InsertQuery(self._model).ignore(self._ignore)
+        instance.returning(self._returning).batch(self._batch_size)
         return instance.bulk(self._bulk_insert).set(**self._data)
 
 
+class UpsertQuery(InsertQuery):
+
+    """
+    Class to manage/execute insert-or-update SQL statements.
+
+    Existing rows are matched by the primary key (if it is inserted) or by
+    unique fields otherwise. MERGE (Oracle) matches rows by these key fields
+    only, while ON DUPLICATE KEY UPDATE (MySQL) fires on any unique index,
+    thus for such backends all unique fields of the model should be keys.
+    """
+
+    def __init__(self, model):
+        """
+        Initialization.
+
+        @param model: Model class.
+        @type model: type
+        """
+        super(UpsertQuery, self).__init__(model)
+        self._bulk_insert = True
+        self._update_fields = None
+
+    def _get_key_fields(self, fields):
+        """
+        Get fields to match existing rows (primary key or unique fields).
+
+        @param fields: List of inserted fields.
+        @type fields: list
+        @return: List of key fields.
+        @rtype: list
+        @raise QueryException: key fields are not set, or unique field is
+            not a key (backend matches rows by any unique key).
+        """
+        pk_name = self._model.get_pk_name()
+        keys = filter(lambda x: x.name == pk_name, fields)
+        if not keys:
+            keys = filter(lambda x: x._unique, fields)
+        if not keys:
+            raise QueryException('Primary key or unique fields are not set')
+
+        if self._db.upsert_by_any_key:
+            names = map(lambda x: x.name, fields)
+            key_names = map(lambda x: x.name, keys)
+            for field in self._model.get_fields():
+                if (not (field._primary or field._unique)
+                        or field.name in key_names):
+                    continue
+                elif (field._primary and field.name not in names
+                        and self._model._meta.auto_increment):
+                    # - generated values do not match existing rows -
+                    continue
+                raise QueryException(
+                    'Unique field "%s" is not a key ' % field.name +
+                    '(existing rows are matched by any unique key)')
+        return keys
+
+    def _get_update_fields(self, fields, keys):
+        """
+        Get fields to update in existing rows (key fields are excluded).
+
+        @param fields: List of inserted fields.
+        @type fields: list
+        @param keys: List of key fields.
+        @type keys: list
+        @return: List of fields.
+        @rtype: list
+        @raise QueryException: field is not inserted.
+        """
+        names = map(lambda x: x.name, fields)
+        if self._update_fields is not None:
+            fields = map(self._get_bulk_field, self._update_fields)
+            for field in fields:
+                if field.name not in names:
+                    raise QueryException(
+                        '"%s" is not set for insert' % field.name)
+
+        key_names = map(lambda x: x.name, keys)
+        return filter(lambda x: x.name not in key_names, fields)
+
+    def _get_upsert_fields(self):
+        """
+        Get inserted, key and updated fields.
+
+        @return: Lists of fields.
+        @rtype: tuple(list, list, list)
+        """
+        fields = map(self._get_bulk_field, self._data.get('names', []))
+        keys = self._get_key_fields(fields)
+        return fields, keys, self._get_update_fields(fields, keys)
+
+    def update_fields(self, *args):
+        """
+        Set fields to update in existing rows (all inserted by default).
+
+        @param args: Field names.
+        @type args: list
+        @return: Self instance.
+        @rtype: UpsertQuery
+        """
+        self._update_fields = list(args)
+        return self
+
+    def sql(self):
+        """
+        Get SQL statement and parameters values.
+
+        @return: SQL statement and corresponding data.
+        @rtype: tuple(str, list)
+        """
+        fields, keys, update_fields = self._get_upsert_fields()
+        statement = self._db.get_upsert_statement(
+            self._model._meta.table, fields, keys, update_fields)
+        return statement, self._get_bulk_params()
+
+    def execute(self):
+        """
+        Execute SQL statement.
+
+        Result (number of affected rows per chunk, etc.) is kept at
+        attribute "result".
+
+        @return: Number of affected rows.
+        @rtype: int
+        """
+        fields, keys, update_fields = self._get_upsert_fields()
+        columns = self._get_bulk_columns()
+        self.result = self._db.upsert_many(
+            self._model._meta.table,
+            fields,
+            self._get_bulk_params(columns),
+            keys=keys,
+            update_fields=update_fields,
+            max_rows=self._batch_size)
+        output = sum(self.result['rows'])
+        self._clear_negative_cache()
+        self._update_bloom_filters(columns=columns)
+        return output
+
+    def clone(self):
+        """
+        Clone instance (create a copy of instance).
+
+        @return: New UpsertQuery object.
+        @rtype: UpsertQuery
+        """
+        instance = UpsertQuery(self._model).batch(self._batch_size)
+        if self._update_fields is not None:
+            instance.update_fields(*self._update_fields)
+        return instance.set(**self._data)
+
+
 class SearchQuery(BaseQuery):
 
     """Base class for Query classes where filter can be applied."""
@@ -324,6 +706,15 @@ class SearchQuery(BaseQuery):
         """
         super(SearchQuery, self).__init__(model)
         self._filter = ExpressionSet(ExprConnector.AND)
+        self._temp_values = []  # [(<table>, <valueType>, <slotId>, <values>)]
+        self._outer_temp_values = []  # values of the outer query (subquery)
+        self._empty_result = False  # condition is always false
+        self._uncacheable = 0  # number of parsed items with side effects
+        self._negation_level = 0  # number of negated sets being parsed
+        self._semi_join_depth = 0  # nesting level of rewritten subqueries
+        self._semi_join_root = None  # where-clause set (joins are allowed)
+        self._semi_joins = []  # [(<joinClause>, <data>)]
+        self._correlation = None  # condition with the outer query column
 
     def _has_aliases(self):
         """
@@ -334,6 +725,23 @@ class SearchQuery(BaseQuery):
         """
         return bool(getattr(self, '_aliases', None))
 
+    def _get_cte_column(self, cte):
+        """
+        Get column name of the common table expression.
+
+        @param cte: Cte object.
+        @type cte: Cte
+        @return: Column name.
+        @rtype: str
+        """
+        if cte.column:
+            return cte.column
+        query = getattr(self, '_ctes', {}).get(cte.name)
+        if query is None:
+            return '*'
+        fields = query._get_ordered_fields() or [query._model.get_pk_field()]
+        return fields[0]._alias or fields[0].column_name
+
     def _get_combined_column(self, field):
         """
         Get column name with table alias.
@@ -352,6 +760,64 @@ class SearchQuery(BaseQuery):
                     'column': field.column_name})
         return field.column_name
 
+    def _parse_column_node(self, node):
+        """
+        Parse computed column value (Field, ColumnExpression or Function).
+
+        @param node: Field, ColumnNode object or value.
+        @type node: Field/ColumnNode/any
+        @return: SQL expression with corresponding parameters.
+        @rtype: tuple(str, list)
+        """
+        if isinstance(node, Field):
+            return self._get_combined_column(node), []
+
+        elif isinstance(node, ColumnExpression):
+            lhs, lhs_data = self._parse_column_node(node.lhs)
+            rhs, rhs_data = self._parse_column_node(node.rhs)
+            statement = self._db.operations.get(**{
+                'name': node.op,
+                'lhs': lhs,
+                'rhs': rhs})
+            return statement, lhs_data + rhs_data
+
+        elif isinstance(node, Function):
+            statement_items, data = [], []
+            for arg in node.args:
+                statement, arg_data = self._parse_column_node(arg)
+                statement_items.append(statement)
+                data.extend(arg_data)
+            if isinstance(node, Aggregate) and not statement_items:
+                statement_items.append('*')
+            comma = self._db.op_connectors.get(ExprConnector.Comma)
+            statement = self._db.statements.get(**{
+                'name': 'call',
+                'funcname': node.funcname,
+                'args': comma.join(statement_items)})
+            return statement, data
+
+        elif isinstance(node, Window):
+            function, data = self._parse_column_node(node.function)
+            partition_items = []
+            for item in node.partition_by:
+                statement, item_data = self._parse_column_node(item)
+                partition_items.append(statement)
+                data.extend(item_data)
+            comma = self._db.op_connectors.get(ExprConnector.Comma)
+            window = self._db.statements.get(**{
+                'name': 'window_spec',
+                'partition_by': comma.join(partition_items),
+                'order_by': comma.join(map(
+                    lambda x: '%s %s' % (self._get_combined_column(x.field),
+                                         x.to_string()), node.order_by))})
+            statement = self._db.statements.get(**{
+                'name': 'over',
+                'function': function,
+                'window': window})
+            return statement, data
+
+        return self._db.interpolation, [node]
+
     def _get_active_model(self):
         """
         Get model that is active (in case there are several models).
@@ -363,9 +829,295 @@ class SearchQuery(BaseQuery):
             return self._active_model
         return self._model
 
+    def _is_long_list(self, expression):
+        """
+        Check that expression has a list of values longer than the limit.
+
+        @param expression: Expression object.
+        @type expression: Expression
+        @return: Flag that list of values should be split.
+        @rtype: bool
+        """
+        return (expression.op in (OpCode.IN, OpCode.NIN)
+                and isinstance(expression.field, Field)
+                and isinstance(expression.value, (tuple, list))
+                and len(expression.value) > self._db.in_list_limit)
+
+    def _parse_long_list(self, expression):
+        """
+        Parse Expression with a long list of values: values are loaded into
+        temporary table (if the number of values exceeds the threshold) or
+        split into chunks (OR-ed for IN and AND-ed for NOT IN).
+
+        @param expression: Expression object.
+        @type expression: Expression
+        @return: Where-clause item with corresponding parameters.
+        @rtype: tuple(str, list)
+        """
+        column_name = self._get_combined_column(expression.field)
+        data = expression.field.db_values(expression.value)
+
+        temp_table = None
+        threshold = self._db.temp_table_threshold
+        if threshold and len(data) >= threshold:
+            py_type = expression.field._column._py_type
+            value_type = self._db.temp_value_types.get(py_type)
+            temp_table = self._db.get_temp_table(py_type, len(filter(
+                lambda x: x[1] == value_type,
+                self._outer_temp_values + self._temp_values)))
+
+        if temp_table:
+            slot_id = self._db.get_temp_slot()
+            self._temp_values.append(temp_table + (slot_id, data))
+            statement = self._db.operations.get(**{
+                'name': expression.op,
+                'column': column_name,
+                'value': self._db.statements.get(**{
+                    'name': 'temp_values',
+                    'table': temp_table[0],
+                    'slot_id': self._db.interpolation})})
+            data = [slot_id]
+
+        else:
+            statement_items = []
+            limit = self._db.in_list_limit
+            chunks = map(lambda x: self._db.pad_in_list(data[x:x + limit]),
+                         xrange(0, len(data), limit))
+            for chunk in chunks:
+                statement_items.append(self._db.operations.get(**{
+                    'name': expression.op,
+                    'column': column_name,
+                    'value': [self._db.interpolation] * len(chunk)}))
+            data = list(itertools.chain.from_iterable(chunks))
+            connector = self._db.op_connectors.get(
+                expression.op == OpCode.IN and ExprConnector.OR
+                or ExprConnector.AND)
+            statement = self._db.statements.get(**{
+                'name': 'combine',
+                'statement': connector.join(statement_items)})
+
+        if expression.negated:
+            statement = self._db.statements.get(**{
+                'name': 'negated_combine',
+                'statement': statement})
+        return statement, data
+
+    def _parse_node_expression(self, expression):
+        """
+        Parse Expression object for computed column value (e.g., condition
+        with aggregate function in having-clause).
+
+        @param expression: Expression object.
+        @type expression: Expression
+        @return: Condition with corresponding parameters.
+        @rtype: tuple(str, list)
+        """
+        column, data = self._parse_column_node(expression.field)
+
+        value, value_data = '', []
+        if isinstance(expression.value, (tuple, list)):
+            value = []
+            for item in expression.value:
+                item_statement, item_data = self._parse_column_node(item)
+                value.append(item_statement)
+                value_data.extend(item_data)
+        elif expression.value is not None:
+            value, value_data = self._parse_column_node(expression.value)
+
+        statement = self._db.operations.get(**{
+            'name': expression.op,
+            'column': column,
+            'value': value})
+        if expression.negated:
+            statement = self._db.statements.get(**{
+                'name': 'negated_combine',
+                'statement': statement})
+        return statement, data + value_data
+
+    def _load_temp_values(self, modify=False):
+        """
+        Load values into temporary tables (should be called after sql()).
+
+        @param modify: Flag to use connection for modifications.
+        @type modify: bool
+        """
+        if self._temp_values:
+            self._db.load_temp_values(self._temp_values, modify=modify)
+
+    def _release_temp_values(self, modify=False):
+        """
+        Remove values from temporary tables (should be called after the
+        statement execution).
+
+        @param modify: Flag to use connection for modifications.
+        @type modify: bool
+        """
+        if self._temp_values:
+            self._db.release_temp_values(self._temp_values, modify=modify)
+
+    def _get_compilation_key(self, expression_set):
+        """
+        Get key of the compiled ExpressionSet (SQL text depends on database
+        and on aliases of used models).
+
+        @param expression_set: ExpressionSet object.
+        @type expression_set: ExpressionSet
+        @return: Compilation key.
+        @rtype: tuple
+        """
+        aliases = None
+        if self._has_aliases():
+            aliases = frozenset(map(lambda x: (x, self._get_alias(x)),
+                                    expression_set.get_models()))
+        # - weak reference (unlike id) is not reused by another database
+        #   object, and it does not keep the database object alive -
+        return weakref.ref(self._db), aliases
+
     def _parse_expression_set(self, expression_set):
         """
-        Parse ExpressionSet object (used in where-clause).
+        Parse ExpressionSet object (used in where-clause), compiled fragment
+        is kept with the object (if parsing has no side effects such as
+        temporary tables or subqueries).
+
+        @param expression_set: ExpressionSet object.
+        @type expression_set: ExpressionSet
+        @return: Where-clause with corresponding parameters.
+        @rtype: tuple(str, list)
+        """
+        key = self._get_compilation_key(expression_set)
+        compiled = expression_set._compiled.get(key)
+        if compiled:
+            return compiled[0], list(compiled[1])
+
+        uncacheable = self._uncacheable
+        statement, data = self._compile_expression_set(expression_set)
+        if uncacheable == self._uncacheable:
+            expression_set._compiled[key] = (statement, tuple(data))
+        return statement, data
+
+    def _get_subquery_sql(self, selectquery):
+        """
+        Get SQL statement of the subquery (temporary values are shared).
+
+        @param selectquery: SelectQuery object (clone).
+        @type selectquery: SelectQuery
+        @return: SQL statement and corresponding data.
+        @rtype: tuple(str, list)
+        """
+        selectquery._outer_temp_values = (
+            self._outer_temp_values + self._temp_values)
+        selectquery._semi_join_depth = self._semi_join_depth + 1
+        statement, data = selectquery.sql()
+        # - values are loaded by the outer query -
+        self._temp_values.extend(selectquery._temp_values)
+        return statement, data
+
+    def _get_semi_join_strategy(self, expression, expression_set):
+        """
+        Get strategy to render IN (subquery) condition, the rewrite is applied
+        only if it returns the same rows (otherwise IN is used).
+
+        @param expression: Expression object with SelectQuery value.
+        @type expression: Expression
+        @param expression_set: Parent ExpressionSet object.
+        @type expression_set: ExpressionSet
+        @return: Semi-join strategy (d2om.database._base.SemiJoinStrategy).
+        @rtype: str
+        """
+        strategy = self._db.semi_join_strategy
+        query = expression.value
+        # - NOT IN / NOT EXISTS differ for NULL values -
+        if (strategy == self._db.semi_join_type.In
+                or expression.op != OpCode.IN or expression.negated
+                or self._negation_level or query._annotations
+                or query._top_per_group or query._limit or query._offset):
+            return self._db.semi_join_type.In
+
+        if (strategy == self._db.semi_join_type.Join
+                and expression_set is self._semi_join_root
+                and expression_set.connector == ExprConnector.AND):
+            return strategy
+
+        if query._joins or query._cte_joins or query._ctes or query._group_by:
+            return self._db.semi_join_type.In
+        return self._db.semi_join_type.Exists
+
+    def _get_outer_column(self, field):
+        """
+        Get column name that can be referenced from the subquery.
+
+        @param field: Field object.
+        @type field: Field
+        @return: Combined column name.
+        @rtype: str
+        """
+        if self._has_aliases():
+            return self._get_combined_column(field)
+        return self._db.statements.get(**{
+            'name': 'combined_column',
+            'alias': self._model._meta.table,
+            'column': field.column_name})
+
+    def _parse_semi_join(self, expression, strategy):
+        """
+        Parse IN (subquery) condition as correlated EXISTS subquery or as join
+        with DISTINCT subquery (join clause is kept and condition is empty).
+
+        @param expression: Expression object with SelectQuery value.
+        @type expression: Expression
+        @param strategy: Semi-join strategy (Exists or Join).
+        @type strategy: str
+        @return: Where-clause item with corresponding parameters.
+        @rtype: tuple(str, list)
+        """
+        selectquery = expression.value.clone()
+        inner_field = ((selectquery._fields
+                        and selectquery._get_ordered_fields()[0])
+                       or selectquery._model.get_pk_field())
+        alias = '%s%s' % (SEMI_JOIN_ALIAS, self._semi_join_depth + 1)
+        column = self._get_outer_column(expression.field)
+
+        selectquery._order_by = []
+        selectquery._shared.discard('_order_by')
+        if strategy == self._db.semi_join_type.Join:
+            selectquery._fields = set([
+                copy(inner_field).alias(SEMI_JOIN_COLUMN)])
+            selectquery._shared.discard('_fields')
+            selectquery._distinct = True
+            statement, data = self._get_subquery_sql(selectquery)
+            self._semi_joins.append((self._db.statements.get(**{
+                'name': 'join_clause',
+                'join_type': self._db.join_type.Inner,
+                'table': self._db.statements.get(**{
+                    'name': 'semi_join_table',
+                    'selectquery': statement,
+                    'alias': alias}),
+                'columns': self._db.operations.get(**{
+                    'name': OpCode.EQ,
+                    'column': column,
+                    'value': self._db.statements.get(**{
+                        'name': 'combined_column',
+                        'alias': alias,
+                        'column': SEMI_JOIN_COLUMN})})}), data))
+            return '', []
+
+        selectquery._aliases = OrderedDict([
+            (selectquery._model._meta.name, alias)])
+        selectquery._shared.discard('_aliases')
+        selectquery._fields = set([inner_field])
+        selectquery._shared.discard('_fields')
+        selectquery._correlation = self._db.operations.get(**{
+            'name': OpCode.EQ,
+            'column': selectquery._get_combined_column(inner_field),
+            'value': column})
+        statement, data = self._get_subquery_sql(selectquery)
+        return self._db.statements.get(**{
+            'name': 'exists',
+            'selectquery': statement}), data
+
+    def _compile_expression_set(self, expression_set):
+        """
+        Compile ExpressionSet object into where-clause.
 
         @param expression_set: ExpressionSet object.
         @type expression_set: ExpressionSet
@@ -373,22 +1125,56 @@ class SearchQuery(BaseQuery):
         @rtype: tuple(str, list)
         """
         statement_items, statement_data = [], []
+        self._negation_level += expression_set.negated
         for child in expression_set.children:
 
             if isinstance(child, ExpressionSet):
                 statement, data = self._parse_expression_set(child)
 
+            elif isinstance(child, Expression) and self._is_long_list(child):
+                statement, data = self._parse_long_list(child)
+                self._uncacheable += 1
+
+            elif (isinstance(child, Expression)
+                  and isinstance(child.field, ColumnNode)):
+                statement, data = self._parse_node_expression(child)
+
             elif isinstance(child, Expression):
 
                 if isinstance(child.value, SelectQuery):
+                    self._uncacheable += 1
+                    strategy = self._get_semi_join_strategy(
+                        child, expression_set)
+                    if strategy != self._db.semi_join_type.In:
+                        statement, data = self._parse_semi_join(
+                            child, strategy)
+                        if statement:
+                            statement_items.append(statement)
+                        statement_data.extend(data)
+                        continue
+
                     selectquery = child.value.clone()
                     if not selectquery._fields:
                         selectquery.fields(selectquery._model.get_pk_name())
-                    statement, data = selectquery.sql()
+                    statement, data = self._get_subquery_sql(selectquery)
+                elif isinstance(child.value, Cte):
+                    self._uncacheable += 1
+                    statement = self._db.statements.get(**{
+                        'name': 'select_cte',
+                        'column': self._get_cte_column(child.value),
+                        'cte_name': child.value.name})
+                    data = []
+                elif isinstance(child.value, Param):
+                    # - value is bound at execution (PreparedQuery) -
+                    statement = self._db.interpolation
+                    data = [child.value.bind(child.field, child.op)]
                 elif isinstance(child.value, (tuple, list)):
-                    statement = ', '.join(
-                        [self._db.interpolation] * len(child.value))
-                    data = map(lambda x: child.field.db_value(x), child.value)
+                    data = map(lambda x: isinstance(x, Param)
+                               and x.bind(child.field, child.op)
+                               or child.field.db_value(x), child.value)
+                    if child.op in (OpCode.IN, OpCode.NIN):
+                        data = self._db.pad_in_list(data)
+                    statement = ', '.join([self._db.interpolation] * len(data))
                 elif child.value is not None:
                     statement = self._db.interpolation
                     data = [child.field.db_value(child.value)]
@@ -405,10 +1191,13 @@ class SearchQuery(BaseQuery):
                     statement = self._db.statements.get(**{
                         'name': 'negated_combine',
                         'statement': statement})
-                data = self._db.lookup_cast(child.field._column, child.op, data)
+                if not isinstance(child.value, Param):
+                    data = self._db.lookup_cast(
+                        child.field._column, child.op, data)
 
             statement_items.append(statement)
             statement_data.extend(data)
+        self._negation_level -= expression_set.negated
 
         connector = self._db.op_connectors.get(expression_set.connector)
         statement = connector.join(statement_items)
@@ -429,7 +1218,40 @@ class SearchQuery(BaseQuery):
         @return: Where-clause with corresponding parameters.
         @rtype: tuple(str, list)
         """
-        return self._parse_expression_set(self._filter)
+        self._temp_values = []
+        self._empty_result = False
+        self._semi_joins = []
+        statement, data = self._get_condition_clause(
+            self._filter, semi_joins=True)
+        if self._correlation:
+            connector = self._db.op_connectors.get(ExprConnector.AND)
+            statement = connector.join(
+                filter(None, [statement, self._correlation]))
+        return statement, data
+
+    def _get_condition_clause(self, expression_set, semi_joins=False):
+        """
+        Get condition (where/having-clause) with corresponding parameters.
+
+        @param expression_set: ExpressionSet object.
+        @type expression_set: ExpressionSet
+        @param semi_joins: Flag that subqueries can be rewritten into joins.
+        @type semi_joins: bool
+        @return: Condition with corresponding parameters.
+        @rtype: tuple(str, list)
+        """
+        expression = expression_set.optimize()
+        if isinstance(expression, FalseExpression):
+            self._empty_result = True
+            return self._db.statements.get(name='false'), []
+        if not isinstance(expression, ExpressionSet):
+            expression = ExpressionSet(ExprConnector.AND, expression)
+        if semi_joins and isinstance(self, SelectQuery):
+            self._semi_join_root = expression
+        try:
+            return self._parse_expression_set(expression)
+        finally:
+            self._semi_join_root = None
 
     def filter(self, *args, **kwargs):
         """
@@ -463,6 +1285,7 @@ class UpdateQuery(SearchQuery):
         """
         super(UpdateQuery, self).__init__(model)
         self._data = {}
+        self._bulk_update = False
 
     def _get_set_clause(self):
         """
@@ -481,40 +1304,124 @@ class UpdateQuery(SearchQuery):
             elif field.model != self._model:
                 continue
 
-            statement = self._db.interpolation
-            if value is None and not field._nullable:
-                raise ValueError('[UpdateQuery._get_set_clause] ' +
-                                 'field "%s" is not nullable' % field.name)
+            if isinstance(value, (Field, ColumnNode)):
+                # - value is computed at database -
+                statement, value_data = self._parse_column_node(value)
+            else:
+                statement = self._db.interpolation
+                if value is None and not field._nullable:
+                    raise ValueError('[UpdateQuery._get_set_clause] ' +
+                                     'field "%s" is not nullable' % field.name)
+                value_data = [field.db_value(value)]
 
             statement_items.append(self._db.operations.get(**{
                 'name': 'eq',
                 'column': field.column_name,
                 'value': statement}))
-            data.append(field.db_value(value))
+            data.extend(value_data)
 
         comma = self._db.op_connectors.get(ExprConnector.Comma)
         return comma.join(statement_items), data
 
-    def set(self, **kwargs):
-        """
-        Set parameters that will be updated at database.
-
-        @param kwargs: Dictionary of model attributes and corresponding values.
-        @type kwargs: dict
-        @return: Self instance.
-        @rtype: UpdateQuery
+    def _get_bulk_sql(self):
         """
-        self._data.update(kwargs)
-        return self
+        Get SQL statement and parameters values for bulk updates.
 
-    def sql(self):
-        """
-        Get SQL statement and parameters values.
+        Rows are identified by the primary key (the last value of each row),
+        filter values (if any) are added to every row.
 
         @return: SQL statement and corresponding data.
         @rtype: tuple(str, list)
+        @raise QueryException: field is not defined.
         """
-        set_statement, set_data = self._get_set_clause()
+        statement_items, fields = [], []
+        for name in self._data.get('names', []):
+            field = self._model.get_field(name)
+            if not field:
+                raise QueryException('"%s" is not defined in model' % name)
+            fields.append(field)
+            statement_items.append(self._db.operations.get(**{
+                'name': OpCode.EQ,
+                'column': field.column_name,
+                'value': self._db.interpolation}))
+
+        where_items = [self._db.operations.get(**{
+            'name': OpCode.EQ,
+            'column': self._model.get_pk_column_name(),
+            'value': self._db.interpolation})]
+        where_statement, where_data = self._get_where_clause()
+        if where_statement:
+            where_items.append(where_statement)
+
+        comma = self._db.op_connectors.get(ExprConnector.Comma)
+        connector = self._db.op_connectors.get(ExprConnector.AND)
+        statement = self._db.statements.get(**{
+            'name': 'update',
+            'table': self._model._meta.table,
+            'set': comma.join(statement_items),
+            'where': connector.join(where_items)})
+        # - column-wise conversion (primary key is the last column) -
+        fields.append(self._model.get_pk_field())
+        columns = map(lambda x, y: x.db_values(y), fields,
+                      zip(*self._data.get('params', [])) or [[]] * len(fields))
+        return statement, map(lambda x: list(x) + where_data, zip(*columns))
+
+    def bulk(self, is_bulk=True):
+        """
+        Flag for a type of update: bulk updates (by primary keys) or not.
+
+        @param is_bulk: Flag value.
+        @type is_bulk: bool
+        @return: Self instance.
+        @rtype: UpdateQuery
+        """
+        self._bulk_update = is_bulk
+        return self
+
+    def set(self, *args, **kwargs):
+        """
+        Set parameters that will be updated at database.
+
+        @param args: Values for names and params (bulk update).
+        @type args: list(list, list)
+        @param kwargs: Dictionary of model attributes and corresponding values
+            (in case of bulk update: "names" & "params").
+        @type kwargs: dict
+
+        @keyword names: Names of updated fields.
+        @keyword params: List of lists with parameters that correspond to
+            names, with the primary key value at the end of each list.
+
+        @return: Self instance.
+        @rtype: UpdateQuery
+        """
+        if self._bulk_update:
+            if len(args) == 2:
+                self._data = {
+                    'names': args[0],
+                    'params': args[1]}
+            elif kwargs.get('names') and kwargs.get('params'):
+                self._data = {
+                    'names': kwargs['names'],
+                    'params': kwargs['params']}
+            else:
+                raise ValueError('[UpdateQuery.set] ' +
+                                 'Not enough arguments for bulk update')
+        else:
+            self._data.update(kwargs)
+        return self
+
+    def sql(self):
+        """
+        Get SQL statement and parameters values.
+
+        @return: SQL statement and corresponding data.
+        @rtype: tuple(str, list)
+        """
+        if self._bulk_update:
+            return self._get_bulk_sql()
+
+        set_statement, set_data = self._get_set_clause()
         where_statement, where_data = self._get_where_clause()
         statement = self._db.statements.get(**{
             'name': 'update',
@@ -530,11 +1437,51 @@ class UpdateQuery(SearchQuery):
         @return: Number of affected database rows.
         @rtype: int
         """
-        cursor = self._db.execute_write(*self.sql())
-        output = self._db.rows_affected(cursor)
-        cursor.close()
+        statement, data = self.sql()
+        if self._empty_result:
+            return 0
+        with self._db.atomic():
+            self._load_temp_values(modify=True)
+            if self._bulk_update:
+                cursor = self._db.execute_write_many(statement, data)
+            else:
+                cursor = self._db.execute_write(statement, data)
+            output = self._db.rows_affected(cursor)
+            cursor.close()
+            self._release_temp_values(modify=True)
+        self._clear_negative_cache()
+        self._update_bloom_filters()
         return output
 
+    def _update_bloom_filters(self):
+        """
+        Add new values of updated fields to Bloom filters of the model (filter
+        is removed if the new value is computed at database).
+        """
+        bloom_filters = self._model._meta.bloom_filters
+        if not bloom_filters:
+            return
+
+        if self._bulk_update:
+            columns = zip(*self._data.get('params', []))
+            for name, column in zip(self._data.get('names', []), columns):
+                field = self._model.get_field(name)
+                if field and field.name in bloom_filters:
+                    bloom_filters[field.name].add_many(field.db_values(column))
+            return
+
+        for field, value in self._data.iteritems():
+            if not isinstance(field, Field):
+                field = self._model.get_field(field)
+            if (not field or field.model != self._model
+                    or field.name not in bloom_filters):
+                continue
+            if isinstance(value, (Field, ColumnNode)):
+                # - new value is unknown (filter would give false negatives) -
+                bloom_filters.pop(field.name, None)
+            elif value is not None:
+                bloom_filters[field.name].add(field.db_value(value))
+
     def clone(self):
         """
         Clone instance (create a copy of instance).
@@ -542,8 +1489,9 @@ class UpdateQuery(SearchQuery):
         @return: New UpdateQuery object.
         @rtype: UpdateQuery
         """
-        instance = UpdateQuery(self._model).set(**self._data)
-        instance._filter = self._filter.clone()
+        instance = UpdateQuery(self._model).bulk(self._bulk_update)
+        instance.set(**self._data)
+        instance._filter = self._filter  # - expressions are not modified -
         return instance
 
 
@@ -572,9 +1520,15 @@ class DeleteQuery(SearchQuery):
         @return: Number of affected database rows.
         @rtype: int
         """
-        cursor = self._db.execute_write(*self.sql())
-        output = self._db.rows_affected(cursor)
-        cursor.close()
+        statement, data = self.sql()
+        if self._empty_result:
+            return 0
+        with self._db.atomic():
+            self._load_temp_values(modify=True)
+            cursor = self._db.execute_write(statement, data)
+            output = self._db.rows_affected(cursor)
+            cursor.close()
+            self._release_temp_values(modify=True)
         return output
 
     def clone(self):
@@ -585,7 +1539,7 @@ class DeleteQuery(SearchQuery):
         @rtype: DeleteQuery
         """
         instance = DeleteQuery(self._model)
-        instance._filter = self._filter.clone()
+        instance._filter = self._filter  # - expressions are not modified -
         return instance
 
 
@@ -593,6 +1547,11 @@ class SelectQuery(SearchQuery):
 
     """Class to manage/execute select SQL statements."""
 
+    # - containers that are shared by clones (copy-on-write) -
+    _shared_attrs = (
+        '_fields', '_order_by', '_group_by', '_annotations', '_joins',
+        '_aliases', '_ctes', '_cte_joins')
+
     def __init__(self, model):
         """
         Initialization.
@@ -606,14 +1565,32 @@ class SelectQuery(SearchQuery):
         self._distinct = False
         self._order_by = []
         self._group_by = []
-        self._having = []
+        self._having = ExpressionSet(ExprConnector.AND)
+        self._annotations = OrderedDict()  # {<name>: <ColumnNode>}
+        self._result_type = None  # None (Model objects), tuples or dicts
+        self._top_per_group = None  # (<Window>, <numberOfRows>)
         self._limit = None
         self._offset = None
 
         self._fields = set()
-        self._joins = {}
-        self._aliases = {}
+        self._joins = OrderedDict()  # {<model>: [(<lhs>, <rhs>, <joinType>)]}
+        self._aliases = OrderedDict()  # {<modelName>: <alias>}
+        self._ctes = OrderedDict()  # {<cteName>: <SelectQuery>}
+        self._cte_joins = []  # [(<lhs>, <Cte>, <joinType>)]
         self._naive = False
+        self._shared = set()  # names of shared containers
+
+    def _unshare(self, *names):
+        """
+        Copy containers that are shared with clones (before modification).
+
+        @param names: Names of container attributes.
+        @type names: list
+        """
+        for name in names:
+            if name in self._shared:
+                setattr(self, name, copy(getattr(self, name)))
+                self._shared.discard(name)
 
     @classmethod
     def _generate_alias(cls, alias_map, alias=None, counter=None):
@@ -656,12 +1633,33 @@ class SelectQuery(SearchQuery):
         @param alias: Alias for the model.
         @type alias: str/None
         """
+        self._unshare('_aliases')
         if not self._aliases.get(self._model._meta.name):
             _alias = self._generate_alias(self._aliases)
             self._aliases[self._model._meta.name] = _alias
         _alias = self._generate_alias(self._aliases, alias=alias)
         self._aliases[model._meta.name] = _alias
 
+    def _get_ordered_fields(self):
+        """
+        Get requested fields in canonical order (by join order of models and
+        by definition order of fields), thus SQL text is stable.
+
+        @return: Sorted list of fields.
+        @rtype: list
+        """
+        fields = self._fields
+        if self._annotations and self._group_by:
+            # - grouped query returns grouping columns and annotations -
+            fields = OrderedDict(map(lambda x: (id(x), x),
+                                     self._group_by)).values()
+
+        models = [self._model] + self._joins.keys()
+        return sorted(fields, key=lambda x: (
+            models.index(x.model) if x.model in models else len(models),
+            x._primary and 1 or 2,
+            x._order))
+
     def _get_select_clause(self):
         """
         Get select-clause with corresponding parameters.
@@ -670,20 +1668,39 @@ class SelectQuery(SearchQuery):
         @rtype: tuple(str, list)
         """
         statement_items, data = [], []
-        if not self._fields:
+        if not self._fields and not self._annotations:
             self.fields(self._model)
 
-        for item in self._fields:
+        top_aliases = self._get_top_aliases()
+        for item in self._get_ordered_fields():
 
             if isinstance(item, Field):
                 statement = self._get_combined_column(item)
-                if item._alias:
+                alias = top_aliases.get(self._get_field_key(item), item._alias)
+                if alias:
                     statement = self._db.statements.get(**{
                         'name': 'column_with_alias',
                         'column': statement,
-                        'alias': item._alias})
+                        'alias': alias})
                 statement_items.append(statement)
 
+        for name, node in self._annotations.iteritems():
+            statement, node_data = self._parse_column_node(node)
+            statement_items.append(self._db.statements.get(**{
+                'name': 'column_with_alias',
+                'column': statement,
+                'alias': name}))
+            data.extend(node_data)
+
+        if self._top_per_group:
+            statement, node_data = self._parse_column_node(
+                self._top_per_group[0])
+            statement_items.append(self._db.statements.get(**{
+                'name': 'column_with_alias',
+                'column': statement,
+                'alias': TOP_RANK_COLUMN}))
+            data.extend(node_data)
+
         comma = self._db.op_connectors.get(ExprConnector.Comma)
         return comma.join(statement_items), data
 
@@ -709,8 +1726,52 @@ class SelectQuery(SearchQuery):
                             'name': 'eq',
                             'column': self._get_combined_column(l_field),
                             'value': self._get_combined_column(r_field)})}))
+
+        for l_field, cte, join_type in self._cte_joins:
+            alias = self._aliases.get(cte.name)
+            statement_items.append(
+                self._db.statements.get(**{
+                    'name': 'join_clause',
+                    'join_type': join_type,
+                    'table': self._db.statements.get(**{
+                        'name': 'table_with_alias',
+                        'table': cte.name,
+                        'alias': alias}),
+                    'columns': self._db.operations.get(**{
+                        'name': 'eq',
+                        'column': self._get_combined_column(l_field),
+                        'value': self._db.statements.get(**{
+                            'name': 'combined_column',
+                            'alias': alias,
+                            'column': self._get_cte_column(cte)})})}))
         return ' '.join(statement_items)
 
+    def _get_with_clause(self):
+        """
+        Get definitions of common table expressions (with-clause).
+
+        @return: SQL definitions with corresponding parameters.
+        @rtype: tuple(str, list)
+        """
+        statement_items, data = [], []
+        for name, query in self._ctes.iteritems():
+            query = query.clone()
+            if not (query._limit or query._offset):
+                query._order_by = []
+                query._shared.discard('_order_by')
+            query._outer_temp_values = (
+                self._outer_temp_values + self._temp_values)
+            statement, query_data = query.sql()
+            # - values are loaded by the outer query -
+            self._temp_values.extend(query._temp_values)
+            statement_items.append(self._db.statements.get(**{
+                'name': 'cte',
+                'cte_name': name,
+                'selectquery': statement}))
+            data.extend(query_data)
+        comma = self._db.op_connectors.get(ExprConnector.Comma)
+        return comma.join(statement_items), data
+
     def _get_order_by_clause(self):
         """
         Get order-by-clause.
@@ -720,10 +1781,14 @@ class SelectQuery(SearchQuery):
         """
         if self._distinct:
             return ''
+        orderings = self._order_by
+        if self._annotations and self._group_by:
+            group_ids = set(map(id, self._group_by))
+            orderings = filter(lambda x: id(x.field) in group_ids, orderings)
         comma = self._db.op_connectors.get(ExprConnector.Comma)
         return comma.join(
             map(lambda x: '%s %s' % (self._get_combined_column(x.field),
-                                     x.to_string()), self._order_by))
+                                     x.to_string()), orderings))
 
     def _get_group_by_clause(self):
         """
@@ -747,6 +1812,7 @@ class SelectQuery(SearchQuery):
         @return: Self instance.
         @rtype: SelectQuery
         """
+        self._unshare('_fields')
         if not self._distinct and (args or kwargs):
             self._fields.add(self._model.get_pk_field())
 
@@ -776,12 +1842,13 @@ class SelectQuery(SearchQuery):
         """
         Join related model (join types: Inner/LeftOuter/RightOuter/FullOuter).
 
-        @param model: Model class.
-        @type model: type
+        @param model: Model class (or Cte object).
+        @type model: type/Cte
         @param join_type: Join type (d2om.database._base.JoinType).
         @type join_type: str
-        @param on: Name of related field.
-        @type on: str
+        @param on: Name of related field (field of the active model that is
+            compared with the column of the common table expression).
+        @type on: str/Field
         @param alias: Joined model alias.
         @type alias: str/None
         @return: Self instance.
@@ -791,6 +1858,9 @@ class SelectQuery(SearchQuery):
             raise ValueError('[SelectQuery.join] Unknown value of join type')
         join_type = (join_type or self._db.join_type.Inner).upper()
 
+        if isinstance(model, Cte):
+            return self._join_cte(model, join_type, on, alias)
+
         lhs = self._active_model.get_related_field(model, on)
         if lhs:
             rhs = model.get_pk_field()
@@ -803,10 +1873,64 @@ class SelectQuery(SearchQuery):
                                      'No relation found between models: ' +
                                      '%s ' % self._active_model._meta.name +
                                      '%s' % model._meta.name)
-        self._joins.setdefault(model, []).append((lhs, rhs, join_type))
+        self._unshare('_joins')
+        self._joins[model] = self._joins.get(model, []) + [
+            (lhs, rhs, join_type)]
         self._set_alias(model, alias)
         return self
 
+    def _join_cte(self, cte, join_type, on=None, alias=None):
+        """
+        Join common table expression.
+
+        @param cte: Cte object.
+        @type cte: Cte
+        @param join_type: Join type.
+        @type join_type: str
+        @param on: Field of the active model (primary key by default).
+        @type on: str/Field/None
+        @param alias: Common table expression alias.
+        @type alias: str/None
+        @return: Self instance.
+        @rtype: SelectQuery
+        """
+        if cte.name not in self._ctes:
+            raise AttributeError('[SelectQuery.join] ' +
+                                 'Common table expression must be defined ' +
+                                 'first: %s' % cte.name)
+        if isinstance(on, basestring):
+            lhs = self._active_model.get_field(on)
+        else:
+            lhs = on or self._active_model.get_pk_field()
+        if not lhs:
+            raise AttributeError('[SelectQuery.join] ' +
+                                 'Field is not defined in model: %s' % on)
+
+        self._unshare('_cte_joins', '_aliases')
+        self._cte_joins = self._cte_joins + [(lhs, cte, join_type)]
+        if not self._aliases.get(self._model._meta.name):
+            self._aliases[self._model._meta.name] = self._generate_alias(
+                self._aliases)
+        self._aliases[cte.name] = self._generate_alias(
+            self._aliases, alias=alias)
+        return self
+
+    def with_cte(self, name, query):
+        """
+        Define common table expression (computed once per statement and
+        referenced by Cte objects in filter and join).
+
+        @param name: Name of the common table expression.
+        @type name: str
+        @param query: SelectQuery object.
+        @type query: SelectQuery
+        @return: Self instance.
+        @rtype: SelectQuery
+        """
+        self._unshare('_ctes')
+        self._ctes[name] = query.clone()
+        return self
+
     def to(self, model):
         """
         Change active model to defined one.
@@ -833,6 +1957,7 @@ class SelectQuery(SearchQuery):
         self._distinct = value
         pk_field = self._model.get_pk_field()
         if pk_field in self._fields:
+            self._unshare('_fields')
             self._fields.remove(pk_field)
         return self
 
@@ -901,19 +2026,13 @@ class SelectQuery(SearchQuery):
         @return: Self instance.
         @rtype: SelectQuery
         """
+        self._unshare('_order_by')
         if kwargs.get('_force', False):
             self._order_by[:] = []
         for a in args:
-            if isinstance(a, basestring):
-                field = self._active_model.get_field(a)
-                if not field:
-                    continue
-                a = Ordering(field)
-            elif isinstance(a, Field):
-                a = Ordering(a)
-            elif not isinstance(a, Ordering):
-                continue
-            self._order_by.append(a)
+            a = self._get_ordering(a)
+            if a:
+                self._order_by.append(a)
         return self
 
     def group(self, *args):
@@ -934,12 +2053,281 @@ class SelectQuery(SearchQuery):
                 items = a.get_fields()
             else:
                 continue
+            self._unshare('_group_by')
             self._group_by.extend(items)
         return self
 
-    def having(self, *args):
-        """Set having-clause for SQL statement."""
-        raise NotImplementedError
+    def _get_having_clause(self):
+        """
+        Get having-clause with corresponding parameters.
+
+        @return: Having-clause with corresponding parameters.
+        @rtype: tuple(str, list)
+        """
+        if not self._having.children:
+            return '', []
+        return self._get_condition_clause(self._having)
+
+    def having(self, *args, **kwargs):
+        """
+        Set condition for groups (having-clause).
+
+        @param args: List of Expressions or ExpressionSets (with aggregates).
+        @type args: list
+        @param kwargs: Names of annotations (with operation) and values.
+        @type kwargs: dict
+        @return: Self instance.
+        @rtype: SelectQuery
+        @raise QueryException: annotation is not defined.
+        """
+        items = list(args)
+        for name, value in sorted(kwargs.iteritems()):
+            op = OpCode.EQ
+            if OP_SEPARATOR in name:
+                name, op = name.rsplit(OP_SEPARATOR, 1)
+            if name not in self._annotations:
+                raise QueryException('annotation "%s" is not defined' % name)
+            items.append(Expression(self._annotations[name], op, value))
+        if items:
+            self._having &= ExpressionSet(ExprConnector.AND, *items)
+        return self
+
+    def annotate(self, **kwargs):
+        """
+        Add computed columns (e.g., aggregate functions) to the result.
+
+        @param kwargs: Names (aliases) with ColumnNode objects.
+        @type kwargs: dict
+        @return: Self instance.
+        @rtype: SelectQuery
+        """
+        self._unshare('_annotations')
+        for name, node in sorted(kwargs.iteritems()):
+            self._annotations[name] = node
+        return self
+
+    def tuples(self, value=True):
+        """
+        Return rows as tuples (instead of Model objects).
+
+        @param value: Flag to set defined parameter.
+        @type value: bool
+        @return: Self instance.
+        @rtype: SelectQuery
+        """
+        self._result_type = value and 'tuples' or None
+        return self
+
+    def dicts(self, value=True):
+        """
+        Return rows as dictionaries (instead of Model objects).
+
+        @param value: Flag to set defined parameter.
+        @type value: bool
+        @return: Self instance.
+        @rtype: SelectQuery
+        """
+        self._result_type = value and 'dicts' or None
+        return self
+
+    def aggregate(self, **kwargs):
+        """
+        Calculate aggregate values for rows that fulfill criteria (grouping,
+        ordering and pagination are not applied).
+
+        @param kwargs: Names with aggregate functions (ColumnNode objects).
+        @type kwargs: dict
+        @return: Names with calculated values.
+        @rtype: dict
+        """
+        query = self.clone()
+        query._fields, query._order_by, query._group_by = set(), [], []
+        query._annotations = OrderedDict()
+        query._shared.clear()
+        query._having = ExpressionSet(ExprConnector.AND)
+        query._limit = query._offset = None
+        query.annotate(**kwargs)
+
+        statement, data = query.sql()
+        if query._empty_result:
+            row = map(lambda x: 0 if isinstance(x, Count) else None,
+                      query._annotations.values())
+        else:
+            query._load_temp_values()
+            cursor = self._db.execute_read(statement, data)
+            row = cursor.fetchone()
+            cursor.close()
+            query._release_temp_values()
+        return dict(zip(query._annotations.keys(),
+                        row or [None] * len(query._annotations)))
+
+    def _get_ordering(self, item):
+        """
+        Get Ordering object for the active model.
+
+        @param item: Column/field name, Field or Ordering.
+        @type item: str/Field/Ordering
+        @return: Ordering object.
+        @rtype: Ordering/None
+        """
+        if isinstance(item, basestring):
+            field = self._active_model.get_field(item)
+            if field:
+                return Ordering(field)
+        elif isinstance(item, Field):
+            return Ordering(item)
+        elif isinstance(item, Ordering):
+            return item
+
+    def top_per_group(self, partition_by, order_by, num_rows):
+        """
+        Get first rows of every group (rows are numbered by ROW_NUMBER window
+        function in the subquery and filtered by the outer query).
+
+        @param partition_by: Fields (or field names) to define groups.
+        @type partition_by: list
+        @param order_by: Fields, Orderings (or field names) to sort rows
+            within the group.
+        @type order_by: list
+        @param num_rows: Number of rows per group.
+        @type num_rows: int
+        @return: Self instance.
+        @rtype: SelectQuery
+        @raise QueryException: unknown field, or order_by is empty (the
+            order of rows within the group would be arbitrary).
+        """
+        fields = []
+        for item in partition_by:
+            field = item
+            if isinstance(item, basestring):
+                field = self._active_model.get_field(item)
+            if field is None:
+                raise QueryException(
+                    '"%s" is not defined in model (partition_by)' % item)
+            fields.append(field)
+
+        orderings = []
+        for item in order_by:
+            ordering = self._get_ordering(item)
+            if ordering is None:
+                raise QueryException(
+                    '"%s" is not defined in model (order_by)' % item)
+            orderings.append(ordering)
+        if not orderings:
+            raise QueryException('order_by is not defined')
+
+        self._top_per_group = (
+            RowNumber().over(fields, orderings), num_rows)
+        return self
+
+    @staticmethod
+    def _get_field_key(field):
+        """
+        Get key to identify the requested field.
+
+        @param field: Field object.
+        @type field: Field
+        @return: Field key.
+        @rtype: tuple
+        """
+        return field.model, field.name, field._alias
+
+    def _get_top_aliases(self):
+        """
+        Get unique aliases of requested fields for the top-per-group subquery.
+
+        @return: Aliases per field key.
+        @rtype: dict
+        """
+        if not self._top_per_group:
+            return {}
+        return dict(map(
+            lambda (n, x): (self._get_field_key(x),
+                            '%s%s' % (TOP_COLUMN_PREFIX, n)),
+            enumerate(filter(lambda x: isinstance(x, Field),
+                             self._get_ordered_fields()))))
+
+    def _get_top_per_group_sql(self, statement, data):
+        """
+        Wrap select statement into the top-per-group query (columns of the
+        subquery are referred by their unique aliases).
+
+        @param statement: Select statement (with row numbers).
+        @type statement: str
+        @param data: Statement parameters.
+        @type data: list
+        @return: SQL statement and corresponding data.
+        @rtype: tuple(str, list)
+        """
+        comma = self._db.op_connectors.get(ExprConnector.Comma)
+        top_aliases = self._get_top_aliases()
+        columns = []
+        for field in self._get_ordered_fields():
+            column = top_aliases[self._get_field_key(field)]
+            if field._alias:
+                column = self._db.statements.get(**{
+                    'name': 'column_with_alias',
+                    'column': column,
+                    'alias': field._alias})
+            columns.append(column)
+        columns.extend(self._annotations.keys())
+
+        order_by = ''
+        if not self._distinct:
+            order_by = comma.join(map(lambda x: '%s %s' % (
+                top_aliases.get(self._get_field_key(x.field),
+                                x.field._alias or x.field.column_name),
+                x.to_string()), self._order_by))
+        statement = self._db.statements.get(**{
+            'name': 'select_top_per_group',
+            'columns': comma.join(columns),
+            'selectquery': statement,
+            'alias': TOP_ALIAS,
+            'rank_column': TOP_RANK_COLUMN,
+            'num_rows': self._db.interpolation,
+            'order_by': order_by})
+        return statement, data + [self._top_per_group[1]]
+
+    def _get_result_names(self):
+        """
+        Get names of returned columns (fields and annotations).
+
+        @return: List of names.
+        @rtype: list
+        """
+        return (map(lambda x: x.name, self._get_ordered_fields())
+                + self._annotations.keys())
+
+    def _get_lookup(self):
+        """
+        Get field and value if query is a lookup by one field (exact match).
+
+        @return: Field object and corresponding value.
+        @rtype: tuple(Field, any)/None
+        """
+        if (self._joins or self._offset or self._filter.negated
+                or len(self._filter.children) != 1):
+            return None
+
+        child = self._filter.children[0]
+        if (not isinstance(child, Expression) or child.negated
+                or not isinstance(child.field, Field)
+                or child.op != OpCode.EQ or child.field.model != self._model
+                or child.value is None
+                or isinstance(child.value, (SelectQuery, Param, tuple, list))):
+            return None
+        return child.field, child.field.db_value(child.value)
+
+    def _get_negative_cache_key(self):
+        """
+        Get key for negative cache (lookup by primary key or unique field).
+
+        @return: Field name and corresponding value.
+        @rtype: tuple(str, any)/None
+        """
+        lookup = self._get_lookup()
+        if lookup and (lookup[0]._primary or lookup[0]._unique):
+            return lookup[0].name, lookup[1]
 
     def sql(self):
         """
@@ -950,6 +2338,11 @@ class SelectQuery(SearchQuery):
         """
         select_statement, select_data = self._get_select_clause()
         where_statement, where_data = self._get_where_clause()
+        having_statement, having_data = self._get_having_clause()
+        # - rows are sorted by the outer query (top-per-group) -
+        order_by = ''
+        if not self._top_per_group:
+            order_by = self._get_order_by_clause()
 
         if self._has_aliases():
             table = self._db.statements.get(**{
@@ -964,34 +2357,32 @@ class SelectQuery(SearchQuery):
             'distinct': self._distinct,
             'columns': select_statement,
             'table': table,
-            'join': self._get_join_clause(),
+            'join': ' '.join([self._get_join_clause()] + map(
+                lambda x: x[0], self._semi_joins)),
             'where': where_statement,
             'group_by': self._get_group_by_clause(),
-            'having': None,
-            'order_by': self._get_order_by_clause()})
+            'having': having_statement,
+            'order_by': order_by})
 
-        if self._limit and not self._offset:
-            statement = self._db.statements.get(**{
-                'name': 'select_with_limit',
-                'selectquery': statement,
-                'limit': self._limit})
+        join_data = sum(map(lambda x: x[1], self._semi_joins), [])
+        data = select_data + join_data + where_data + having_data
+        if self._top_per_group:
+            statement, data = self._get_top_per_group_sql(statement, data)
 
-        elif not self._limit and self._offset:
-            statement = self._db.statements.get(**{
-                'name': 'select_with_offset',
-                'selectquery': statement,
-                'offset': self._offset})
+        statement = self._get_paginated_statement(
+            statement, self._limit, self._offset)
 
-        elif self._limit and self._offset:
+        if self._ctes:
+            with_statement, with_data = self._get_with_clause()
             statement = self._db.statements.get(**{
-                'name': 'select_with_pagination',
-                'selectquery': statement,
-                'limit': self._limit,
-                'offset': self._offset})
+                'name': 'select_with_ctes',
+                'ctes': with_statement,
+                'selectquery': statement})
+            data = with_data + data
 
         if not self._naive:
             self._naive = bool(not self._has_aliases())
-        return statement, select_data + where_data
+        return statement, data
 
     def count(self):
         """
@@ -1005,10 +2396,14 @@ class SelectQuery(SearchQuery):
         statement = self._db.statements.get(**{
             'name': 'select_with_count',
             'selectquery': statement})
+        if self._empty_result:
+            return 0
 
+        self._load_temp_values()
         cursor = self._db.execute_read(statement, data)
         output = (cursor.fetchone() or (0,))[0]
         cursor.close()
+        self._release_temp_values()
         return output
 
     def exists(self):
@@ -1018,6 +2413,11 @@ class SelectQuery(SearchQuery):
         @return: Flag that requested data exists at database.
         @rtype: bool
         """
+        lookup = self._get_lookup()
+        if lookup:
+            bloom_filter = self._model._meta.bloom_filters.get(lookup[0].name)
+            if bloom_filter is not None and lookup[1] not in bloom_filter:
+                return False
         return bool(self.count())
 
     def one(self):
@@ -1028,10 +2428,19 @@ class SelectQuery(SearchQuery):
         @rtype: Model
         @raise NoDataException: no data found.
         """
+        negative_cache = self._model._meta.negative_cache
+        key = None
+        if negative_cache is not None:
+            key = self._get_negative_cache_key()
+            if key and key in negative_cache:
+                raise NoDataException('no data with defined conditions')
+
         queryresult = self.execute()
         try:
             instance = queryresult.next()
         except StopIteration:
+            if key:
+                negative_cache.add(key)
             raise NoDataException('no data with defined conditions')
         else:
             queryresult.close_cursor()
@@ -1066,11 +2475,55 @@ class SelectQuery(SearchQuery):
         @return: QueryResult object.
         @rtype: QueryResult
         """
+        statement, data = self.sql()
+        if self._empty_result:
+            cursor = EmptyCursor()
+        else:
+            self._load_temp_values()
+            cursor = self._db.execute_read(statement, data, ss=ss)
+            if not ss:
+                # - server-side cursor keeps values until the session end -
+                self._release_temp_values()
         return QueryResult(**{
             'model': self._model,
-            'cursor': self._db.execute_read(*self.sql(), ss=ss),
+            'cursor': cursor,
             'naive': self._naive,
-            'fields': self._fields})
+            'fields': self._get_ordered_fields(),
+            'result_type': self._result_type,
+            'names': self._get_result_names()})
+
+    def prepare(self):
+        """
+        Compile SQL statement once (values are bound at execution).
+
+        @return: PreparedQuery object.
+        @rtype: PreparedQuery
+        """
+        return PreparedQuery(self)
+
+    def union(self, rhs):
+        """
+        Combine results with another query (UNION, duplicates are removed).
+
+        @param rhs: SelectQuery or CompoundSelectQuery object.
+        @type rhs: SelectQuery/CompoundSelectQuery
+        @return: CompoundSelectQuery object.
+        @rtype: CompoundSelectQuery
+        """
+        return CompoundSelectQuery(self._model, UNION, self, rhs)
+
+    def union_all(self, rhs):
+        """
+        Combine results with another query (UNION ALL).
+
+        @param rhs: SelectQuery or CompoundSelectQuery object.
+        @type rhs: SelectQuery/CompoundSelectQuery
+        @return: CompoundSelectQuery object.
+        @rtype: CompoundSelectQuery
+        """
+        return CompoundSelectQuery(self._model, UNION_ALL, self, rhs)
+
+    __or__ = union
 
     def clone(self):
         """
@@ -1080,20 +2533,23 @@ class SelectQuery(SearchQuery):
         @rtype: SelectQuery
         """
         instance = SelectQuery(self._model)
-        instance._fields = set(self._fields)
         instance._active_model = self._active_model
 
         instance._distinct = self._distinct
-        instance._order_by = list(self._order_by)
-        instance._group_by = list(self._group_by)
-        instance._having = list(self._having)
         instance._limit = self._limit
         instance._offset = self._offset
 
-        instance._filter = self._filter.clone()
-        instance._joins = self._joins.copy()
-        instance._aliases = self._aliases.copy()
+        instance._filter = self._filter  # - expressions are not modified -
+        instance._having = self._having
+        instance._result_type = self._result_type
+        instance._top_per_group = self._top_per_group
         instance._naive = self._naive
+
+        # - containers are copied on modification -
+        for name in self._shared_attrs:
+            setattr(instance, name, getattr(self, name))
+        self._shared = set(self._shared_attrs)
+        instance._shared = set(self._shared_attrs)
         return instance
 
     def __iter__(self):
@@ -1104,3 +2560,472 @@ class SelectQuery(SearchQuery):
         @rtype: QueryResult
         """
         return iter(self.execute())
+
+
+class PreparedQuery(object):
+
+    """PreparedQuery class keeps compiled SelectQuery (immutable, so it can
+    be shared between threads); values of Param objects are bound at
+    execution."""
+
+    def __init__(self, query):
+        """
+        Initialization.
+
+        @param query: SelectQuery object.
+        @type query: SelectQuery
+        """
+        query = query.clone()
+        statement, data = query.sql()
+
+        self._model = query._model
+        self._db = query._db
+        self._statement = statement
+        self._data = tuple(data)
+        self._params = tuple(filter(lambda x: isinstance(x[1], Param),
+                                    enumerate(data)))
+        self._temp_values = tuple(query._temp_values)
+        self._empty_result = query._empty_result
+        self._naive = query._naive
+        self._fields = tuple(query._get_ordered_fields())
+        self._field_names = tuple(map(lambda x: x.name, self._fields))
+        self._result_type = query._result_type
+        self._names = tuple(query._get_result_names())
+
+    def get_param_names(self):
+        """
+        Get names of parameters.
+
+        @return: Set of parameter names.
+        @rtype: set
+        """
+        return set(map(lambda x: x[1].name, self._params))
+
+    def sql(self, **kwargs):
+        """
+        Get SQL statement and parameters values.
+
+        @param kwargs: Parameter names with corresponding values.
+        @type kwargs: dict
+        @return: SQL statement and corresponding data.
+        @rtype: tuple(str, list)
+        @raise QueryException: parameter value is not defined or incorrect.
+        """
+        data = list(self._data)
+        for num, param in self._params:
+            if param.name not in kwargs:
+                raise QueryException(
+                    'value for "%s" parameter is not defined' % param.name)
+            value = kwargs[param.name]
+            if isinstance(value, (tuple, list)):
+                raise QueryException(
+                    'value for "%s" parameter should be scalar' % param.name)
+            data[num] = self._db.lookup_cast(
+                param.field._column, param.op, [param.field.db_value(value)])[0]
+        return self._statement, data
+
+    def execute(self, ss=False, **kwargs):
+        """
+        Execute SQL statement and return cursor (object with records).
+
+        @param ss: Save execution result on server side (optional for MySQL).
+        @type ss: bool
+        @param kwargs: Parameter names with corresponding values.
+        @type kwargs: dict
+        @return: QueryResult object.
+        @rtype: QueryResult
+        """
+        statement, data = self.sql(**kwargs)
+        if self._empty_result:
+            cursor = EmptyCursor()
+        else:
+            if self._temp_values:
+                self._db.load_temp_values(list(self._temp_values))
+            cursor = self._db.execute_read(statement, data, ss=ss)
+            if self._temp_values and not ss:
+                self._db.release_temp_values(list(self._temp_values))
+        return QueryResult(**{
+            'model': self._model,
+            'cursor': cursor,
+            'naive': self._naive,
+            'fields': list(self._fields),
+            'result_type': self._result_type,
+            'names': list(self._names)})
+
+    def fetch(self, **kwargs):
+        """
+        Execute SQL statement and get all Model objects (rows of the single
+        model are mapped onto fields directly, without QueryResult).
+
+        @param kwargs: Parameter names with corresponding values.
+        @type kwargs: dict
+        @return: List of Model objects.
+        @rtype: list
+        """
+        if not self._naive or self._empty_result or self._result_type:
+            return list(self.execute(**kwargs))
+
+        statement, data = self.sql(**kwargs)
+        if self._temp_values:
+            self._db.load_temp_values(list(self._temp_values))
+        cursor = self._db.execute_read(statement, data)
+        try:
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        if self._temp_values:
+            self._db.release_temp_values(list(self._temp_values))
+
+        output = []
+        for row in rows:
+            instance = self._model(**dict(zip(self._field_names, row)))
+            instance._post_init()
+            output.append(instance)
+        return output
+
+    def all(self, **kwargs):
+        """
+        Execute SQL statement and return cursor (object with records).
+
+        @param kwargs: Parameter names with corresponding values.
+        @type kwargs: dict
+        @return: QueryResult object.
+        @rtype: QueryResult
+        """
+        return self.execute(**kwargs)
+
+    def one(self, **kwargs):
+        """
+        Execute SQL statement and return one Model object.
+
+        @param kwargs: Parameter names with corresponding values.
+        @type kwargs: dict
+        @return: Model object.
+        @rtype: Model
+        @raise NoDataException: no data found.
+        """
+        queryresult = self.execute(**kwargs)
+        try:
+            instance = queryresult.next()
+        except StopIteration:
+            raise NoDataException('no data with defined conditions')
+        else:
+            queryresult.close_cursor()
+            return instance
+
+
+class CompoundSelectQuery(BaseQuery):
+
+    """Class to manage/execute select SQL statements combined by UNION."""
+
+    def __init__(self, model, operation, *args):
+        """
+        Initialization.
+
+        @param model: Model class.
+        @type model: type
+        @param operation: Set operation (UNION or UNION_ALL).
+        @type operation: str
+        @param args: SelectQuery/CompoundSelectQuery objects.
+        @type args: list
+        @raise QueryException: queries are defined for different models.
+        """
+        super(CompoundSelectQuery, self).__init__(model)
+        self._operation = operation
+        self._queries = []
+        for query in args:
+            if query._model is not self._model:
+                raise QueryException('queries should be defined for the ' +
+                                     'same model')
+            if (isinstance(query, CompoundSelectQuery)
+                    and query._operation == operation
+                    and not (query._order_by or query._limit
+                             or query._offset)):
+                self._queries.extend(query._queries)
+            else:
+                self._queries.append(query)
+
+        self._order_by = []
+        self._limit = None
+        self._offset = None
+        self._result_type = None
+        self._parts = []  # compiled queries (with temporary values)
+
+    def _get_lhs(self, compiled=False):
+        """
+        Get the first SelectQuery (defines columns of the result).
+
+        @param compiled: Flag to get the compiled query (after sql()).
+        @type compiled: bool
+        @return: SelectQuery object.
+        @rtype: SelectQuery
+        """
+        query = self
+        while isinstance(query, CompoundSelectQuery):
+            query = (compiled and query._parts or query._queries)[0]
+        return query
+
+    def sort(self, *args, **kwargs):
+        """
+        Set parameters for order-by-clause of the combined result.
+
+        @param args: Parameters values (column/field names, Fields, Orderings).
+        @type args: list
+        @param kwargs: Additional parameters.
+        @type kwargs: dict
+
+        @keyword _force: Force to reset the order for sorting.
+
+        @return: Self instance.
+        @rtype: CompoundSelectQuery
+        """
+        if kwargs.get('_force', False):
+            self._order_by = []
+        for a in args:
+            a = self._get_lhs()._get_ordering(a)
+            if a:
+                self._order_by = self._order_by + [a]
+        return self
+
+    def limit(self, num_rows):
+        """
+        Set limit for the combined result.
+
+        @param num_rows: Limit for requested records.
+        @type num_rows: int
+        @return: Self instance.
+        @rtype: CompoundSelectQuery
+        """
+        self._limit = num_rows
+        return self
+
+    def offset(self, num_rows):
+        """
+        Set offset for the combined result.
+
+        @param num_rows: Offset for requested records.
+        @type num_rows: int
+        @return: Self instance.
+        @rtype: CompoundSelectQuery
+        """
+        self._offset = num_rows
+        return self
+
+    def tuples(self, value=True):
+        """
+        Return rows as tuples (instead of Model objects).
+
+        @param value: Flag to set defined parameter.
+        @type value: bool
+        @return: Self instance.
+        @rtype: CompoundSelectQuery
+        """
+        self._result_type = value and 'tuples' or None
+        return self
+
+    def dicts(self, value=True):
+        """
+        Return rows as dictionaries (instead of Model objects).
+
+        @param value: Flag to set defined parameter.
+        @type value: bool
+        @return: Self instance.
+        @rtype: CompoundSelectQuery
+        """
+        self._result_type = value and 'dicts' or None
+        return self
+
+    def union(self, rhs):
+        """
+        Combine results with another query (UNION, duplicates are removed).
+
+        @param rhs: SelectQuery or CompoundSelectQuery object.
+        @type rhs: SelectQuery/CompoundSelectQuery
+        @return: CompoundSelectQuery object.
+        @rtype: CompoundSelectQuery
+        """
+        return CompoundSelectQuery(self._model, UNION, self, rhs)
+
+    def union_all(self, rhs):
+        """
+        Combine results with another query (UNION ALL).
+
+        @param rhs: SelectQuery or CompoundSelectQuery object.
+        @type rhs: SelectQuery/CompoundSelectQuery
+        @return: CompoundSelectQuery object.
+        @rtype: CompoundSelectQuery
+        """
+        return CompoundSelectQuery(self._model, UNION_ALL, self, rhs)
+
+    __or__ = union
+
+    def _get_part_sql(self, query, outer_temp_values):
+        """
+        Get SQL statement of the combined query.
+
+        @param query: SelectQuery or CompoundSelectQuery object.
+        @type query: SelectQuery/CompoundSelectQuery
+        @param outer_temp_values: Temporary values of the previous queries.
+        @type outer_temp_values: list
+        @return: SQL statement, corresponding data and temporary values.
+        @rtype: tuple(str, list, list)
+        """
+        query = query.clone()
+        if isinstance(query, CompoundSelectQuery):
+            statement, data = query.sql(outer_temp_values)
+            statement = self._db.statements.get(**{
+                'name': 'combine',
+                'statement': statement})
+            self._parts.append(query)
+            return statement, data, query._get_temp_values()
+
+        if not (query._limit or query._offset):
+            # - ordering is applied to the combined result -
+            query._order_by = []
+            query._shared.discard('_order_by')
+        query._outer_temp_values = outer_temp_values
+        statement, data = query.sql()
+        if query._limit or query._offset:
+            statement = self._db.statements.get(**{
+                'name': 'combine',
+                'statement': statement})
+        self._parts.append(query)
+        return statement, data, query._temp_values
+
+    def _get_temp_values(self):
+        """
+        Get temporary values of compiled queries (including nested compound
+        queries).
+
+        @return: List of temporary values.
+        @rtype: list
+        """
+        output = []
+        for query in self._parts:
+            if isinstance(query, CompoundSelectQuery):
+                output.extend(query._get_temp_values())
+            else:
+                output.extend(query._temp_values)
+        return output
+
+    def sql(self, _outer_temp_values=None):
+        """
+        Get SQL statement and parameters values.
+
+        @param _outer_temp_values: Temporary values of the outer query.
+        @type _outer_temp_values: list/None
+        @return: SQL statement and corresponding data.
+        @rtype: tuple(str, list)
+        """
+        self._parts = []
+        temp_values = list(_outer_temp_values or [])
+        statement_items, statement_data = [], []
+        for query in self._queries:
+            statement, data, query_temp_values = self._get_part_sql(
+                query, temp_values)
+            statement_items.append(statement)
+            statement_data.extend(data)
+            temp_values.extend(query_temp_values)
+
+        operation = ' %s ' % self._db.statements.get(name=self._operation)
+        comma = self._db.op_connectors.get(ExprConnector.Comma)
+        statement = self._db.statements.get(**{
+            'name': 'compound_select',
+            'selectquery': operation.join(statement_items),
+            'order_by': comma.join(map(lambda x: '%s %s' % (
+                x.field._alias or x.field.column_name, x.to_string()),
+                self._order_by))})
+        statement = self._get_paginated_statement(
+            statement, self._limit, self._offset)
+        return statement, statement_data
+
+    def count(self):
+        """
+        Get number of rows of the combined result.
+
+        @return: Number of rows.
+        @rtype: int
+        """
+        statement, data = self.sql()
+        statement = self._db.statements.get(**{
+            'name': 'select_with_count',
+            'selectquery': statement})
+
+        self._load_temp_values()
+        cursor = self._db.execute_read(statement, data)
+        output = (cursor.fetchone() or (0,))[0]
+        cursor.close()
+        self._release_temp_values()
+        return output
+
+    def _load_temp_values(self):
+        """Load values into temporary tables (should be called after sql())."""
+        temp_values = self._get_temp_values()
+        if temp_values:
+            self._db.load_temp_values(temp_values)
+
+    def _release_temp_values(self):
+        """Remove values from temporary tables (after the execution)."""
+        temp_values = self._get_temp_values()
+        if temp_values:
+            self._db.release_temp_values(temp_values)
+
+    def execute(self, ss=False):
+        """
+        Execute SQL statement and return cursor (object with records).
+
+        @param ss: Save execution result on server side (optional for MySQL).
+        @type ss: bool
+        @return: QueryResult object.
+        @rtype: QueryResult
+        """
+        statement, data = self.sql()
+        self._load_temp_values()
+        cursor = self._db.execute_read(statement, data, ss=ss)
+        if not ss:
+            # - server-side cursor keeps values until the session end -
+            self._release_temp_values()
+        lhs = self._get_lhs(compiled=True)
+        return QueryResult(**{
+            'model': self._model,
+            'cursor': cursor,
+            'naive': lhs._naive,
+            'fields': lhs._get_ordered_fields(),
+            'result_type': self._result_type,
+            'names': lhs._get_result_names()})
+
+    def all(self, **kwargs):
+        """
+        Execute SQL statement and return cursor (object with records).
+
+        @param kwargs: Database parameters (optional).
+        @type kwargs: dict
+        @return: QueryResult object.
+        @rtype: QueryResult
+        """
+        return self.execute(**kwargs)
+
+    def clone(self):
+        """
+        Clone instance (create a copy of instance).
+
+        @return: New CompoundSelectQuery object.
+        @rtype: CompoundSelectQuery
+        """
+        instance = CompoundSelectQuery(self._model, self._operation)
+        instance._queries = list(self._queries)
+        instance._order_by = list(self._order_by)
+        instance._limit = self._limit
+        instance._offset = self._offset
+        instance._result_type = self._result_type
+        return instance
+
+    def __iter__(self):
+        """
+        Execute SQL statement and return an iterator object.
+
+        @return: New iterator object.
+        @rtype: QueryResult
+        """
+        return iter(self.execute())
+
@@ -13,16 +13,40 @@
 """QueryResult definition (object with result after SQL statement execution).
 """
 
-__all__ = ['QueryResult']
+__all__ = [
+    'EmptyCursor',
+    'QueryResult'
+]
 
 from d2om.exception import QueryResultException
 
 
+class EmptyCursor(object):
+
+    """EmptyCursor class represents result of the statement that was not
+    executed (condition is always false)."""
+
+    rowcount = 0
+
+    def set_cursor_columns(self):
+        pass
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
 class QueryResult(object):
 
     """QueryResult class (iterator over the results from Query)."""
 
-    def __init__(self, model, cursor, naive=True, fields=None):
+    def __init__(self, model, cursor, naive=True, fields=None,
+                 result_type=None, names=None):
         """
         Initialization.
 
@@ -32,15 +56,21 @@ class QueryResult(object):
         @type cursor: cursor
         @param naive: Flag for single model or model with relations.
         @type naive: bool
-        @param fields: Set of requested fields.
+        @param fields: Requested fields (in order of columns).
         @type fields: list
+        @param result_type: Type of rows: None (Model objects), tuples, dicts.
+        @type result_type: str/None
+        @param names: Names of columns (fields and annotations) for dicts.
+        @type names: list/None
         """
         self._model = model
         self._cursor = cursor
         self._naive = naive
-        self._fields = fields or set()
+        self._fields = fields or []
+        self._result_type = result_type
+        self._names = names or []
 
-        if self._naive:
+        if self._naive and not self._result_type:
             self._cursor.set_cursor_columns()
 
         self._keep_cache = False
@@ -173,6 +203,10 @@ class QueryResult(object):
             if not self._with_statement:
                 self.close_cursor()
             raise StopIteration
+        if self._result_type == 'tuples':
+            return tuple(row)
+        elif self._result_type == 'dicts':
+            return dict(zip(self._names, row))
         if self._naive:
             return self.get_instance(row)
         return self.get_instance_with_relations(row)
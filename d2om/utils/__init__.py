@@ -8,11 +8,13 @@
 #     http://www.apache.org/licenses/LICENSE-2.0
 #
 __all__ = [
+    'BloomFilter',
     'EnumTypes',
     'IDict',
     'Templates'
 ]
 
+from d2om.utils.bloom import BloomFilter
 from d2om.utils.enum import EnumTypes
 from d2om.utils.idict import IDict
 from d2om.utils.template import Templates
@@ -0,0 +1,181 @@
+#
+# Copyright 2014 Mikhail Titov
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Authors:
+# - Mikhail Titov, <mikhail.titov@cern.ch>, 2014
+#
+"""Bloom filter (probabilistic set with no false negatives).
+"""
+
+__all__ = ['BloomFilter']
+
+import hashlib
+import math
+import os
+import struct
+import threading
+
+
+class BloomFilter(object):
+
+    """BloomFilter class to check that value is definitely not in a set."""
+
+    _magic = 'D2BF'
+    _header = struct.Struct('<4sQdQIQ')
+
+    def __init__(self, capacity, error_rate=0.01, key=None):
+        """
+        Initialization.
+
+        @param capacity: Expected number of values.
+        @type capacity: int
+        @param error_rate: False positive rate at full capacity.
+        @type error_rate: float
+        @param key: Function to get canonical representation of the value
+            (e.g., Field.key_value), equal values of different python types
+            should be hashed the same way (no false negatives).
+        @type key: function/None
+        @raise ValueError: incorrect parameters.
+        """
+        if capacity < 1:
+            raise ValueError('[BloomFilter.__init__] ' +
+                             'Capacity should be a positive number')
+        if not 0 < error_rate < 1:
+            raise ValueError('[BloomFilter.__init__] ' +
+                             'Error rate should be in range (0, 1)')
+
+        self.capacity = int(capacity)
+        self.error_rate = float(error_rate)
+        self.key = key
+
+        self._num_bits = int(math.ceil(
+            -self.capacity * math.log(self.error_rate) / math.log(2) ** 2))
+        self._num_hashes = max(1, int(round(
+            float(self._num_bits) / self.capacity * math.log(2))))
+        self._bits = bytearray((self._num_bits + 7) // 8)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    @staticmethod
+    def _to_bytes(value):
+        """
+        Get byte representation of the value.
+
+        @param value: Input value.
+        @type value: any
+        @return: Byte string.
+        @rtype: str
+        """
+        if isinstance(value, unicode):
+            return value.encode('utf-8')
+        return str(value)
+
+    def _get_positions(self, value):
+        """
+        Get bit positions for the value (double hashing).
+
+        @param value: Input value.
+        @type value: any
+        @return: List of bit positions.
+        @rtype: list
+        """
+        if self.key is not None:
+            value = self.key(value)
+        h1, h2 = struct.unpack(
+            '<QQ', hashlib.md5(self._to_bytes(value)).digest())
+        return [(h1 + i * h2) % self._num_bits
+                for i in xrange(self._num_hashes)]
+
+    def add(self, value):
+        """
+        Add value to the filter.
+
+        @param value: Input value.
+        @type value: any
+        """
+        positions = self._get_positions(value)
+        with self._lock:
+            for p in positions:
+                self._bits[p >> 3] |= 1 << (p & 7)
+            self._count += 1
+
+    def add_many(self, values):
+        """
+        Add several values to the filter.
+
+        @param values: Input values.
+        @type values: iterable
+        """
+        for value in values:
+            self.add(value)
+
+    def __contains__(self, value):
+        """
+        Check that value might be in the filter.
+
+        @param value: Input value.
+        @type value: any
+        @return: False if value is definitely not in the filter.
+        @rtype: bool
+        """
+        bits = self._bits
+        for p in self._get_positions(value):
+            if not bits[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+    def save(self, path):
+        """
+        Save filter to the file.
+
+        @param path: File path.
+        @type path: str
+        """
+        tmp_path = '%s.tmp' % path
+        with self._lock:
+            with open(tmp_path, 'wb') as f:
+                f.write(self._header.pack(
+                    self._magic, self.capacity, self.error_rate,
+                    self._num_bits, self._num_hashes, self._count))
+                f.write(str(self._bits))
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, key=None):
+        """
+        Load filter from the file.
+
+        @param path: File path.
+        @type path: str
+        @param key: Function to get canonical representation of the value.
+        @type key: function/None
+        @return: BloomFilter object.
+        @rtype: BloomFilter
+        @raise ValueError: incorrect file format.
+        """
+        with open(path, 'rb') as f:
+            header = f.read(cls._header.size)
+            bits = f.read()
+
+        if len(header) != cls._header.size:
+            raise ValueError('[BloomFilter.load] Incorrect file format')
+        magic, capacity, error_rate, num_bits, num_hashes, count = \
+            cls._header.unpack(header)
+        if magic != cls._magic or len(bits) != (num_bits + 7) // 8:
+            raise ValueError('[BloomFilter.load] Incorrect file format')
+
+        instance = cls(capacity, error_rate, key=key)
+        instance._num_bits = num_bits
+        instance._num_hashes = num_hashes
+        instance._bits = bytearray(bits)
+        instance._count = count
+        return instance
@@ -0,0 +1,256 @@
+#
+# Copyright 2014 Mikhail Titov
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Authors:
+# - Mikhail Titov, <mikhail.titov@cern.ch>, 2014
+#
+"""Tests of IN (subquery) rendering: IN, EXISTS and JOIN (semi-join
+strategies) should return the same rows.
+
+Statements are generated by the base Database class (no connection is
+needed) and executed with in-memory SQLite database.
+"""
+
+import sqlite3
+import unittest
+
+from d2om.orm import Model, Field, ForeignKeyField
+from d2om.database import Type
+from d2om.database._base import Database, BaseStatements, SemiJoinStrategy
+
+STRATEGIES = SemiJoinStrategy.values
+
+USERS = [
+    (1, 5.0),
+    (2, 15.0),
+    (3, 20.0),
+    (4, None)]
+
+ORDERS = [
+    (1, 1, 10.0),
+    (2, 2, 20.0),
+    (3, 2, 30.0),
+    (4, 3, 1.0),
+    (5, 4, 50.0),
+    (6, None, 60.0)]
+
+
+class Statements(BaseStatements):
+
+    """Statements class with SQLite syntax of limit."""
+
+    _templates = dict(BaseStatements._templates)
+    _templates.update({
+        'select_with_limit': '$selectquery LIMIT $limit'})
+
+
+class SemiJoinDatabase(Database):
+
+    """Database class to generate statements without connection."""
+
+    statements = Statements
+
+
+database = SemiJoinDatabase()
+
+
+class User(Model):
+
+    userid = Field('user_id', Type.Number).primary()
+    score = Field('score', Type.Float)
+
+    class Meta:
+        database = database
+        table = 'users'
+
+
+class Order(Model):
+
+    id = Field('id', Type.Number).primary()
+    user = ForeignKeyField('user_id', User.userid).nullable()
+    amount = Field('amount', Type.Float)
+
+    class Meta:
+        database = database
+        table = 'orders'
+
+
+class OrderUser(Model):
+
+    """Users of orders (view, NULL values are included)."""
+
+    user = Field('user_id', Type.Number).primary()
+
+    class Meta:
+        database = database
+        table = 'order_users'
+
+
+class SemiJoinTest(unittest.TestCase):
+
+    """Tests of semi-join strategies (SQL text and returned rows)."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.connection = sqlite3.connect(':memory:')
+        cls.connection.executescript("""
+            CREATE TABLE users (user_id INTEGER PRIMARY KEY, score REAL);
+            CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER,
+                                 amount REAL);
+            CREATE VIEW order_users AS SELECT user_id FROM orders;""")
+        cls.connection.executemany('INSERT INTO users VALUES (?, ?)', USERS)
+        cls.connection.executemany('INSERT INTO orders VALUES (?, ?, ?)',
+                                   ORDERS)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.connection.close()
+
+    def tearDown(self):
+        database.semi_join_strategy = SemiJoinStrategy.In
+
+    def get_sql(self, query, strategy):
+        """
+        Get SQL statement of the query rendered with defined strategy.
+
+        @param query: SelectQuery object.
+        @type query: SelectQuery
+        @param strategy: Semi-join strategy.
+        @type strategy: str
+        @return: SQL statement and corresponding data.
+        @rtype: tuple(str, list)
+        """
+        database.semi_join_strategy = strategy
+        return query.clone().sql()
+
+    def get_rows(self, query, strategy):
+        """
+        Execute query (rendered with defined strategy) at SQLite database.
+
+        @param query: SelectQuery object.
+        @type query: SelectQuery
+        @param strategy: Semi-join strategy.
+        @type strategy: str
+        @return: Sorted rows.
+        @rtype: list
+        """
+        statement, data = self.get_sql(query, strategy)
+        cursor = self.connection.execute(
+            statement.replace(database.interpolation, '?'), data)
+        return sorted(cursor.fetchall())
+
+    def assertSameRows(self, query):
+        """
+        Check that all strategies return the same (non-empty) rows.
+
+        @param query: SelectQuery object.
+        @type query: SelectQuery
+        """
+        expected = self.get_rows(query, SemiJoinStrategy.In)
+        self.assertTrue(expected)
+        for strategy in STRATEGIES:
+            self.assertEqual(self.get_rows(query, strategy), expected,
+                             'strategy %s' % strategy)
+
+    def test_in(self):
+        query = Order.select().filter(
+            Order.user << User.select().filter(User.score > 10))
+        statement, data = self.get_sql(query, SemiJoinStrategy.In)
+        self.assertEqual(statement, (
+            'SELECT id, user_id, amount FROM orders WHERE (user_id IN ' +
+            '(SELECT user_id FROM users WHERE (score > %s)))'))
+        self.assertEqual(data, [10.0])
+
+    def test_exists(self):
+        query = Order.select().filter(
+            Order.user << User.select().filter(User.score > 10))
+        statement, data = self.get_sql(query, SemiJoinStrategy.Exists)
+        self.assertEqual(statement, (
+            'SELECT id, user_id, amount FROM orders WHERE (EXISTS ' +
+            '(SELECT d2om_sj1.user_id FROM users d2om_sj1 WHERE ' +
+            '(d2om_sj1.score > %s) AND d2om_sj1.user_id = orders.user_id))'))
+        self.assertEqual(data, [10.0])
+
+    def test_join(self):
+        query = Order.select().filter(
+            Order.user << User.select().filter(User.score > 10),
+            Order.amount > 5)
+        statement, data = self.get_sql(query, SemiJoinStrategy.Join)
+        self.assertEqual(statement, (
+            'SELECT id, user_id, amount FROM orders INNER JOIN ' +
+            '(SELECT DISTINCT user_id AS d2om_sj_value FROM users WHERE ' +
+            '(score > %s)) d2om_sj1 ON orders.user_id = ' +
+            'd2om_sj1.d2om_sj_value WHERE (amount > %s)'))
+        self.assertEqual(data, [10.0, 5.0])
+
+    def test_join_or_fallback(self):
+        query = Order.select().filter(
+            (Order.user << User.select().filter(User.score > 10))
+            | (Order.amount > 55))
+        statement, _ = self.get_sql(query, SemiJoinStrategy.Join)
+        self.assertNotIn('JOIN', statement)
+        self.assertIn('EXISTS', statement)
+
+    def test_negation_fallback(self):
+        query = Order.select().filter(
+            ~(Order.user << User.select().filter(User.score > 10)))
+        for strategy in STRATEGIES:
+            statement, _ = self.get_sql(query, strategy)
+            self.assertIn('IN (SELECT user_id FROM users', statement)
+            self.assertNotIn('EXISTS', statement)
+            self.assertNotIn('JOIN', statement)
+
+    def test_not_in_fallback(self):
+        query = Order.select().filter(
+            user__nin=User.select().filter(User.score > 10))
+        for strategy in STRATEGIES:
+            statement, _ = self.get_sql(query, strategy)
+            self.assertIn('NOT IN (SELECT user_id FROM users', statement)
+
+    def test_limit_fallback(self):
+        query = Order.select().filter(
+            Order.user << User.select().filter(User.score > 10).limit(1))
+        for strategy in STRATEGIES:
+            statement, _ = self.get_sql(query, strategy)
+            self.assertIn('user_id IN (SELECT', statement)
+
+    def test_same_rows(self):
+        subquery = User.select().filter(User.score > 10)
+        self.assertSameRows(Order.select().filter(Order.user << subquery))
+        self.assertSameRows(Order.select().filter(
+            Order.user << subquery, Order.amount > 25))
+        self.assertSameRows(Order.select().filter(
+            Order.user << User.select().filter(
+                User.userid << Order.select().filter(Order.amount > 15))))
+
+    def test_same_rows_or(self):
+        self.assertSameRows(Order.select().filter(
+            (Order.user << User.select().filter(User.score > 10))
+            | (Order.amount > 55)))
+
+    def test_same_rows_negation(self):
+        self.assertSameRows(Order.select().filter(
+            ~(Order.user << User.select().filter(User.score > 10))))
+        self.assertSameRows(Order.select().filter(
+            user__nin=User.select().filter(User.score > 10)))
+
+    def test_same_rows_null(self):
+        # - NULL values in the outer column and in the subquery -
+        self.assertSameRows(Order.select().filter(
+            Order.user << OrderUser.select()))
+        self.assertSameRows(Order.select().filter(
+            Order.user << User.select().filter(User.score >> None)))
+        # - NOT IN with NULL in the subquery returns no rows -
+        query = Order.select().filter(~(Order.user << OrderUser.select()))
+        for strategy in STRATEGIES:
+            self.assertEqual(self.get_rows(query, strategy), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
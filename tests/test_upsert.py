@@ -0,0 +1,119 @@
+#
+# Copyright 2014 Mikhail Titov
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Authors:
+# - Mikhail Titov, <mikhail.titov@cern.ch>, 2014
+#
+"""Tests of upsert statements: ON DUPLICATE KEY UPDATE (MySQL) and MERGE
+(Oracle).
+
+Statements are generated without connection, tests are skipped if the
+database driver is not installed.
+"""
+
+import unittest
+
+from d2om.orm import Model, Field
+from d2om.database import Type
+from d2om.exception import QueryException
+
+try:
+    from d2om.database.mysql import MySQLDatabase
+except (ImportError, NameError):
+    MySQLDatabase = None
+
+try:
+    from d2om.database.oracle import OracleDatabase
+except (ImportError, NameError):
+    OracleDatabase = None
+
+
+def get_model(database):
+    """
+    Get model with primary key (auto-increment) and unique field.
+
+    @param database: Database object.
+    @type database: Database
+    @return: Model class.
+    @rtype: type
+    """
+    class User(Model):
+
+        userid = Field('user_id', Type.Number).primary()
+        name = Field('name', Type.Varchar).unique()
+        score = Field('score', Type.Float)
+
+        class Meta:
+            table = 'users'
+            auto_increment = True
+
+    User._meta.database = database
+    return User
+
+
+@unittest.skipIf(MySQLDatabase is None, 'MySQLdb is not installed')
+class MySQLUpsertTest(unittest.TestCase):
+
+    """Tests of INSERT ... ON DUPLICATE KEY UPDATE statements."""
+
+    def setUp(self):
+        self.database = MySQLDatabase()
+        self.model = get_model(self.database)
+
+    def test_statement(self):
+        self.database.server_version = '5.7.30'
+        statement, data = self.model.upsert(name='a', score=3).sql()
+        self.assertEqual(statement, (
+            'INSERT INTO users (name, score) VALUES (%s, %s) ' +
+            'ON DUPLICATE KEY UPDATE score = VALUES(score)'))
+        self.assertEqual(data, [('a', 3.0)])
+
+    def test_statement_with_alias(self):
+        self.database.server_version = '8.0.21-log'
+        statement, _ = self.model.upsert(name='a', score=3).sql()
+        self.assertEqual(statement, (
+            'INSERT INTO users (name, score) VALUES (%s, %s) ' +
+            'AS d2om_new ON DUPLICATE KEY UPDATE score = d2om_new.score'))
+
+    def test_unique_field_not_key(self):
+        # - rows would be matched by "name" as well, not by pk only -
+        self.database.server_version = '8.0.21-log'
+        query = self.model.upsert_many(['userid', 'name'], [(1, 'a')])
+        self.assertRaises(QueryException, query.sql)
+
+
+@unittest.skipIf(OracleDatabase is None, 'cx_Oracle is not installed')
+class OracleUpsertTest(unittest.TestCase):
+
+    """Tests of MERGE statements."""
+
+    def setUp(self):
+        self.database = OracleDatabase()
+        self.model = get_model(self.database)
+
+    def test_statement(self):
+        statement, data = self.model.upsert(name='a', score=3).sql()
+        self.assertEqual(statement, (
+            'MERGE INTO users t USING (SELECT :a0 AS name, :a1 AS score ' +
+            'FROM dual) s ON (t.name = s.name) ' +
+            'WHEN MATCHED THEN UPDATE SET t.score = s.score ' +
+            'WHEN NOT MATCHED THEN INSERT (name, score) ' +
+            'VALUES (s.name, s.score)'))
+        self.assertEqual(data, [('a', 3.0)])
+
+    def test_pk_key(self):
+        # - rows are matched by pk only (unique field is not a key) -
+        statement, _ = self.model.upsert_many(
+            ['userid', 'name'], [(1, 'a')]).sql()
+        self.assertIn('ON (t.user_id = s.user_id)', statement)
+        self.assertIn('UPDATE SET t.name = s.name', statement)
+
+
+if __name__ == '__main__':
+    unittest.main()